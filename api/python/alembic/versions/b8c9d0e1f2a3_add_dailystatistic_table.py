@@ -0,0 +1,45 @@
+"""add dailystatistic table
+
+Revision ID: b8c9d0e1f2a3
+Revises: a7b8c9d0e1f2
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b8c9d0e1f2a3"
+down_revision: str | Sequence[str] | None = "a7b8c9d0e1f2"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema.
+
+    The table is filled for each user on first use, see
+    `build_missing_daily_aggregates`, or for all users by the `update-fitness`
+    command.
+    """
+    op.create_table(
+        "dailystatistic",
+        sa.Column("user_id", sa.String(), nullable=False),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("sport", sa.String(), nullable=False),
+        sa.Column("n_activities", sa.Integer(), nullable=False),
+        sa.Column("total_distance", sa.Float(), nullable=False),
+        sa.Column("total_timer_time", sa.Float(), nullable=False),
+        sa.Column("total_ascent", sa.Float(), nullable=False),
+        sa.Column("training_stress_score", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+        sa.PrimaryKeyConstraint("user_id", "date", "sport"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("dailystatistic")
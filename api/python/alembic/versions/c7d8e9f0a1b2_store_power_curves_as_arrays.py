@@ -0,0 +1,65 @@
+"""store power curves as arrays
+
+Revision ID: c7d8e9f0a1b2
+Revises: b1c2d3e4f5a6
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c7d8e9f0a1b2"
+down_revision: str | Sequence[str] | None = "b1c2d3e4f5a6"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "powercurve",
+        sa.Column("activity_id", sa.UUID(), nullable=False),
+        sa.Column("durations", sa.ARRAY(sa.Integer()), nullable=False),
+        sa.Column("powers", sa.ARRAY(sa.REAL()), nullable=False),
+        sa.ForeignKeyConstraint(["activity_id"], ["activity.id"]),
+        sa.PrimaryKeyConstraint("activity_id"),
+    )
+    op.execute(
+        """
+        INSERT INTO powercurve (activity_id, durations, powers)
+        SELECT
+            activity_id,
+            array_agg(EXTRACT(EPOCH FROM time)::int ORDER BY time),
+            array_agg(power::real ORDER BY time)
+        FROM performancepower
+        GROUP BY activity_id
+        """
+    )
+    op.drop_table("performancepower")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_table(
+        "performancepower",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("activity_id", sa.UUID(), nullable=False),
+        sa.Column("time", sa.Interval(), nullable=False),
+        sa.Column("power", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["activity_id"], ["activity.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.execute(
+        """
+        INSERT INTO performancepower (id, activity_id, time, power)
+        SELECT gen_random_uuid(), pc.activity_id, make_interval(secs => c.duration),
+            c.power
+        FROM powercurve pc
+        CROSS JOIN unnest(pc.durations, pc.powers) AS c(duration, power)
+        """
+    )
+    op.drop_table("powercurve")
@@ -0,0 +1,43 @@
+"""add weeklyzonetime table
+
+Revision ID: c9d0e1f2a3b4
+Revises: b8c9d0e1f2a3
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c9d0e1f2a3b4"
+down_revision: str | Sequence[str] | None = "b8c9d0e1f2a3"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema.
+
+    The table is filled for each user on first use, see
+    `build_missing_daily_aggregates`, or for all users by the `update-fitness`
+    command.
+    """
+    op.create_table(
+        "weeklyzonetime",
+        sa.Column("user_id", sa.String(), nullable=False),
+        sa.Column("week_start", sa.Date(), nullable=False),
+        sa.Column("type", sa.String(), nullable=False),
+        sa.Column("index", sa.Integer(), nullable=False),
+        sa.Column("sport", sa.String(), nullable=False),
+        sa.Column("time_in_zone", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+        sa.PrimaryKeyConstraint("user_id", "week_start", "type", "index", "sport"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("weeklyzonetime")
@@ -0,0 +1,36 @@
+"""add activityhistogram table
+
+Revision ID: d2e3f4a5b6c7
+Revises: c7d8e9f0a1b2
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d2e3f4a5b6c7"
+down_revision: str | Sequence[str] | None = "c7d8e9f0a1b2"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "activityhistogram",
+        sa.Column("activity_id", sa.UUID(), nullable=False),
+        sa.Column("type", sa.String(), nullable=False),
+        sa.Column("values", sa.ARRAY(sa.Integer()), nullable=False),
+        sa.Column("seconds", sa.ARRAY(sa.REAL()), nullable=False),
+        sa.ForeignKeyConstraint(["activity_id"], ["activity.id"]),
+        sa.PrimaryKeyConstraint("activity_id", "type"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("activityhistogram")
@@ -0,0 +1,39 @@
+"""add zoneestimate table
+
+Revision ID: e4f5a6b7c8d9
+Revises: d2e3f4a5b6c7
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e4f5a6b7c8d9"
+down_revision: str | Sequence[str] | None = "d2e3f4a5b6c7"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "zoneestimate",
+        sa.Column("user_id", sa.String(), nullable=False),
+        sa.Column("oldest_start_time", sa.Integer(), nullable=True),
+        sa.Column("max_heart_rates", sa.ARRAY(sa.Float()), nullable=False),
+        sa.Column("threshold_run_speeds", sa.ARRAY(sa.Float()), nullable=False),
+        sa.Column("long_run_speeds", sa.ARRAY(sa.Float()), nullable=False),
+        sa.Column("short_run_speeds", sa.ARRAY(sa.Float()), nullable=False),
+        sa.Column("max_powers", sa.ARRAY(sa.Float()), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("zoneestimate")
@@ -0,0 +1,43 @@
+"""add dailyfitness table
+
+Revision ID: f6a7b8c9d0e1
+Revises: e4f5a6b7c8d9
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f6a7b8c9d0e1"
+down_revision: str | Sequence[str] | None = "e4f5a6b7c8d9"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema.
+
+    The table is filled for each user on first use, see
+    `build_missing_daily_aggregates`, or for all users by the `update-fitness`
+    command.
+    """
+    op.create_table(
+        "dailyfitness",
+        sa.Column("user_id", sa.String(), nullable=False),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("overall", sa.Integer(), nullable=False),
+        sa.Column("running", sa.Integer(), nullable=False),
+        sa.Column("cycling", sa.Integer(), nullable=False),
+        sa.Column("swimming", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+        sa.PrimaryKeyConstraint("user_id", "date"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("dailyfitness")
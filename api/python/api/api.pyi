@@ -1 +1,22 @@
-def get_fit(file_name: str) -> dict: ...
+from collections.abc import Buffer, Sequence
+
+# `fields` and `messages` select what is returned; the whole file is still parsed
+def get_fit(
+    file_name: str,
+    columnar: bool = False,
+    fields: Sequence[str] | None = None,
+    messages: Sequence[str] | None = None,
+) -> dict: ...
+def get_fit_bytes(
+    buffer: Buffer,
+    columnar: bool = False,
+    fields: Sequence[str] | None = None,
+    messages: Sequence[str] | None = None,
+) -> dict: ...
+def get_fits(
+    paths: Sequence[str],
+    threads: int | None = None,
+    columnar: bool = False,
+    fields: Sequence[str] | None = None,
+    messages: Sequence[str] | None = None,
+) -> list[dict | Exception]: ...
@@ -1,6 +1,4 @@
 import datetime
-import os
-import tempfile
 import uuid
 from enum import Enum
 
@@ -16,7 +14,7 @@ from fastapi import (
 )
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from sqlalchemy import func, text
+from sqlalchemy import Date, cast, func, text
 from sqlalchemy.orm import selectinload
 from sqlmodel import Session, col, select
 from starlette.middleware.base import BaseHTTPMiddleware
@@ -24,9 +22,16 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from api.auth import Token, create_token_response
 from api.dependencies import get_current_user_id, get_session, verify_jwt_token
 from api.fitness import (
+    FITNESS_MAX_DATE,
+    FITNESS_MAX_DAYS,
+    FITNESS_MIN_DATE,
+    build_missing_daily_aggregates,
     calculate_fitness_and_weekly_data,
+    calculate_training_load,
     calculate_weekly_zone_data,
     get_ftp_data,
+    update_daily_aggregates,
+    update_daily_fitness,
 )
 from api.model import (
     Activity,
@@ -42,6 +47,7 @@ from api.model import (
     ActivityZonePowerPublic,
     BestPerformanceItem,
     BestPerformanceResponse,
+    DailyStatistic,
     HeatmapPublic,
     Notification,
     Pagination,
@@ -65,6 +71,11 @@ from api.services import (
 from api.services.activity import ActivityService
 from api.services.heatmap import HeatmapService
 from api.services.profile import ProfileService
+from api.utils import (
+    activity_cursor_condition,
+    decode_activity_cursor,
+    encode_activity_cursor,
+)
 
 
 def get_activity_service_dependency(
@@ -115,6 +126,8 @@ def read_activities(
         default="start_time",
         pattern="^(total_distance|start_time|avg_speed|avg_power|total_ascent|total_calories|training_stress_score)$",
     ),
+    cursor: str | None = Query(default=None),
+    include_total: bool | None = Query(default=None),
 ):
     query = select(Activity).where(
         Activity.user_id == user_id, Activity.status == "created"
@@ -154,16 +167,52 @@ def read_activities(
     else:
         order_column = Activity.start_time
 
+    # Count the matching activities for pages, and for cursors only on request
+    if include_total is None:
+        include_total = cursor is None
+    total = None
+    if include_total:
+        total = session.exec(select(func.count()).select_from(query.subquery())).one()
+
     if order == "asc":
-        query = query.order_by(order_column.asc())  # type: ignore
+        query = query.order_by(
+            order_column.asc().nulls_last(),  # type: ignore
+            col(Activity.id).asc(),
+        )
     else:
-        query = query.order_by(order_column.desc())  # type: ignore
+        query = query.order_by(
+            order_column.desc().nulls_first(),  # type: ignore
+            col(Activity.id).desc(),
+        )
 
-    total = session.exec(select(func.count()).select_from(query.subquery())).one()
+    if cursor is not None:
+        try:
+            cursor_value, cursor_id = decode_activity_cursor(cursor, order_by, order)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+        query = query.where(
+            activity_cursor_condition(order_by, order, cursor_value, cursor_id)
+        )
+    else:
+        query = query.offset((page - 1) * limit)
 
-    query = query.offset((page - 1) * limit).limit(limit)
+    if map:
+        # Load what ActivityPublic serializes in one query per relationship
+        # for the whole page, instead of lazy loads per activity
+        query = query.options(
+            selectinload(Activity.laps),  # type: ignore
+            selectinload(Activity.performances),  # type: ignore
+            selectinload(Activity.power_curve),  # type: ignore
+            selectinload(Activity.notifications),  # type: ignore
+            selectinload(Activity.tracepoints),  # type: ignore
+        )
 
-    activities = session.exec(query).all()
+    # One more activity tells whether there is a next page
+    activities = session.exec(query.limit(limit + 1)).all()
+    next_cursor = None
+    if len(activities) > limit:
+        activities = activities[:limit]
+        next_cursor = encode_activity_cursor(order_by, order, activities[-1])
 
     notification_counts = {}
     if not map:
@@ -198,6 +247,7 @@ def read_activities(
             page=page,
             per_page=limit,
             total=total,
+            next_cursor=next_cursor,
         ),
     )
 
@@ -302,28 +352,41 @@ def create_activity(
             status_code=409, detail="Activity with this FIT file already exists"
         )
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".fit") as temp_file:
-        temp_file.write(fit_file.file.read())
-        temp_fit_path = temp_file.name
+    fit_data = fit_file.file.read()
+    try:
+        parsed = activity_service.parse_activity(
+            fit_data, fit_file.filename, title, race
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid FIT file")
+
+    duplicate_activity = session.exec(
+        select(Activity).where(
+            Activity.start_time == parsed[0].start_time,
+            Activity.sport == parsed[0].sport,
+            Activity.user_id == user_id,
+            Activity.status == "created",
+        )
+    ).first()
+    if duplicate_activity:
+        raise HTTPException(
+            status_code=409, detail="Activity with this start time already exists"
+        )
 
     try:
         activity = activity_service.create_activity(
             user_id=user_id,
-            fit_file_path=temp_fit_path,
+            fit_data=fit_data,
             fit_filename=fit_file.filename,
             title=title,
             race=race,
+            parsed=parsed,
         )
         return ActivityPublic.model_validate(activity)
 
     except Exception as e:  # noqa: BLE001
         session.rollback()
         raise HTTPException(status_code=500, detail=f"Error processing FIT file: {e!s}")
-    finally:
-        try:
-            os.unlink(temp_fit_path)
-        except OSError:
-            pass
 
 
 @app.delete("/activities/{activity_id}/", status_code=status.HTTP_204_NO_CONTENT)
@@ -345,6 +408,10 @@ def delete_activity(
     activity.status = "deleted"
     activity.updated_at = datetime.datetime.now(datetime.UTC)
     session.add(activity)
+    get_zone_service(session).remove_activity_from_zones(user_id, activity)
+    update_daily_aggregates(
+        session, user_id, datetime.date.fromtimestamp(activity.start_time)
+    )
     session.commit()
 
 
@@ -366,12 +433,18 @@ def update_activity(
         raise HTTPException(status_code=404, detail="Activity not found")
 
     update_data = activity_update.model_dump(exclude_unset=True)
+    race_changed = "race" in update_data and update_data["race"] != activity.race
     for field, value in update_data.items():
         setattr(activity, field, value)
 
     activity.updated_at = datetime.datetime.now(datetime.UTC)
 
     session.add(activity)
+    # Races score higher, so the stored fitness scores change with the flag
+    if race_changed:
+        update_daily_fitness(
+            session, user_id, datetime.date.fromtimestamp(activity.start_time)
+        )
     session.commit()
     session.refresh(activity)
 
@@ -459,19 +532,23 @@ def read_best_performances(
 
         # Query for cycling power performances
         query = """
-            SELECT pp.power, a.*
-            FROM performancepower pp
-            JOIN activity a ON pp.activity_id = a.id
+            SELECT pc.powers[array_position(pc.durations, :target_seconds)] AS power,
+                a.*
+            FROM powercurve pc
+            JOIN activity a ON pc.activity_id = a.id
             WHERE a.user_id = :user_id AND a.status = 'created'
-            AND pp.time = :target_time
+            AND :target_seconds = ANY(pc.durations)
         """
-        params: dict[str, object] = {"user_id": user_id, "target_time": target_time}
+        params: dict[str, object] = {
+            "user_id": user_id,
+            "target_seconds": int(target_time.total_seconds()),
+        }
 
         if year is not None:
             query += " AND EXTRACT(YEAR FROM to_timestamp(a.start_time)) = :year"
             params["year"] = year
 
-        query += " ORDER BY pp.power DESC LIMIT 10"
+        query += " ORDER BY power DESC LIMIT 10"
 
         power_performances = session.execute(text(query).bindparams(**params)).all()  # ty: ignore[deprecated]
 
@@ -558,31 +635,33 @@ def read_power_profile(
 
     labels = [label for _, label in time_periods]
 
-    time_values = [t for t, _ in time_periods]
+    time_by_seconds = {int(t.total_seconds()): t for t, _ in time_periods}
 
     # Single query to get max power per time period, both overall and by year
     query = """
         SELECT
-            pp.time,
-            MAX(pp.power) as max_power,
+            d.seconds,
+            MAX(pc.powers[array_position(pc.durations, d.seconds)]) as max_power,
             EXTRACT(YEAR FROM to_timestamp(a.start_time))::int as year
-        FROM performancepower pp
-        JOIN activity a ON pp.activity_id = a.id
+        FROM powercurve pc
+        JOIN activity a ON pc.activity_id = a.id
+        CROSS JOIN unnest(CAST(:seconds AS integer[])) AS d(seconds)
         WHERE a.user_id = :user_id
         AND a.status = 'created'
-        AND pp.time = ANY(:time_values)
-        GROUP BY pp.time, year
-        ORDER BY year DESC, pp.time
+        AND d.seconds = ANY(pc.durations)
+        GROUP BY d.seconds, year
+        ORDER BY year DESC, d.seconds
     """
     results = session.execute(  # ty: ignore[deprecated]
-        text(query).bindparams(user_id=user_id, time_values=time_values)
+        text(query).bindparams(user_id=user_id, seconds=list(time_by_seconds))
     ).all()
 
     # Build lookup: (time, year) -> power, and (time, None) -> overall max
     power_by_time_year: dict[tuple[datetime.timedelta, int | None], float] = {}
     available_years_set: set[int] = set()
     for row in results:
-        time_val, power, year = row
+        seconds, power, year = row
+        time_val = time_by_seconds[seconds]
         available_years_set.add(year)
         key = (time_val, year)
         power_by_time_year[key] = float(power) if power else 0.0
@@ -621,50 +700,59 @@ def read_weeks(
     offset: int = Query(0, ge=0),
     limit: int = Query(5, ge=1, le=52),
 ):
-    now = datetime.datetime.now()
-    current_week_start = now - datetime.timedelta(days=now.weekday())
-    current_week_start = current_week_start.replace(
-        hour=0, minute=0, second=0, microsecond=0
-    )
-
-    # Query enough activities to fill limit weeks (fetch limit+1 to check has_more)
-    # Order by start_time desc and use offset to skip already-seen weeks
-    range_end = current_week_start + datetime.timedelta(days=7)
-
-    activities = session.exec(
-        select(Activity)
-        .where(Activity.user_id == user_id, Activity.status == "created")
-        .where(Activity.start_time < int(range_end.timestamp()))
-        .order_by(Activity.start_time.desc())  # type: ignore
+    if build_missing_daily_aggregates(session, user_id):
+        session.commit()
+    today = datetime.date.today()
+    range_end = today + datetime.timedelta(days=7 - today.weekday())
+
+    # Resolve the page of weeks with activities from the daily statistics,
+    # fetching one more week to know whether there are more weeks
+    week = cast(func.date_trunc("week", DailyStatistic.date), Date).label("week")
+    week_starts = session.exec(
+        select(week)
+        .where(DailyStatistic.user_id == user_id, DailyStatistic.date < range_end)
+        .group_by(week)
+        .order_by(week.desc())
+        .offset(offset)
+        .limit(limit + 1)
     ).all()
+    has_more = len(week_starts) > limit
+    week_starts = week_starts[:limit]
+    if not week_starts:
+        return WeeksResponse(weeks=[], has_more=has_more, next_offset=offset)
+
+    page_start = datetime.datetime.combine(week_starts[-1], datetime.time.min)
+    page_end = datetime.datetime.combine(
+        week_starts[0] + datetime.timedelta(days=7), datetime.time.min
+    )
 
-    # Group activities by week (year, week_number)
-    weeks_map: dict[tuple[int, int], list[Activity]] = {}
-    for activity in activities:
-        activity_dt = datetime.datetime.fromtimestamp(activity.start_time)
-        year, week_number, _ = activity_dt.isocalendar()
-        key = (year, week_number)
-        if key not in weeks_map:
-            weeks_map[key] = []
-        weeks_map[key].append(activity)
-
-    # Sort weeks by date (most recent first)
-    sorted_weeks = sorted(weeks_map.keys(), reverse=True)
-
-    # Apply offset and limit to get the requested page of weeks
-    paginated_weeks = sorted_weeks[offset : offset + limit]
-    weeks_data = []
-
-    for year, week_number in paginated_weeks:
-        week_activities = weeks_map[(year, week_number)]
-
-        # Calculate week start date
-        week_start = datetime.datetime.strptime(
-            f"{year}-W{week_number:02d}-1", "%G-W%V-%u"
+    # Only the page's activities, with the columns of their summaries
+    week_activities: dict[datetime.date, list[WeeklyActivitySummary]] = {}
+    for activity in session.exec(
+        select(
+            Activity.id,
+            Activity.title,
+            Activity.sport,
+            Activity.start_time,
+            Activity.total_distance,
+            Activity.total_timer_time,
+            Activity.avg_speed,
+            Activity.avg_heart_rate,
+            Activity.avg_power,
+            Activity.race,
         )
-
-        # Create activity summaries
-        activity_summaries = [
+        .where(
+            Activity.user_id == user_id,
+            Activity.status == "created",
+            Activity.start_time >= int(page_start.timestamp()),
+            Activity.start_time < int(page_end.timestamp()),
+        )
+        .order_by(col(Activity.start_time).desc())
+    ).all():
+        activity_date = datetime.date.fromtimestamp(activity.start_time)
+        week_activities.setdefault(
+            activity_date - datetime.timedelta(days=activity_date.weekday()), []
+        ).append(
             WeeklyActivitySummary(
                 id=activity.id,
                 title=activity.title,
@@ -677,33 +765,48 @@ def read_weeks(
                 avg_power=activity.avg_power,
                 race=activity.race,
             )
-            for activity in sorted(
-                week_activities, key=lambda a: a.start_time, reverse=True
-            )
-        ]
+        )
+
+    # Week totals are summed from the daily statistics of the page
+    week_statistics: dict[datetime.date, list[DailyStatistic]] = {}
+    for statistic in session.exec(
+        select(DailyStatistic).where(
+            DailyStatistic.user_id == user_id,
+            DailyStatistic.date >= page_start.date(),
+            DailyStatistic.date < page_end.date(),
+        )
+    ).all():
+        week_statistics.setdefault(
+            statistic.date - datetime.timedelta(days=statistic.date.weekday()), []
+        ).append(statistic)
+
+    weeks_data = []
+    for week_start in week_starts:
+        year, week_number, _ = week_start.isocalendar()
 
         # Calculate week summary statistics
-        total_activities = len(week_activities)
-        total_distance = sum(a.total_distance for a in week_activities)
-        total_time = sum(a.total_timer_time for a in week_activities)
-        total_tss = sum(a.training_stress_score or 0.0 for a in week_activities)
+        statistics = week_statistics.get(week_start, [])
+        total_activities = sum(s.n_activities for s in statistics)
+        total_distance = sum(s.total_distance for s in statistics)
+        total_time = sum(s.total_timer_time for s in statistics)
+        total_tss = sum(s.training_stress_score for s in statistics)
 
         # Calculate sports breakdown
         sports_breakdown: dict[str, dict[str, float]] = {}
-        for activity in week_activities:
-            sport = activity.sport
+        for statistic in statistics:
+            sport = statistic.sport
             if sport not in sports_breakdown:
                 sports_breakdown[sport] = {"distance": 0.0, "time": 0.0, "count": 0}
-            sports_breakdown[sport]["distance"] += activity.total_distance
-            sports_breakdown[sport]["time"] += activity.total_timer_time
-            sports_breakdown[sport]["count"] += 1
+            sports_breakdown[sport]["distance"] += statistic.total_distance
+            sports_breakdown[sport]["time"] += statistic.total_timer_time
+            sports_breakdown[sport]["count"] += statistic.n_activities
 
         weeks_data.append(
             WeeklySummary(
-                week_start=week_start,
+                week_start=datetime.datetime.combine(week_start, datetime.time.min),
                 week_number=week_number,
                 year=year,
-                activities=activity_summaries,
+                activities=week_activities.get(week_start, []),
                 total_activities=total_activities,
                 total_distance=total_distance,
                 total_time=total_time,
@@ -712,9 +815,6 @@ def read_weeks(
             )
         )
 
-    # has_more is true if there are more weeks beyond what we returned
-    has_more = len(sorted_weeks) > offset + limit
-
     # next_offset points to the next set of weeks
     next_offset = offset + len(weeks_data)
 
@@ -818,12 +918,53 @@ def google_auth(
         raise HTTPException(status_code=500, detail=f"Database error: {e!s}")
 
 
+def check_fitness_dates(start: datetime.date | None, end: datetime.date | None):
+    for date in (start, end):
+        if date and not FITNESS_MIN_DATE <= date <= FITNESS_MAX_DATE:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Dates must be from {FITNESS_MIN_DATE} to {FITNESS_MAX_DATE}",
+            )
+    end = end or datetime.date.today()
+    if start and start > end:
+        raise HTTPException(status_code=400, detail="Start must not be after end")
+    if start and (end - start).days >= FITNESS_MAX_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Date range must not exceed {FITNESS_MAX_DAYS} days",
+        )
+
+
 @app.get("/fitness/scores/")
 def read_fitness_scores(
+    start: datetime.date | None = None,
+    end: datetime.date | None = None,
+    resolution: str = Query(default="day", pattern="^(day|week)$"),
+    session: Session = Depends(get_session),
+    user_id: str = Depends(get_current_user_id),
+):
+    check_fitness_dates(start, end)
+    if build_missing_daily_aggregates(session, user_id):
+        session.commit()
+    return calculate_fitness_and_weekly_data(
+        session, user_id, start=start, end=end, resolution=resolution
+    )
+
+
+@app.get("/fitness/load/")
+def read_fitness_load(
+    start: datetime.date | None = None,
+    end: datetime.date | None = None,
+    sports: bool = False,
     session: Session = Depends(get_session),
     user_id: str = Depends(get_current_user_id),
 ):
-    return calculate_fitness_and_weekly_data(session, user_id)
+    check_fitness_dates(start, end)
+    load = calculate_training_load(
+        session, user_id, start=start, end=end, sports=sports
+    )
+    session.commit()
+    return load
 
 
 @app.get("/fitness/zones/")
@@ -831,6 +972,8 @@ def read_fitness_zones(
     session: Session = Depends(get_session),
     user_id: str = Depends(get_current_user_id),
 ):
+    if build_missing_daily_aggregates(session, user_id):
+        session.commit()
     return {"weekly_zones": calculate_weekly_zone_data(session, user_id)}
 
 
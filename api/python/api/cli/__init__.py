@@ -1,4 +1,4 @@
-import concurrent.futures
+import datetime
 import json
 import os
 
@@ -7,38 +7,40 @@ from sqlmodel import Session, SQLModel, select
 
 from api.cli.formatters import ActivityFormatter
 from api.db import engine
-from api.model import User
+from api.fitness import update_daily_aggregates
+from api.model import Activity, Lap, PowerCurve, User
 from api.services.bulk_operations import BulkOperationService
 from api.services.fit_file import FitFileService
 from api.services.heatmap import HeatmapService
 from api.services.location import LocationService
 from api.services.performance import PerformanceService
 from api.services.storage import StorageService
-from api.utils import MAX_TRACEPOINTS_FOR_RESPONSE, calculate_activity_zone_data
+from api.services.zone import ZoneService
+from api.track import TrackArray
+from api.utils import MAX_TRACEPOINTS_FOR_RESPONSE
 
-NB_CPUS = 2
+# Files parsed in parallel per get_fits call, bounding parsed data held in memory
+CREATE_DB_BATCH_SIZE = 64
 
 app = typer.Typer(add_completion=False)
 
 
-def process_file(input_file: str) -> None:
-    session = Session(engine)
-    fit_file_service = FitFileService(session)
+def save_activity(
+    session: Session,
+    activity: Activity,
+    laps: list[Lap],
+    track: TrackArray,
+) -> None:
     performance_service = PerformanceService()
 
-    activity, laps, tracepoints = fit_file_service.read_fit_file(input_file)
-
-    performances = performance_service.calculate_running_performances(
-        activity, tracepoints
-    )
+    performances = performance_service.calculate_running_performances(activity, track)
     performance_powers = performance_service.calculate_cycling_performances(
-        activity, tracepoints
+        activity, track
     )
 
-    original_tracepoints = tracepoints.copy()
-
-    while len(tracepoints) > MAX_TRACEPOINTS_FOR_RESPONSE:
-        tracepoints = [tp for i, tp in enumerate(tracepoints) if i % 2 == 0]
+    tracepoints = track.downsample(MAX_TRACEPOINTS_FOR_RESPONSE).to_tracepoints(
+        activity.id
+    )
 
     session.add(activity)
 
@@ -51,15 +53,31 @@ def process_file(input_file: str) -> None:
     for performance in performances:
         session.add(performance)
 
-    for performance_power in performance_powers:
-        session.add(performance_power)
+    if performance_powers:
+        session.add(PowerCurve.from_performance_powers(activity.id, performance_powers))
 
-    session.commit()
+    # Zone rows first, as the weekly zone times are summed from them
+    ZoneService(session).calculate_activity_zones(activity, track)
+
+    if activity.user_id:
+        update_daily_aggregates(
+            session,
+            activity.user_id,
+            datetime.date.fromtimestamp(activity.start_time),
+        )
 
-    calculate_activity_zone_data(session, activity, original_tracepoints)
     session.commit()
 
 
+def process_file(input_file: str) -> None:
+    session = Session(engine)
+    fit_file_service = FitFileService(session)
+
+    activity, laps, track = fit_file_service.read_fit_file(input_file)
+
+    save_activity(session, activity, laps, track)
+
+
 @app.command()
 def add_activity(
     yaml: str = typer.Argument(),
@@ -88,16 +106,27 @@ def create_db():
 
     print(f"Found {len(input_files)} files to process")
 
-    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
-        future_activities = {
-            executor.submit(process_file, input_file): input_file
-            for input_file in input_files
-        }
-        for future in concurrent.futures.as_completed(future_activities):
-            input_file = future_activities[future]
+    session = Session(engine)
+    fit_file_service = FitFileService(session)
+
+    # (start_time, sport) of the activities added, to skip duplicate files
+    seen = set()
+    for start in range(0, len(input_files), CREATE_DB_BATCH_SIZE):
+        batch = input_files[start : start + CREATE_DB_BATCH_SIZE]
+        results = fit_file_service.read_fit_files(batch)
+
+        for input_file, result in zip(batch, results):
             try:
-                future.result()
+                if isinstance(result, Exception):
+                    raise result
+                activity = result[0]
+                if (activity.start_time, activity.sport) in seen:
+                    print(f"Skipping duplicate {input_file}")
+                    continue
+                save_activity(session, *result)
+                seen.add((activity.start_time, activity.sport))
             except Exception as e:  # noqa: BLE001
+                session.rollback()
                 print(f"Error processing {input_file}: {e}")
 
     print("Done")
@@ -115,20 +144,13 @@ def read_fit(
     performance_service = PerformanceService()
     formatter = ActivityFormatter(session)
 
-    activity, laps, tracepoints = fit_file_service.read_fit_file(fit_file)
+    activity, laps, track = fit_file_service.read_fit_file(fit_file)
 
-    performances = performance_service.calculate_running_performances(
-        activity, tracepoints
-    )
+    performances = performance_service.calculate_running_performances(activity, track)
     performance_powers = performance_service.calculate_cycling_performances(
-        activity, tracepoints
+        activity, track
     )
 
-    original_tracepoints = tracepoints.copy()
-
-    while len(tracepoints) > MAX_TRACEPOINTS_FOR_RESPONSE:
-        tracepoints = [tp for i, tp in enumerate(tracepoints) if i % 2 == 0]
-
     user = None
     if email:
         user = session.exec(select(User).where(User.email == email)).first()
@@ -152,7 +174,7 @@ def read_fit(
     print()
     print(formatter.format_laps(laps))
     print()
-    print(formatter.format_tracepoints(tracepoints))
+    print(formatter.format_tracepoints(track.downsample(MAX_TRACEPOINTS_FOR_RESPONSE)))
     print()
     print(formatter.format_running_performances(performances))
     print()
@@ -160,7 +182,7 @@ def read_fit(
 
     if user:
         print()
-        print(formatter.format_zone_analysis(user.id, activity, original_tracepoints))
+        print(formatter.format_zone_analysis(user.id, activity, track))
 
 
 @app.command()
@@ -214,6 +236,18 @@ def update_ftp():
     print(f"Skipped {result.skipped_count} dates")
 
 
+@app.command()
+def update_fitness():
+    """Recompute the stored daily statistics, zone times and fitness scores."""
+    session = Session(engine)
+    bulk_service = BulkOperationService(session)
+
+    print("Updating daily statistics, zone times and fitness scores...")
+    result = bulk_service.update_daily_fitness()
+
+    print(f"Updated statistics and fitness scores for {result.processed_count} users")
+
+
 @app.command()
 def update_activity_zones(
     fit_dir: str = typer.Option(
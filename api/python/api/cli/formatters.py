@@ -1,11 +1,8 @@
 from sqlmodel import Session, select
 
-from api.model import Activity, Lap, Performance, PerformancePower, Tracepoint, Zone
-from api.utils import (
-    _calculate_heart_rate_zones,
-    _calculate_pace_zones,
-    _calculate_power_zones,
-)
+from api.model import Activity, Lap, Performance, PerformancePower, Zone
+from api.track import Points
+from api.utils import calculate_zone_times
 
 
 class ActivityFormatter:
@@ -26,7 +23,7 @@ class ActivityFormatter:
             lines.append(f"  ... ({len(laps) - limit} more laps)")
         return "\n".join(lines)
 
-    def format_tracepoints(self, tracepoints: list[Tracepoint], limit: int = 10) -> str:
+    def format_tracepoints(self, tracepoints: Points, limit: int = 10) -> str:
         if not tracepoints:
             return "No tracepoints found"
 
@@ -61,7 +58,7 @@ class ActivityFormatter:
         self,
         user_id: str,
         activity: Activity,
-        tracepoints: list[Tracepoint],
+        tracepoints: Points,
     ) -> str:
         user_zones = self.session.exec(
             select(Zone).where(Zone.user_id == user_id)
@@ -78,53 +75,50 @@ class ActivityFormatter:
         pace_zone_data_display = {}
         power_zone_data_display = {}
 
-        if heart_rate_zones and any(tp.heart_rate for tp in tracepoints):
-            hr_zone_data = _calculate_heart_rate_zones(heart_rate_zones, tracepoints)
-            for zone in heart_rate_zones:
-                if zone.id in hr_zone_data:
-                    hr_zone_data_display[
-                        f"HR Zone {zone.index} (≤{zone.max_value:.0f} bpm)"
-                    ] = hr_zone_data[zone.id]
-
-        if pace_zones and activity.sport == "running":
-            pace_zone_data = _calculate_pace_zones(pace_zones, tracepoints)
-            for zone in pace_zones:
-                if zone.id in pace_zone_data:
-                    pace_min = int(zone.max_value // 60)
-                    pace_sec = int(zone.max_value % 60)
-
-                    if zone.index == 5:
+        times = calculate_zone_times(user_zones, tracepoints, activity.sport)
+
+        hr_zone_data = times["heart_rate"]
+        for zone in heart_rate_zones:
+            if zone.id in hr_zone_data:
+                hr_zone_data_display[
+                    f"HR Zone {zone.index} (≤{zone.max_value:.0f} bpm)"
+                ] = hr_zone_data[zone.id]
+
+        pace_zone_data = times["pace"]
+        for zone in pace_zones:
+            if zone.id in pace_zone_data:
+                pace_min = int(zone.max_value // 60)
+                pace_sec = int(zone.max_value % 60)
+
+                if zone.index == 5:
+                    zone_label = (
+                        f"Pace Zone {zone.index} (≤{pace_min}:{pace_sec:02d} /km)"
+                    )
+                elif zone.index == 1:
+                    zone_label = (
+                        f"Pace Zone {zone.index} (>{pace_min}:{pace_sec:02d} /km)"
+                    )
+                else:
+                    faster_zone = next(
+                        (z for z in pace_zones if z.index == zone.index + 1), None
+                    )
+                    if faster_zone:
+                        faster_min = int(faster_zone.max_value // 60)
+                        faster_sec = int(faster_zone.max_value % 60)
+                        zone_label = f"Pace Zone {zone.index} ({faster_min}:{faster_sec:02d}-{pace_min}:{pace_sec:02d} /km)"
+                    else:
                         zone_label = (
                             f"Pace Zone {zone.index} (≤{pace_min}:{pace_sec:02d} /km)"
                         )
-                    elif zone.index == 1:
-                        zone_label = (
-                            f"Pace Zone {zone.index} (>{pace_min}:{pace_sec:02d} /km)"
-                        )
-                    else:
-                        faster_zone = next(
-                            (z for z in pace_zones if z.index == zone.index + 1), None
-                        )
-                        if faster_zone:
-                            faster_min = int(faster_zone.max_value // 60)
-                            faster_sec = int(faster_zone.max_value % 60)
-                            zone_label = f"Pace Zone {zone.index} ({faster_min}:{faster_sec:02d}-{pace_min}:{pace_sec:02d} /km)"
-                        else:
-                            zone_label = f"Pace Zone {zone.index} (≤{pace_min}:{pace_sec:02d} /km)"
 
-                    pace_zone_data_display[zone_label] = pace_zone_data[zone.id]
+                pace_zone_data_display[zone_label] = pace_zone_data[zone.id]
 
-        if (
-            power_zones
-            and activity.sport == "cycling"
-            and any(tp.power for tp in tracepoints)
-        ):
-            power_zone_data = _calculate_power_zones(power_zones, tracepoints)
-            for zone in power_zones:
-                if zone.id in power_zone_data:
-                    power_zone_data_display[
-                        f"Power Zone {zone.index} (≤{zone.max_value:.0f} W)"
-                    ] = power_zone_data[zone.id]
+        power_zone_data = times["power"]
+        for zone in power_zones:
+            if zone.id in power_zone_data:
+                power_zone_data_display[
+                    f"Power Zone {zone.index} (≤{zone.max_value:.0f} W)"
+                ] = power_zone_data[zone.id]
 
         if (
             not hr_zone_data_display
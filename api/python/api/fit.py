@@ -1,26 +1,14 @@
-import math
 import os
 import uuid
+from collections.abc import Buffer, Sequence
 
 from pydantic import ValidationInfo, field_validator
 from sqlmodel import Session
 
 import api.api
-from api.model import (
-    Activity,
-    ActivityBase,
-    Lap,
-    LapBase,
-    Tracepoint,
-    TracepointBase,
-)
-from api.utils import (
-    METERS_PER_DEGREE,
-    get_activity_location,
-    get_delta_lat_lon,
-    get_lat_lon,
-    get_uuid,
-)
+from api.model import Activity, ActivityBase, Lap, LapBase
+from api.track import TRACK_FIELDS, TrackArray
+from api.utils import get_activity_location, get_delta_lat_lon, get_uuid
 
 SPEED_MS_TO_KMH = 3.6
 SPEED_CONVERSION_DIVISOR = 1000.0
@@ -28,7 +16,45 @@ ALTITUDE_CONVERSION_DIVISOR = 5.0
 ALTITUDE_CONVERSION_OFFSET = 500.0
 TOTAL_TRAINING_EFFECT_DIVISOR = 10.0
 
-SPEED_SMOOTHING_WINDOW_SIZE = 10
+# Record fields whose value is dropped when their *_valid flag is unset
+OPTIONAL_COLUMNS = ("power", "temperature")
+
+# Tracepoint fields read from another column than their own: speeds are
+# smoothed and converted to km/h by the extension
+FIELD_COLUMNS = {"speed": "smoothed_speed"}
+
+# Values of the track fields left out of a projection
+TRACK_PLACEHOLDERS = {
+    "lat": 0.0,
+    "lon": 0.0,
+    "timestamp": 0,
+    "distance": 0,
+    "heart_rate": None,
+    "speed": 0,
+    "power": None,
+    "altitude": None,
+    "temperature": None,
+    "cadence": None,
+}
+
+# struct format codes of the buffers returned by get_fit(..., columnar=True)
+COLUMN_FORMATS = {
+    "lat": "d",
+    "lon": "d",
+    "timestamp": "I",
+    "distance": "I",
+    "speed": "I",
+    "smoothed_speed": "d",
+    "altitude": "I",
+    "heart_rate": "B",
+    "heart_rate_valid": "B",
+    "cadence": "B",
+    "cadence_valid": "B",
+    "power": "H",
+    "power_valid": "B",
+    "temperature": "b",
+    "temperature_valid": "B",
+}
 
 
 class ActivityCreate(ActivityBase):
@@ -68,16 +94,46 @@ class LapCreate(LapBase):
     pass
 
 
-class TracepointCreate(TracepointBase):
-    @field_validator("speed", mode="before")
-    @classmethod
-    def speed_ms(cls, value: int) -> float:
-        return value * SPEED_MS_TO_KMH / SPEED_CONVERSION_DIVISOR
+def get_columns(data_points: dict) -> dict[str, memoryview]:
+    """Typed zero-copy views over the columnar data points of a parsed FIT file.
 
-    @field_validator("altitude", mode="before")
-    @classmethod
-    def altitude_m(cls, value: int) -> float:
-        return value / ALTITUDE_CONVERSION_DIVISOR - ALTITUDE_CONVERSION_OFFSET
+    Columns left out of a `fields=` projection are omitted.
+    """
+    return {
+        name: memoryview(data_points[name]).cast(fmt)
+        for name, fmt in COLUMN_FORMATS.items()
+        if data_points.get(name) is not None
+    }
+
+
+def get_track(data_points: dict) -> TrackArray:
+    """Track over the columnar data points of a parsed FIT file.
+
+    Columns are used as is unless their values need converting; fields left out
+    of a `fields=` projection hold placeholder values.
+    """
+    columns = get_columns(data_points)
+    length = data_points["len"]
+
+    values: dict[str, Sequence] = {}
+    for name in TRACK_FIELDS:
+        column = columns.get(FIELD_COLUMNS.get(name, name))
+        if column is None:
+            values[name] = [TRACK_PLACEHOLDERS[name]] * length
+        elif name in OPTIONAL_COLUMNS:
+            values[name] = [
+                value if valid else None
+                for value, valid in zip(column, columns[f"{name}_valid"])
+            ]
+        elif name == "altitude":
+            values[name] = [
+                value / ALTITUDE_CONVERSION_DIVISOR - ALTITUDE_CONVERSION_OFFSET
+                for value in column
+            ]
+        else:
+            values[name] = column
+
+    return TrackArray(**values)
 
 
 def get_activity_from_fit(
@@ -87,12 +143,90 @@ def get_activity_from_fit(
     description: str = "",
     race: bool = False,
     fit_name: str | None = None,
-) -> tuple[Activity, list[Lap], list[Tracepoint]]:
-    fit = api.api.get_fit(fit_file)
+) -> tuple[Activity, list[Lap], TrackArray]:
+    fit = api.api.get_fit(fit_file, columnar=True)
+
+    return _build_activity(
+        session,
+        fit,
+        get_uuid(fit_file),
+        title,
+        description,
+        race,
+        fit_name if fit_name is not None else os.path.basename(fit_file),
+    )
+
+
+def get_activity_from_fit_bytes(
+    session: Session,
+    fit_data: Buffer,
+    fit_name: str,
+    title: str = "Activity",
+    description: str = "",
+    race: bool = False,
+) -> tuple[Activity, list[Lap], TrackArray]:
+    """Parse an uploaded FIT file.
+
+    Unlike files read from disk, whose id is derived from their name, an upload
+    gets a random id: names are not unique across users or re-uploads.
+    """
+    fit = api.api.get_fit_bytes(fit_data, columnar=True)
 
+    return _build_activity(
+        session, fit, uuid.uuid4(), title, description, race, fit_name
+    )
+
+
+def get_tracepoints_from_fit(fit_file: str, fields: Sequence[str]) -> TrackArray:
+    """Read only the given record fields of a FIT file into a track.
+
+    The whole file is still parsed, but laps, session data and the other record
+    fields are not converted nor turned into Python objects; the track keeps
+    placeholder values for them, so this is only meant for computations reading
+    `fields` (zones, power curves, ...).
+    """
+    fit = api.api.get_fit(
+        fit_file, columnar=True, fields=list(fields), messages=["record"]
+    )
+    return get_track(fit["data_points"])
+
+
+def get_activities_from_fits(
+    session: Session,
+    fit_files: list[str],
+    threads: int | None = None,
+) -> list[tuple[Activity, list[Lap], TrackArray] | Exception]:
+    """Parse FIT files in parallel; a failing file yields its exception in place."""
+    fits = api.api.get_fits(fit_files, threads=threads, columnar=True)
+
+    return [
+        fit
+        if isinstance(fit, Exception)
+        else _build_activity(
+            session,
+            fit,
+            get_uuid(fit_file),
+            "Activity",
+            "",
+            False,
+            os.path.basename(fit_file),
+        )
+        for fit_file, fit in zip(fit_files, fits)
+    ]
+
+
+def _build_activity(
+    session: Session,
+    fit: dict,
+    activity_id: uuid.UUID,
+    title: str,
+    description: str,
+    race: bool,
+    fit_name: str,
+) -> tuple[Activity, list[Lap], TrackArray]:
     activity_create = ActivityCreate(
-        id=get_uuid(fit_file),
-        fit=fit_name if fit_name is not None else os.path.basename(fit_file),
+        id=activity_id,
+        fit=fit_name,
         title=title,
         description=description,
         race=race,
@@ -103,39 +237,21 @@ def get_activity_from_fit(
         LapCreate(id=uuid.uuid4(), activity_id=activity_create.id, **lap)
         for lap in fit.get("laps", [])
     ]
-    tracepoints_create = [
-        TracepointCreate(id=uuid.uuid4(), activity_id=activity_create.id, **point)
-        for point in fit.get("data_points", [])
-    ]
-
     activity = Activity(**activity_create.model_dump())
 
     laps = [Lap(**lap.model_dump()) for lap in laps_create]
-    tracepoints = [Tracepoint(**point.model_dump()) for point in tracepoints_create]
+    track = get_track(fit["data_points"])
 
-    activity.lat, activity.lon = get_lat_lon(tracepoints)
+    bounds = fit["track"]
+    activity.lat, activity.lon = bounds["lat"], bounds["lon"]
 
-    if len(tracepoints) > 0:
+    if len(track) > 0:
         activity.city, activity.subdivision, activity.country = get_activity_location(
-            session, tracepoints[0].lat, tracepoints[0].lon
-        )
-
-    values = []
-    max_distance = 1.0
-    for dp in tracepoints:
-        values.append(dp.speed)
-        if len(values) >= SPEED_SMOOTHING_WINDOW_SIZE:
-            dp.speed = sum(values) / len(values)
-            values.pop(0)
-
-        distance = (
-            math.sqrt((dp.lat - activity.lat) ** 2 + (dp.lon - activity.lon) ** 2)
-            * METERS_PER_DEGREE
+            session, track.lat[0], track.lon[0]
         )
-        max_distance = max(max_distance, distance)
 
     activity.delta_lat, activity.delta_lon = get_delta_lat_lon(
-        activity.lat, max_distance
+        activity.lat, bounds["max_distance"]
     )
 
-    return activity, laps, tracepoints
+    return activity, laps, track
@@ -1,21 +1,42 @@
 import datetime
-import uuid
-from collections import defaultdict
+import heapq
+from collections import defaultdict, deque
+from collections.abc import Iterable
+from fractions import Fraction
+from itertools import accumulate
 from typing import Any
 
-from sqlmodel import Session, col, select
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, col, delete, select
 
 from api.model import (
     Activity,
-    ActivityZoneHeartRate,
-    ActivityZonePace,
-    ActivityZonePower,
+    DailyFitness,
+    DailyStatistic,
     Ftp,
+    TrainingLoad,
+    WeeklyZoneTime,
     Zone,
 )
+from api.utils import ACTIVITY_ZONE_MODELS
 
 type ZonesByType = dict[str, list[Zone]]
-type ZoneTimeData = dict[uuid.UUID, float]
+
+FITNESS_DAYS = 730  # Days of fitness scores returned by default
+FITNESS_WEEKS = 104  # Weeks of weekly metrics returned by default
+FITNESS_MAX_DAYS = 912  # Days of fitness scores or training loads returned at most
+# Dates accepted for fitness scores and training loads, as activity start times
+# are Unix timestamps and computations step a week past the requested days
+FITNESS_MIN_DATE = datetime.date(1970, 1, 1)
+FITNESS_MAX_DATE = datetime.date(9999, 12, 1)
+FITNESS_WINDOW_DAYS = 42  # Days before a day whose activities count for its score
+FITNESS_SPORTS = ("running", "cycling", "swimming")
+FITNESS_SCORE_KEYS = ("overall", *FITNESS_SPORTS)
+TRAINING_LOAD_DAYS = 365  # Days of training load returned by default
+CTL_DAYS = 42  # Time constant of the chronic training load (fitness)
+ATL_DAYS = 7  # Time constant of the acute training load (fatigue)
+FTP_WINDOW_DAYS = 180  # Days before a day whose cycling activities count for its FTP
 
 
 def estimate_running_tss(
@@ -116,181 +137,501 @@ def calculate_activity_score(activity, sport_filter=None):
     return activity_score
 
 
-def calculate_fitness_and_weekly_data(session: Session, user_id: str):
-    """Calculate fitness scores and weekly metrics for a user over the past 2.5 years"""
-    end_date = datetime.datetime.now()
-    total_days = int(365 * 2.5)
-    start_date = end_date - datetime.timedelta(days=total_days)
-    start_timestamp = int(start_date.timestamp())
-
-    activities = session.exec(
-        select(Activity).where(
-            Activity.user_id == user_id,
-            Activity.status == "created",
-            Activity.start_time >= start_timestamp,
-        )
-    ).all()
+def calculate_fitness_and_weekly_data(
+    session: Session,
+    user_id: str,
+    start: datetime.date | None = None,
+    end: datetime.date | None = None,
+    resolution: str = "day",
+):
+    """Calculate daily fitness scores and weekly metrics for a user.
+
+    Scores are given from `start` to `end` (by default the last 730 days), every
+    day or every week back from `end`, and weekly metrics for the weeks of these
+    days (by default the last 104 weeks). Scores are read from the stored daily
+    fitness and weekly metrics are summed from the stored daily statistics, see
+    `update_daily_aggregates`.
+    """
+    end = end or datetime.date.today()
+    if start is None:
+        start = end - datetime.timedelta(days=FITNESS_DAYS - 1)
+        first_week = _week_start(end) - datetime.timedelta(weeks=FITNESS_WEEKS - 1)
+    else:
+        first_week = _week_start(start)
+
+    stored_scores = {
+        daily_fitness.date: daily_fitness
+        for daily_fitness in session.exec(
+            select(DailyFitness).where(
+                DailyFitness.user_id == user_id,
+                DailyFitness.date >= start,
+                DailyFitness.date <= end,
+            )
+        ).all()
+    }
 
+    step = 7 if resolution == "week" else 1
     daily_scores = []
+    for days_back in range(0, (end - start).days + 1, step):
+        date = end - datetime.timedelta(days=days_back)
+        daily_fitness = stored_scores.get(date)
+        daily_scores.append(
+            {
+                "date": date.strftime("%Y-%m-%d"),
+                **{
+                    key: getattr(daily_fitness, key) if daily_fitness else 0
+                    for key in FITNESS_SCORE_KEYS
+                },
+            }
+        )
+    daily_scores.reverse()
 
-    for days_back in range(total_days):
-        day_date = end_date - datetime.timedelta(days=days_back)
-        day_start = day_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        day_end = day_start + datetime.timedelta(days=1)
-
-        day_end_ts = int(day_end.timestamp())
-
-        fitness_window_start = day_start - datetime.timedelta(days=42)
-        fitness_window_start_ts = int(fitness_window_start.timestamp())
+    last_day = _week_start(end) + datetime.timedelta(days=6)
+    n_days = (last_day - first_week).days + 1
+    tss_sums = [0.0] * n_days
+    distance_sums = {sport: [0.0] * n_days for sport in FITNESS_SPORTS}
+    time_sums = {sport: [0.0] * n_days for sport in FITNESS_SPORTS}
+
+    for statistic in session.exec(
+        select(DailyStatistic).where(
+            DailyStatistic.user_id == user_id,
+            DailyStatistic.date >= first_week,
+            DailyStatistic.date <= last_day,
+        )
+    ).all():
+        day = (statistic.date - first_week).days
+        tss_sums[day] += statistic.training_stress_score
+        if statistic.sport in distance_sums:
+            distance_sums[statistic.sport][day] += statistic.total_distance / 1000.0
+            time_sums[statistic.sport][day] += statistic.total_timer_time / 3600.0
 
-        relevant_activities = [
-            activity
-            for activity in activities
-            if fitness_window_start_ts <= activity.start_time < day_end_ts
-        ]
+    weekly_tss_data = []
+    weekly_sport_data: dict[str, list[dict[str, Any]]] = {
+        sport: [] for sport in FITNESS_SPORTS
+    }
+    for week in range(n_days // 7):
+        week_start = first_week + datetime.timedelta(weeks=week)
+        days = slice(week * 7, week * 7 + 7)
+        week_str = week_start.strftime("%Y-%m-%d")
 
-        if not relevant_activities:
-            daily_scores.append(
+        weekly_tss_data.append(
+            {"week_start": week_str, "total_tss": sum(tss_sums[days])}
+        )
+        for sport, sport_data in weekly_sport_data.items():
+            sport_data.append(
                 {
-                    "date": day_date.strftime("%Y-%m-%d"),
-                    "overall": 0,
-                    "running": 0,
-                    "cycling": 0,
-                    "swimming": 0,
+                    "week_start": week_str,
+                    "distance": round(sum(distance_sums[sport][days]), 2),
+                    "time": round(sum(time_sums[sport][days]), 2),
                 }
             )
-            continue
 
-        weighted_scores = {
-            "overall": 0.0,
-            "running": 0.0,
-            "cycling": 0.0,
-            "swimming": 0.0,
-        }
+    return {
+        "scores": daily_scores,
+        "weekly_tss": weekly_tss_data,
+        "weekly_running": weekly_sport_data["running"],
+        "weekly_cycling": weekly_sport_data["cycling"],
+        "weekly_swimming": weekly_sport_data["swimming"],
+    }
 
-        for activity in relevant_activities:
-            days_before = (day_end_ts - activity.start_time) / 86400
 
-            decay_factor = max(0.1, 1.0 - (days_before / 42) * 0.5)
+def calculate_daily_fitness(
+    session: Session, user_id: str, start: datetime.date, end: datetime.date
+) -> list[DailyFitness]:
+    """Calculate the fitness scores of every day from `start` to `end`.
+
+    Activities are scored once and summed per local day. The fitness score of a
+    day weights each activity of the 43 days up to it by a decay linear in its
+    start time, so it only needs the window sums of scores and of scores times
+    start times, which are read from running totals of the daily sums.
+    """
+    first_day = start - datetime.timedelta(days=FITNESS_WINDOW_DAYS)
+    n_days = (end - first_day).days + 1
+    origin = _day_timestamp(first_day)
+
+    # Daily sums of scores and of scores times start times (relative to the
+    # first day, to keep precision), overall and by sport
+    score_sums = {key: [0.0] * n_days for key in FITNESS_SCORE_KEYS}
+    weighted_time_sums = {key: [0.0] * n_days for key in FITNESS_SCORE_KEYS}
+
+    for activity in _fitness_activities(session, user_id, first_day, end):
+        day = (datetime.date.fromtimestamp(activity.start_time) - first_day).days
+        score = calculate_activity_score(activity)
+        for key in ("overall", activity.sport):
+            if key in score_sums:
+                score_sums[key][day] += score
+                weighted_time_sums[key][day] += score * (activity.start_time - origin)
+
+    score_totals = {key: _running_totals(sums) for key, sums in score_sums.items()}
+    weighted_time_totals = {
+        key: _running_totals(sums) for key, sums in weighted_time_sums.items()
+    }
 
-            overall_score = calculate_activity_score(activity) * decay_factor
-            running_score = calculate_activity_score(activity, "running") * decay_factor
-            cycling_score = calculate_activity_score(activity, "cycling") * decay_factor
-            swimming_score = (
-                calculate_activity_score(activity, "swimming") * decay_factor
+    daily_fitness = []
+    for day in range(FITNESS_WINDOW_DAYS, n_days):
+        date = first_day + datetime.timedelta(days=day)
+        window_start = day - FITNESS_WINDOW_DAYS
+        day_end = _day_timestamp(date + datetime.timedelta(days=1)) - origin
+
+        scores = {}
+        for key in FITNESS_SCORE_KEYS:
+            total = score_totals[key][day + 1] - score_totals[key][window_start]
+            weighted_time = (
+                weighted_time_totals[key][day + 1]
+                - weighted_time_totals[key][window_start]
+            )
+            # Each activity counts for 1 - days_before / 84, days_before being
+            # the days from its start to the end of the day (at most 43, so the
+            # decay never reaches its 0.1 floor)
+            weighted = total - (day_end * total - weighted_time) / (
+                2 * FITNESS_WINDOW_DAYS * 86400
             )
+            scores[key] = min(200, max(0, int(weighted * 0.5)))
 
-            weighted_scores["overall"] += overall_score
-            weighted_scores["running"] += running_score
-            weighted_scores["cycling"] += cycling_score
-            weighted_scores["swimming"] += swimming_score
+        daily_fitness.append(DailyFitness(user_id=user_id, date=date, **scores))
 
-        final_scores = {
-            sport: min(200, max(0, int(score * 0.5)))
-            for sport, score in weighted_scores.items()
-        }
+    return daily_fitness
 
-        daily_scores.append(
-            {
-                "date": day_date.strftime("%Y-%m-%d"),
-                "overall": final_scores["overall"],
-                "running": final_scores["running"],
-                "cycling": final_scores["cycling"],
-                "swimming": final_scores["swimming"],
-            }
-        )
 
-    daily_scores.reverse()
+def update_daily_aggregates(
+    session: Session, user_id: str, date: datetime.date
+) -> None:
+    """Update the stored daily statistics, weekly zone times, fitness scores and
+    training loads after an activity on `date` was created, deleted or
+    recomputed."""
+    if not build_missing_daily_aggregates(session, user_id):
+        store_daily_statistics(session, user_id, date, date)
+        store_weekly_zone_times(session, user_id, _week_start(date))
+        update_daily_fitness(session, user_id, date)
+    reset_training_load(session, user_id, date)
 
-    days_to_skip = total_days - 730
 
-    weekly_tss_data = []
-    weekly_running_data = []
-    weekly_cycling_data = []
-    weekly_swimming_data = []
-    current_date = datetime.datetime.now()
+def build_missing_daily_aggregates(session: Session, user_id: str) -> bool:
+    """Store the daily statistics, weekly zone times and fitness scores of a user
+    whose activities were all created before these were stored, and return
+    whether they were.
 
-    for weeks_back in range(104):
-        week_start = current_date - datetime.timedelta(weeks=weeks_back)
-        week_start = week_start - datetime.timedelta(days=week_start.weekday())
-        week_start = week_start.replace(hour=0, minute=0, second=0, microsecond=0)
-        week_end = week_start + datetime.timedelta(days=7)
+    Every created activity has a daily statistic, so the activities are only
+    looked for when the user has none.
+    """
+    if session.exec(
+        select(DailyStatistic.date).where(DailyStatistic.user_id == user_id).limit(1)
+    ).first():
+        return False
+    if not session.exec(
+        select(Activity.id)
+        .where(Activity.user_id == user_id, Activity.status == "created")
+        .limit(1)
+    ).first():
+        return False
+
+    # Concurrent first requests can build them at once, the rows of the others
+    # are then kept
+    try:
+        with session.begin_nested():
+            store_daily_statistics(session, user_id)
+            store_weekly_zone_times(session, user_id)
+            rebuild_daily_fitness(session, user_id)
+    except IntegrityError:
+        return False
+    return True
+
+
+def store_daily_statistics(
+    session: Session,
+    user_id: str,
+    start: datetime.date | None = None,
+    end: datetime.date | None = None,
+) -> None:
+    """Store the totals of the user's activities of each day and sport from
+    `start` to `end`, by default of all days."""
+    delete_query = delete(DailyStatistic).where(col(DailyStatistic.user_id) == user_id)
+    activity_query = select(
+        Activity.sport,
+        Activity.start_time,
+        Activity.total_distance,
+        Activity.total_timer_time,
+        Activity.total_ascent,
+        Activity.training_stress_score,
+    ).where(Activity.user_id == user_id, Activity.status == "created")
+    if start is not None:
+        delete_query = delete_query.where(col(DailyStatistic.date) >= start)
+        activity_query = activity_query.where(
+            Activity.start_time >= _day_timestamp(start)
+        )
+    if end is not None:
+        delete_query = delete_query.where(col(DailyStatistic.date) <= end)
+        activity_query = activity_query.where(
+            Activity.start_time < _day_timestamp(end + datetime.timedelta(days=1))
+        )
+    session.exec(delete_query)
+
+    statistics: dict[tuple[datetime.date, str], DailyStatistic] = {}
+    for (
+        sport,
+        start_time,
+        total_distance,
+        total_timer_time,
+        total_ascent,
+        training_stress_score,
+    ) in session.exec(activity_query):
+        date = datetime.date.fromtimestamp(start_time)
+        if (date, sport) not in statistics:
+            statistics[(date, sport)] = DailyStatistic(
+                user_id=user_id, date=date, sport=sport
+            )
+        statistic = statistics[(date, sport)]
+        statistic.n_activities += 1
+        statistic.total_distance += total_distance or 0.0
+        statistic.total_timer_time += total_timer_time or 0.0
+        statistic.total_ascent += total_ascent or 0.0
+        statistic.training_stress_score += training_stress_score or 0.0
+    session.add_all(statistics.values())
 
-        week_start_ts = int(week_start.timestamp())
-        week_end_ts = int(week_end.timestamp())
 
-        week_activities = [
-            activity
-            for activity in activities
-            if week_start_ts <= activity.start_time < week_end_ts
-        ]
+def update_daily_fitness(session: Session, user_id: str, date: datetime.date) -> None:
+    """Update the stored fitness scores after an activity on `date` was created,
+    deleted or recomputed.
 
-        total_tss = sum(
-            activity.training_stress_score or 0.0 for activity in week_activities
-        )
+    Only the days whose window contains `date` can change.
+    """
+    store_daily_fitness(
+        session, user_id, date, date + datetime.timedelta(days=FITNESS_WINDOW_DAYS)
+    )
 
-        running_activities = [a for a in week_activities if a.sport == "running"]
-        running_distance = sum(
-            (a.total_distance or 0) / 1000.0 for a in running_activities
-        )
-        running_time = sum(
-            (a.total_timer_time or 0) / 3600.0 for a in running_activities
-        )
-        cycling_activities = [a for a in week_activities if a.sport == "cycling"]
-        cycling_distance = sum(
-            (a.total_distance or 0) / 1000.0 for a in cycling_activities
-        )
-        cycling_time = sum(
-            (a.total_timer_time or 0) / 3600.0 for a in cycling_activities
-        )
-        swimming_activities = [a for a in week_activities if a.sport == "swimming"]
-        swimming_distance = sum(
-            (a.total_distance or 0) / 1000.0 for a in swimming_activities
+
+def rebuild_daily_fitness(session: Session, user_id: str) -> None:
+    """Recompute all the stored fitness scores of a user."""
+    first_start_time, last_start_time = session.exec(
+        select(func.min(Activity.start_time), func.max(Activity.start_time)).where(
+            Activity.user_id == user_id, Activity.status == "created"
         )
-        swimming_time = sum(
-            (a.total_timer_time or 0) / 3600.0 for a in swimming_activities
+    ).one()
+    start = end = datetime.date.today()
+    if first_start_time is not None and last_start_time is not None:
+        start = datetime.date.fromtimestamp(first_start_time)
+        end = datetime.date.fromtimestamp(last_start_time) + datetime.timedelta(
+            days=FITNESS_WINDOW_DAYS
         )
+    store_daily_fitness(session, user_id, start, end, clear=True)
 
-        week_str = week_start.strftime("%Y-%m-%d")
 
-        weekly_tss_data.append({"week_start": week_str, "total_tss": total_tss})
+def store_daily_fitness(
+    session: Session,
+    user_id: str,
+    start: datetime.date,
+    end: datetime.date,
+    clear: bool = False,
+) -> None:
+    """Store the fitness scores of the days from `start` to `end`.
 
-        weekly_running_data.append(
-            {
-                "week_start": week_str,
-                "distance": round(running_distance, 2),
-                "time": round(running_time, 2),
-            }
+    Only days with a non-zero score are stored. With `clear`, stored days out of
+    the range are deleted too.
+    """
+    query = select(DailyFitness).where(DailyFitness.user_id == user_id)
+    if not clear:
+        query = query.where(DailyFitness.date >= start, DailyFitness.date <= end)
+    stored = {
+        daily_fitness.date: daily_fitness for daily_fitness in session.exec(query)
+    }
+
+    for daily_fitness in calculate_daily_fitness(session, user_id, start, end):
+        scores = {key: getattr(daily_fitness, key) for key in FITNESS_SCORE_KEYS}
+        if not any(scores.values()):
+            continue
+        existing = stored.pop(daily_fitness.date, None)
+        if existing:
+            existing.sqlmodel_update(scores)
+            session.add(existing)
+        else:
+            session.add(daily_fitness)
+
+    for daily_fitness in stored.values():
+        session.delete(daily_fitness)
+
+
+def calculate_training_load(
+    session: Session,
+    user_id: str,
+    start: datetime.date | None = None,
+    end: datetime.date | None = None,
+    sports: bool = False,
+):
+    """Calculate the daily training load of a user from `start` to `end` (by
+    default the last 365 days), overall and optionally by sport.
+
+    Chronic (CTL) and acute (ATL) training loads are exponentially weighted
+    averages of daily TSS over 42 and 7 days, and the stress balance (TSB) of a
+    day is the CTL minus the ATL of the day before. The loads are resumed from
+    those stored at the end of a day before `start`, and the loads of the day
+    before `start` are stored for the next requests.
+    """
+    end = end or datetime.date.today()
+    start = start or end - datetime.timedelta(days=TRAINING_LOAD_DAYS - 1)
+    seed_day = start - datetime.timedelta(days=1)
+    keys = FITNESS_SCORE_KEYS if sports else ("overall",)
+
+    stored_loads = {
+        training_load.sport: training_load
+        for training_load in session.exec(
+            select(TrainingLoad).where(
+                TrainingLoad.user_id == user_id, col(TrainingLoad.sport).in_(keys)
+            )
+        ).all()
+    }
+    seed_loads = {
+        sport: training_load
+        for sport, training_load in stored_loads.items()
+        if training_load.date <= seed_day
+    }
+
+    # Without stored loads, start from zero before the first activity
+    first_day = seed_day
+    if len(seed_loads) < len(keys):
+        first_start_time = session.exec(
+            select(func.min(Activity.start_time)).where(
+                Activity.user_id == user_id, Activity.status == "created"
+            )
+        ).one()
+        if first_start_time is not None:
+            first_day = min(first_day, datetime.date.fromtimestamp(first_start_time))
+    for training_load in seed_loads.values():
+        first_day = min(first_day, training_load.date + datetime.timedelta(days=1))
+
+    n_days = (end - first_day).days + 1
+    daily_tss = {key: [0.0] * n_days for key in keys}
+    for sport, start_time, training_stress_score in session.exec(
+        select(
+            Activity.sport, Activity.start_time, Activity.training_stress_score
+        ).where(
+            Activity.user_id == user_id,
+            Activity.status == "created",
+            col(Activity.training_stress_score).is_not(None),
+            Activity.start_time >= _day_timestamp(first_day),
+            Activity.start_time < _day_timestamp(end + datetime.timedelta(days=1)),
         )
+    ).all():
+        day = (datetime.date.fromtimestamp(start_time) - first_day).days
+        for key in ("overall", sport):
+            if key in daily_tss:
+                daily_tss[key][day] += training_stress_score
+
+    series = {}
+    for key in keys:
+        seed_load = seed_loads.get(key)
+        ctl, atl = (seed_load.ctl, seed_load.atl) if seed_load else (0.0, 0.0)
+        date = seed_load.date + datetime.timedelta(days=1) if seed_load else first_day
+
+        series[key] = []
+        while date <= end:
+            tss = daily_tss[key][(date - first_day).days]
+            tsb = ctl - atl
+            ctl += (tss - ctl) / CTL_DAYS
+            atl += (tss - atl) / ATL_DAYS
+            if date >= start:
+                series[key].append(
+                    {
+                        "date": date.strftime("%Y-%m-%d"),
+                        "tss": round(tss, 1),
+                        "ctl": round(ctl, 1),
+                        "atl": round(atl, 1),
+                        "tsb": round(tsb, 1),
+                    }
+                )
+            elif date == seed_day:
+                _store_training_load(
+                    session, stored_loads.get(key), user_id, key, date, ctl, atl
+                )
+            date += datetime.timedelta(days=1)
 
-        weekly_cycling_data.append(
-            {
-                "week_start": week_str,
-                "distance": round(cycling_distance, 2),
-                "time": round(cycling_time, 2),
-            }
+    load: dict[str, Any] = {"load": series["overall"]}
+    if sports:
+        load["sports"] = {sport: series[sport] for sport in FITNESS_SPORTS}
+    return load
+
+
+def reset_training_load(session: Session, user_id: str, date: datetime.date) -> None:
+    """Remove the stored training loads that an activity on `date` changes."""
+    session.exec(
+        delete(TrainingLoad).where(
+            col(TrainingLoad.user_id) == user_id, col(TrainingLoad.date) >= date
         )
+    )
 
-        weekly_swimming_data.append(
-            {
-                "week_start": week_str,
-                "distance": round(swimming_distance, 2),
-                "time": round(swimming_time, 2),
-            }
+
+def _store_training_load(
+    session: Session,
+    training_load: TrainingLoad | None,
+    user_id: str,
+    sport: str,
+    date: datetime.date,
+    ctl: float,
+    atl: float,
+) -> None:
+    # Only move stored loads forward, as requests are mostly for recent days.
+    # Concurrent requests can store the same load: a new row is inserted in a
+    # savepoint, and a row stored in the meantime is updated instead.
+    if training_load is None:
+        try:
+            with session.begin_nested():
+                session.add(
+                    TrainingLoad(
+                        user_id=user_id, sport=sport, date=date, ctl=ctl, atl=atl
+                    )
+                )
+            return
+        except IntegrityError:
+            pass
+    elif training_load.date >= date:
+        return
+    statement = (
+        update(TrainingLoad)
+        .where(
+            col(TrainingLoad.user_id) == user_id,
+            col(TrainingLoad.sport) == sport,
+            col(TrainingLoad.date) < date,
+        )
+        .values(date=date, ctl=ctl, atl=atl)
+    )
+    session.execute(statement)  # ty: ignore[deprecated]
+
+
+def _fitness_activities(
+    session: Session, user_id: str, first_day: datetime.date, last_day: datetime.date
+):
+    """Columns of the user's activities from `first_day` to `last_day` used by
+    fitness scores."""
+    return session.exec(
+        select(
+            Activity.sport,
+            Activity.start_time,
+            Activity.total_distance,
+            Activity.total_timer_time,
+            Activity.total_ascent,
+            Activity.race,
+            Activity.training_stress_score,
+            Activity.avg_power,
+        ).where(
+            Activity.user_id == user_id,
+            Activity.status == "created",
+            Activity.start_time >= _day_timestamp(first_day),
+            Activity.start_time < _day_timestamp(last_day + datetime.timedelta(days=1)),
         )
+    ).all()
 
-    weekly_tss_data.reverse()
-    weekly_running_data.reverse()
-    weekly_cycling_data.reverse()
-    weekly_swimming_data.reverse()
 
-    return {
-        "scores": daily_scores[days_to_skip:],
-        "weekly_tss": weekly_tss_data,
-        "weekly_running": weekly_running_data,
-        "weekly_cycling": weekly_cycling_data,
-        "weekly_swimming": weekly_swimming_data,
-    }
+def _week_start(date: datetime.date) -> datetime.date:
+    return date - datetime.timedelta(days=date.weekday())
+
+
+def _day_timestamp(date: datetime.date) -> int:
+    """Timestamp of the local midnight starting the day."""
+    return int(datetime.datetime.combine(date, datetime.time()).timestamp())
+
+
+def _running_totals(values: list[float]) -> list[float]:
+    """Sums of the first 0, 1, ..., len(values) values."""
+    return [0.0, *accumulate(values)]
 
 
 def get_ftp_data(session: Session, user_id: str):
@@ -310,7 +651,7 @@ def calculate_ftp_from_activities(
 ) -> float:
     """Calculate FTP based on cycling activities from the past 6 months from a given date"""
 
-    start_date = reference_date - datetime.timedelta(days=180)  # 6 months
+    start_date = reference_date - datetime.timedelta(days=FTP_WINDOW_DAYS)
     start_timestamp = int(
         datetime.datetime.combine(start_date, datetime.time.min).timestamp()
     )
@@ -396,6 +737,10 @@ def calculate_ftp_from_activities(
             return sum(all_avg_powers) / len(all_avg_powers)
         return 0.0
 
+    return _average_ftp_estimates(ftp_estimates)
+
+
+def _average_ftp_estimates(ftp_estimates: list[float]) -> float:
     # Remove outliers (values more than 50% different from median)
     ftp_estimates.sort()
     if len(ftp_estimates) >= 3:
@@ -410,6 +755,204 @@ def calculate_ftp_from_activities(
     return sum(ftp_estimates) / len(ftp_estimates)
 
 
+def calculate_ftp_history(
+    session: Session, user_id: str, dates: Iterable[datetime.date]
+) -> dict[datetime.date, float]:
+    """Calculate the FTP of a user on each of `dates`, as estimated by
+    `calculate_ftp_from_activities`, loading the cycling activities once and
+    sliding the 6 months window over the sorted dates."""
+    dates = sorted(set(dates))
+    if not dates:
+        return {}
+
+    cycling_activities = session.exec(
+        select(Activity)
+        .where(
+            Activity.user_id == user_id,
+            Activity.status == "created",
+            Activity.sport == "cycling",
+            Activity.start_time
+            >= _day_timestamp(dates[0] - datetime.timedelta(days=FTP_WINDOW_DAYS)),
+            Activity.start_time
+            < _day_timestamp(dates[-1] + datetime.timedelta(days=1)),
+            col(Activity.avg_power).is_not(None),
+        )
+        .order_by(col(Activity.start_time))
+    ).all()
+
+    window = _FtpWindow()
+    next_activity = 0
+    ftps = {}
+    for date in dates:
+        while (
+            next_activity < len(cycling_activities)
+            and datetime.date.fromtimestamp(
+                cycling_activities[next_activity].start_time
+            )
+            <= date
+        ):
+            window.add(cycling_activities[next_activity])
+            next_activity += 1
+        window.remove_before(date - datetime.timedelta(days=FTP_WINDOW_DAYS))
+        ftps[date] = window.ftp()
+    return ftps
+
+
+class _FtpWindow:
+    """Cycling activities of a sliding window, in start time order, with the
+    aggregates of each `calculate_ftp_from_activities` method.
+
+    Activities leave the window in the order they entered it, so heap entries
+    are tagged with the activity sequence number and discarded lazily once
+    older than the oldest activity of the window. Sums are kept exact so that
+    removing rides leaves no rounding error in the averages."""
+
+    def __init__(self) -> None:
+        self.activities: deque[tuple[int, datetime.date, Activity]] = deque()
+        self.count = 0
+        # Method 1 and 2 maxima, as heaps of negated powers
+        self.np_powers: list[tuple[float, int]] = []
+        self.max_powers: list[tuple[float, int]] = []
+        # Method 3 weighted sum of long rides average powers
+        self.long_ride_power = Fraction(0)
+        self.long_ride_weight = 0
+        # Method 4 high-intensity rides, split into the top quarter (min-heap)
+        # and the rest (max-heap)
+        self.top: list[tuple[float, int]] = []
+        self.rest: list[tuple[float, int]] = []
+        self.top_sequences: set[int] = set()
+        self.top_power = Fraction(0)
+        self.rest_count = 0
+        # Fallback average power
+        self.avg_power = Fraction(0)
+        self.avg_power_count = 0
+
+    def add(self, activity: Activity) -> None:
+        sequence = self.count
+        self.count += 1
+        self.activities.append(
+            (sequence, datetime.date.fromtimestamp(activity.start_time), activity)
+        )
+
+        if activity.np_power and activity.total_timer_time >= 1200:
+            heapq.heappush(self.np_powers, (-activity.np_power, sequence))
+        if activity.max_power:
+            heapq.heappush(self.max_powers, (-activity.max_power, sequence))
+        weight = self._long_ride_weight(activity)
+        if weight:
+            self.long_ride_power += Fraction(activity.avg_power) * weight
+            self.long_ride_weight += weight
+        if self._is_high_intensity(activity):
+            heapq.heappush(self.top, (activity.avg_power, sequence))
+            self.top_sequences.add(sequence)
+            self.top_power += Fraction(activity.avg_power)
+        if activity.avg_power:
+            self.avg_power += Fraction(activity.avg_power)
+            self.avg_power_count += 1
+
+    def remove_before(self, date: datetime.date) -> None:
+        while self.activities and self.activities[0][1] < date:
+            sequence, _, activity = self.activities.popleft()
+
+            weight = self._long_ride_weight(activity)
+            if weight:
+                self.long_ride_power -= Fraction(activity.avg_power) * weight
+                self.long_ride_weight -= weight
+            if self._is_high_intensity(activity):
+                if sequence in self.top_sequences:
+                    self.top_sequences.remove(sequence)
+                    self.top_power -= Fraction(activity.avg_power)
+                else:
+                    self.rest_count -= 1
+            if activity.avg_power:
+                self.avg_power -= Fraction(activity.avg_power)
+                self.avg_power_count -= 1
+
+    def ftp(self) -> float:
+        if not self.activities:
+            return 0.0
+
+        ftp_estimates = []
+        best_20min = self._max(self.np_powers)
+        if best_20min is not None:
+            ftp_estimates.append(best_20min * 0.95)
+        best_max_power = self._max(self.max_powers)
+        if best_max_power is not None:
+            ftp_estimates.append(best_max_power * 0.85 * 0.75)
+        if self.long_ride_weight:
+            ftp_estimates.append(
+                float(self.long_ride_power) / self.long_ride_weight * 1.1
+            )
+        if self._balance_top_quarter():
+            ftp_estimates.append(float(self.top_power) / len(self.top_sequences))
+
+        if not ftp_estimates:
+            if self.avg_power_count:
+                return float(self.avg_power) / self.avg_power_count
+            return 0.0
+
+        return _average_ftp_estimates(ftp_estimates)
+
+    def _max(self, heap: list[tuple[float, int]]) -> float | None:
+        self._discard_removed(heap)
+        return -heap[0][0] if heap else None
+
+    def _balance_top_quarter(self) -> bool:
+        """Move rides between the top quarter and the rest until the top
+        quarter holds the best max(1, n // 4) of the n high-intensity rides."""
+        count = len(self.top_sequences) + self.rest_count
+        if not count:
+            return False
+        top_count = max(1, count // 4)
+
+        while len(self.top_sequences) > top_count:
+            self._move_to_rest()
+        while len(self.top_sequences) < top_count:
+            self._move_to_top()
+        while True:
+            self._discard_removed(self.top)
+            self._discard_removed(self.rest)
+            if not self.rest or -self.rest[0][0] <= self.top[0][0]:
+                return True
+            self._move_to_rest()
+            self._move_to_top()
+
+    def _move_to_rest(self) -> None:
+        self._discard_removed(self.top)
+        power, sequence = heapq.heappop(self.top)
+        self.top_sequences.remove(sequence)
+        self.top_power -= Fraction(power)
+        heapq.heappush(self.rest, (-power, sequence))
+        self.rest_count += 1
+
+    def _move_to_top(self) -> None:
+        self._discard_removed(self.rest)
+        negated_power, sequence = heapq.heappop(self.rest)
+        self.rest_count -= 1
+        heapq.heappush(self.top, (-negated_power, sequence))
+        self.top_sequences.add(sequence)
+        self.top_power -= Fraction(negated_power)
+
+    def _discard_removed(self, heap: list[tuple[float, int]]) -> None:
+        oldest = self.activities[0][0] if self.activities else self.count
+        while heap and heap[0][1] < oldest:
+            heapq.heappop(heap)
+
+    @staticmethod
+    def _long_ride_weight(activity: Activity) -> int:
+        if activity.total_timer_time >= 3600 and activity.avg_power:
+            return int(min(activity.total_timer_time / 3600 / 2, 2.0))
+        return 0
+
+    @staticmethod
+    def _is_high_intensity(activity: Activity) -> bool:
+        return bool(
+            activity.avg_power
+            and activity.total_timer_time >= 1800
+            and activity.avg_power > 200
+        )
+
+
 def update_ftp_for_date(session: Session, user_id: str, date: datetime.date) -> None:
     """Update or create FTP record for a specific date based on past 6 months of activities"""
 
@@ -431,9 +974,11 @@ def update_ftp_for_date(session: Session, user_id: str, date: datetime.date) ->
 
 
 def calculate_weekly_zone_data(session: Session, user_id: str, weeks: int = 104):
-    """Calculate weekly zone data for heart rate, pace, and power zones"""
-    current_date = datetime.datetime.now()
+    """Calculate weekly zone data for heart rate, pace, and power zones.
 
+    Zone times are read from the stored weekly zone times, see
+    `store_weekly_zone_times`.
+    """
     # Get user's zones
     user_zones = session.exec(select(Zone).where(Zone.user_id == user_id)).all()
 
@@ -447,76 +992,39 @@ def calculate_weekly_zone_data(session: Session, user_id: str, weeks: int = 104)
     for zone_type in zones_by_type:
         zones_by_type[zone_type].sort(key=lambda z: z.index)
 
-    # Compute the start of the oldest week to bound the activity query
-    oldest_week_start = current_date - datetime.timedelta(weeks=weeks)
-    oldest_week_start = oldest_week_start - datetime.timedelta(
-        days=oldest_week_start.weekday()
-    )
-    oldest_week_start = oldest_week_start.replace(
-        hour=0, minute=0, second=0, microsecond=0
-    )
-    oldest_week_start_ts = int(oldest_week_start.timestamp())
-
-    # Load all activities for the period in a single query
-    all_activities = session.exec(
-        select(Activity).where(
-            Activity.user_id == user_id,
-            Activity.status == "created",
-            Activity.start_time >= oldest_week_start_ts,
-        )
-    ).all()
-
-    activity_ids = [a.id for a in all_activities]
-    activity_sport_by_id = {a.id: a.sport for a in all_activities}
-
-    # Build start_time lookup for week bucketing
-    activity_start_by_id = {a.id: a.start_time for a in all_activities}
-
-    # Load all zone data in 3 bulk queries instead of up to 312
-    hr_by_activity: dict[uuid.UUID, list[ActivityZoneHeartRate]] = defaultdict(list)
-    pace_by_activity: dict[uuid.UUID, list[ActivityZonePace]] = defaultdict(list)
-    power_by_activity: dict[uuid.UUID, list[ActivityZonePower]] = defaultdict(list)
-
-    if activity_ids and "heart_rate" in zones_by_type:
-        for hr_zt in session.exec(
-            select(ActivityZoneHeartRate).where(
-                col(ActivityZoneHeartRate.activity_id).in_(activity_ids)
+    current_week_start = _week_start(datetime.date.today())
+    oldest_week_start = current_week_start - datetime.timedelta(weeks=weeks - 1)
+
+    # Weeks with activities, which list all the zones even without zone times
+    active_weeks = {
+        _week_start(date)
+        for date in session.exec(
+            select(DailyStatistic.date)
+            .where(
+                DailyStatistic.user_id == user_id,
+                DailyStatistic.date >= oldest_week_start,
             )
-        ).all():
-            hr_by_activity[hr_zt.activity_id].append(hr_zt)
-
-    if activity_ids and "pace" in zones_by_type:
-        for pace_zt in session.exec(
-            select(ActivityZonePace).where(
-                col(ActivityZonePace.activity_id).in_(activity_ids)
-            )
-        ).all():
-            pace_by_activity[pace_zt.activity_id].append(pace_zt)
+            .distinct()
+        ).all()
+    }
 
-    if activity_ids and "power" in zones_by_type:
-        for power_zt in session.exec(
-            select(ActivityZonePower).where(
-                col(ActivityZonePower.activity_id).in_(activity_ids)
-            )
-        ).all():
-            power_by_activity[power_zt.activity_id].append(power_zt)
+    zone_times: dict[tuple[datetime.date, str, int], dict[str, float]] = defaultdict(
+        dict
+    )
+    for weekly_zone_time in session.exec(
+        select(WeeklyZoneTime).where(
+            WeeklyZoneTime.user_id == user_id,
+            WeeklyZoneTime.week_start >= oldest_week_start,
+        )
+    ).all():
+        zone_times[
+            (weekly_zone_time.week_start, weekly_zone_time.type, weekly_zone_time.index)
+        ][weekly_zone_time.sport] = weekly_zone_time.time_in_zone
 
     weekly_zone_data = []
 
-    for weeks_back in range(weeks):
-        week_start = current_date - datetime.timedelta(weeks=weeks_back)
-        week_start = week_start - datetime.timedelta(days=week_start.weekday())
-        week_start = week_start.replace(hour=0, minute=0, second=0, microsecond=0)
-        week_end = week_start + datetime.timedelta(days=7)
-
-        week_start_ts = int(week_start.timestamp())
-        week_end_ts = int(week_end.timestamp())
-
-        week_activity_ids = {
-            act_id
-            for act_id, start_time in activity_start_by_id.items()
-            if week_start_ts <= start_time < week_end_ts
-        }
+    for weeks_back in range(weeks - 1, -1, -1):
+        week_start = current_week_start - datetime.timedelta(weeks=weeks_back)
 
         week_data: dict[str, Any] = {
             "week_start": week_start.strftime("%Y-%m-%d"),
@@ -525,75 +1033,69 @@ def calculate_weekly_zone_data(session: Session, user_id: str, weeks: int = 104)
             "power_zones": [],
         }
 
-        if week_activity_ids and "heart_rate" in zones_by_type:
-            hr_zone_totals: ZoneTimeData = {}
-            hr_zone_running_totals: ZoneTimeData = {}
-            hr_zone_cycling_totals: ZoneTimeData = {}
-
-            for act_id in week_activity_ids:
-                sport = activity_sport_by_id[act_id]
-                for zt in hr_by_activity[act_id]:
-                    zid = zt.zone_id
-                    hr_zone_totals[zid] = hr_zone_totals.get(zid, 0.0) + zt.time_in_zone
-                    if sport == "running":
-                        hr_zone_running_totals[zid] = (
-                            hr_zone_running_totals.get(zid, 0.0) + zt.time_in_zone
-                        )
-                    elif sport == "cycling":
-                        hr_zone_cycling_totals[zid] = (
-                            hr_zone_cycling_totals.get(zid, 0.0) + zt.time_in_zone
-                        )
-
-            for zone in zones_by_type["heart_rate"]:
-                week_data["heart_rate_zones"].append(
-                    {
-                        "zone_index": zone.index,
-                        "total_time": hr_zone_totals.get(zone.id, 0.0),
-                        "running_time": hr_zone_running_totals.get(zone.id, 0.0),
-                        "cycling_time": hr_zone_cycling_totals.get(zone.id, 0.0),
-                        "max_value": zone.max_value,
-                    }
-                )
-
-        if week_activity_ids and "pace" in zones_by_type:
-            pace_zone_totals: ZoneTimeData = {}
-
-            for act_id in week_activity_ids:
-                for pace_zt in pace_by_activity[act_id]:
-                    zid = pace_zt.zone_id
-                    pace_zone_totals[zid] = (
-                        pace_zone_totals.get(zid, 0.0) + pace_zt.time_in_zone
-                    )
-
-            for zone in zones_by_type["pace"]:
-                week_data["pace_zones"].append(
-                    {
-                        "zone_index": zone.index,
-                        "total_time": pace_zone_totals.get(zone.id, 0.0),
-                        "max_value": zone.max_value,
-                    }
-                )
-
-        if week_activity_ids and "power" in zones_by_type:
-            power_zone_totals: ZoneTimeData = {}
-
-            for act_id in week_activity_ids:
-                for power_zt in power_by_activity[act_id]:
-                    zid = power_zt.zone_id
-                    power_zone_totals[zid] = (
-                        power_zone_totals.get(zid, 0.0) + power_zt.time_in_zone
+        if week_start in active_weeks:
+            for zone_type, zones in zones_by_type.items():
+                for zone in zones:
+                    sport_times = zone_times.get(
+                        (week_start, zone_type, zone.index), {}
                     )
-
-            for zone in zones_by_type["power"]:
-                week_data["power_zones"].append(
-                    {
+                    zone_data = {
                         "zone_index": zone.index,
-                        "total_time": power_zone_totals.get(zone.id, 0.0),
-                        "max_value": zone.max_value,
+                        "total_time": sum(sport_times.values(), 0.0),
                     }
-                )
+                    if zone_type == "heart_rate":
+                        zone_data["running_time"] = sport_times.get("running", 0.0)
+                        zone_data["cycling_time"] = sport_times.get("cycling", 0.0)
+                    zone_data["max_value"] = zone.max_value
+                    week_data[f"{zone_type}_zones"].append(zone_data)
 
         weekly_zone_data.append(week_data)
 
-    weekly_zone_data.reverse()
     return weekly_zone_data
+
+
+def store_weekly_zone_times(
+    session: Session, user_id: str, week_start: datetime.date | None = None
+) -> None:
+    """Store the time spent in each zone by the user's activities of each sport
+    during the week starting on `week_start`, by default during all weeks."""
+    delete_query = delete(WeeklyZoneTime).where(col(WeeklyZoneTime.user_id) == user_id)
+    if week_start is not None:
+        delete_query = delete_query.where(col(WeeklyZoneTime.week_start) == week_start)
+    session.exec(delete_query)
+
+    zone_times: dict[tuple[datetime.date, str, int, str], float] = defaultdict(float)
+    for zone_type, zone_model in ACTIVITY_ZONE_MODELS.items():
+        query = (
+            select(
+                Activity.start_time,
+                Activity.sport,
+                Zone.index,
+                zone_model.time_in_zone,
+            )
+            .join(Activity, col(Activity.id) == zone_model.activity_id)
+            .join(Zone, col(Zone.id) == zone_model.zone_id)
+            .where(Activity.user_id == user_id, Activity.status == "created")
+        )
+        if week_start is not None:
+            query = query.where(
+                Activity.start_time >= _day_timestamp(week_start),
+                Activity.start_time
+                < _day_timestamp(week_start + datetime.timedelta(weeks=1)),
+            )
+        for start_time, sport, index, time_in_zone in session.exec(query).all():
+            week = _week_start(datetime.date.fromtimestamp(start_time))
+            zone_times[(week, zone_type, index, sport)] += time_in_zone
+
+    session.add_all(
+        WeeklyZoneTime(
+            user_id=user_id,
+            week_start=week,
+            type=zone_type,
+            index=index,
+            sport=sport,
+            time_in_zone=time_in_zone,
+        )
+        for (week, zone_type, index, sport), time_in_zone in zone_times.items()
+        if time_in_zone
+    )
@@ -1,8 +1,10 @@
+import bisect
 import datetime
 import uuid
+from typing import Optional
 
 from pydantic import BaseModel, field_serializer, field_validator, model_validator
-from sqlalchemy import JSON
+from sqlalchemy import ARRAY, JSON, REAL, Float, Integer
 from sqlmodel import Field, Relationship, SQLModel
 
 
@@ -138,8 +140,8 @@ class ActivityBase(SQLModel):
 class Activity(ActivityBase, table=True):
     laps: list["Lap"] = Relationship()
     performances: list["Performance"] = Relationship()
-    performance_power: list["PerformancePower"] = Relationship(
-        back_populates="activity"
+    power_curve: Optional["PowerCurve"] = Relationship(
+        back_populates="activity", sa_relationship_kwargs={"uselist": False}
     )
     notifications: list["Notification"] = Relationship(back_populates="activity")
     tracepoints: list["Tracepoint"] = Relationship(back_populates="activity")
@@ -148,8 +150,15 @@ class Activity(ActivityBase, table=True):
     zone_heart_rates: list["ActivityZoneHeartRate"] = Relationship(
         back_populates="activity"
     )
+    histograms: list["ActivityHistogram"] = Relationship(back_populates="activity")
     user: User = Relationship(back_populates="activities")
 
+    @property
+    def performance_power(self) -> list["PerformancePower"]:
+        if self.power_curve is None:
+            return []
+        return self.power_curve.performance_powers
+
 
 class ActivityPublic(ActivityBase):
     laps: list["Lap"] = []
@@ -173,7 +182,8 @@ class ActivityPublicWithoutTracepoints(ActivityBase):
 class Pagination(BaseModel):
     page: int = 1
     per_page: int = 10
-    total: int = 10
+    total: int | None = 10
+    next_cursor: str | None = None
 
 
 class ActivityList(BaseModel):
@@ -214,10 +224,54 @@ class PerformancePowerBase(SQLModel):
     power: float
 
 
-class PerformancePower(PerformancePowerBase, table=True):
-    id: uuid.UUID = Field(primary_key=True)
-    activity_id: uuid.UUID = Field(foreign_key="activity.id")
-    activity: Activity = Relationship(back_populates="performance_power")
+class PerformancePower(PerformancePowerBase):
+    """Best average power of an activity over one duration (a power curve point)."""
+
+    activity_id: uuid.UUID
+
+
+class PowerCurve(SQLModel, table=True):
+    """Mean-max power curve of an activity, stored as one row of two arrays:
+    `durations` (seconds, ascending) and the matching best `powers` (W, float32).
+    """
+
+    activity_id: uuid.UUID = Field(foreign_key="activity.id", primary_key=True)
+    durations: list[int] = Field(sa_type=ARRAY(Integer).with_variant(JSON(), "sqlite"))
+    powers: list[float] = Field(sa_type=ARRAY(REAL).with_variant(JSON(), "sqlite"))
+    activity: Activity = Relationship(back_populates="power_curve")
+
+    @classmethod
+    def from_performance_powers(
+        cls, activity_id: uuid.UUID, performance_powers: list[PerformancePower]
+    ) -> "PowerCurve":
+        points = sorted(performance_powers, key=lambda p: p.time)
+        return cls(
+            activity_id=activity_id,
+            durations=[int(p.time.total_seconds()) for p in points],
+            powers=[p.power for p in points],
+        )
+
+    def power_at(self, duration: datetime.timedelta) -> float | None:
+        """Best power over `duration`, or None if the activity is shorter.
+
+        Between two grid durations, the power of the longer one is returned: the
+        curve is non-increasing, so it is a lower bound of the exact value.
+        """
+        index = bisect.bisect_left(self.durations, duration.total_seconds())
+        if index == len(self.durations):
+            return None
+        return self.powers[index]
+
+    @property
+    def performance_powers(self) -> list[PerformancePower]:
+        return [
+            PerformancePower(
+                activity_id=self.activity_id,
+                time=datetime.timedelta(seconds=seconds),
+                power=power,
+            )
+            for seconds, power in zip(self.durations, self.powers)
+        ]
 
 
 class NotificationBase(SQLModel):
@@ -325,6 +379,21 @@ class ActivityZoneHeartRatePublic(ActivityZoneHeartRateBase):
     zone: "ZonePublic"
 
 
+class ActivityHistogram(SQLModel, table=True):
+    """Seconds spent at each value of a signal (heart rate, pace or power) during
+    an activity, so that zone times can be recomputed for any zone bounds.
+
+    `values` are ascending 1 bpm, 1 s/km or 1 W bins, samples being rounded up;
+    `seconds` holds the matching times.
+    """
+
+    activity_id: uuid.UUID = Field(foreign_key="activity.id", primary_key=True)
+    type: str = Field(primary_key=True, regex="^(heart_rate|pace|power)$")
+    values: list[int] = Field(sa_type=ARRAY(Integer).with_variant(JSON(), "sqlite"))
+    seconds: list[float] = Field(sa_type=ARRAY(REAL).with_variant(JSON(), "sqlite"))
+    activity: Activity = Relationship(back_populates="histograms")
+
+
 class ZoneBase(SQLModel):
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     user_id: str = Field(foreign_key="user.id")
@@ -341,6 +410,34 @@ class ZonePublic(ZoneBase):
     pass
 
 
+class ZoneEstimate(SQLModel, table=True):
+    """Values of the last year of activities that the zones of a user are estimated
+    from, each list sorted ascending, so that an activity can be added or removed
+    without rescanning the others.
+
+    Runs of at least 5 km are split between the threshold distance range and the
+    longer ones, their speed counting as 0 when unknown. `oldest_start_time` is
+    the start of the oldest activity counted: once it is out of the one year
+    window, the estimate is stale and rebuilt.
+    """
+
+    user_id: str = Field(foreign_key="user.id", primary_key=True)
+    oldest_start_time: int | None = None
+    max_heart_rates: list[float] = Field(
+        sa_type=ARRAY(Float).with_variant(JSON(), "sqlite")
+    )
+    threshold_run_speeds: list[float] = Field(
+        sa_type=ARRAY(Float).with_variant(JSON(), "sqlite")
+    )
+    long_run_speeds: list[float] = Field(
+        sa_type=ARRAY(Float).with_variant(JSON(), "sqlite")
+    )
+    short_run_speeds: list[float] = Field(
+        sa_type=ARRAY(Float).with_variant(JSON(), "sqlite")
+    )
+    max_powers: list[float] = Field(sa_type=ARRAY(Float).with_variant(JSON(), "sqlite"))
+
+
 class FtpBase(SQLModel):
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     user_id: str = Field(foreign_key="user.id")
@@ -356,6 +453,56 @@ class FtpPublic(FtpBase):
     pass
 
 
+class DailyFitness(SQLModel, table=True):
+    """Fitness scores of a user on a local day. Only days with a non-zero score
+    are stored, the others scoring 0."""
+
+    user_id: str = Field(foreign_key="user.id", primary_key=True)
+    date: datetime.date = Field(primary_key=True)
+    overall: int = 0
+    running: int = 0
+    cycling: int = 0
+    swimming: int = 0
+
+
+class DailyStatistic(SQLModel, table=True):
+    """Totals of a user's activities of a sport on a local day. Only days with
+    activities are stored."""
+
+    user_id: str = Field(foreign_key="user.id", primary_key=True)
+    date: datetime.date = Field(primary_key=True)
+    sport: str = Field(primary_key=True)
+    n_activities: int = 0
+    total_distance: float = 0.0
+    total_timer_time: float = 0.0
+    total_ascent: float = 0.0
+    training_stress_score: float = 0.0
+
+
+class WeeklyZoneTime(SQLModel, table=True):
+    """Time spent in a zone by a user's activities of a sport during a week
+    starting on a local Monday. Only non-zero times are stored."""
+
+    user_id: str = Field(foreign_key="user.id", primary_key=True)
+    week_start: datetime.date = Field(primary_key=True)
+    type: str = Field(primary_key=True)
+    index: int = Field(primary_key=True)
+    sport: str = Field(primary_key=True)
+    time_in_zone: float = 0.0
+
+
+class TrainingLoad(SQLModel, table=True):
+    """Chronic and acute training loads of a user at the end of a day, overall or
+    for a sport, from which the daily training load is resumed. Removed when an
+    activity on or before that day changes."""
+
+    user_id: str = Field(foreign_key="user.id", primary_key=True)
+    sport: str = Field(primary_key=True)
+    date: datetime.date
+    ctl: float
+    atl: float
+
+
 class Statistic(BaseModel):
     sport: str
     n_activities: int = 0
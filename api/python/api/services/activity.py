@@ -2,19 +2,25 @@ import datetime
 
 from sqlmodel import Session
 
-from api.fit import get_activity_from_fit
-from api.fitness import estimate_running_tss, update_ftp_for_date
+from api.fit import get_activity_from_fit_bytes
+from api.fitness import (
+    estimate_running_tss,
+    update_daily_aggregates,
+    update_ftp_for_date,
+)
 from api.model import (
     Activity,
     Lap,
     Performance,
     PerformancePower,
+    PowerCurve,
     Tracepoint,
 )
 from api.services.notification import NotificationService
 from api.services.performance import PerformanceService
 from api.services.storage import StorageService
 from api.services.zone import ZoneService
+from api.track import TrackArray
 from api.utils import MAX_TRACEPOINTS_FOR_RESPONSE
 
 
@@ -32,34 +38,48 @@ class ActivityService:
         self.zone = zone_service
         self.notification = notification_service
 
-    def create_activity(
+    def parse_activity(
         self,
-        user_id: str,
-        fit_file_path: str,
+        fit_data: bytes,
         fit_filename: str,
         title: str,
         race: bool,
-    ) -> Activity:
-        activity, laps, tracepoints = get_activity_from_fit(
+    ) -> tuple[Activity, list[Lap], TrackArray]:
+        return get_activity_from_fit_bytes(
             session=self.session,
-            fit_file=fit_file_path,
+            fit_data=fit_data,
+            fit_name=fit_filename,
             title=title,
             description="",
             race=race,
-            fit_name=fit_filename,
         )
 
-        performances = self.performance.calculate_running_performances(
-            activity, tracepoints
-        )
+    def create_activity(
+        self,
+        user_id: str,
+        fit_data: bytes,
+        fit_filename: str,
+        title: str,
+        race: bool,
+        parsed: tuple[Activity, list[Lap], TrackArray] | None = None,
+    ) -> Activity:
+        """Create an activity from an uploaded FIT file.
+
+        `parsed` is the result of `parse_activity` for `fit_data`, when the
+        caller already parsed it.
+        """
+        if parsed is None:
+            parsed = self.parse_activity(fit_data, fit_filename, title, race)
+        activity, laps, track = parsed
+
+        performances = self.performance.calculate_running_performances(activity, track)
         performance_powers = self.performance.calculate_cycling_performances(
-            activity, tracepoints
+            activity, track
         )
 
-        original_tracepoints = tracepoints.copy()
-
-        while len(tracepoints) > MAX_TRACEPOINTS_FOR_RESPONSE:
-            tracepoints = [tp for idx, tp in enumerate(tracepoints) if idx % 2 == 0]
+        tracepoints = track.downsample(MAX_TRACEPOINTS_FOR_RESPONSE).to_tracepoints(
+            activity.id
+        )
 
         activity.user_id = user_id
 
@@ -77,17 +97,21 @@ class ActivityService:
         for notification in power_notifications:
             self.session.add(notification)
 
-        self.zone.calculate_activity_zones(activity, original_tracepoints)
-        self.zone.update_user_zones(user_id)
+        self.zone.calculate_activity_zones(activity, track)
+        self.zone.add_activity_to_zones(user_id, activity)
 
         if activity.sport == "running" and activity.training_stress_score is None:
             activity.training_stress_score = estimate_running_tss(
                 activity, self.zone.get_threshold_hr(user_id)
             )
 
+        update_daily_aggregates(
+            self.session, user_id, datetime.date.fromtimestamp(activity.start_time)
+        )
+
         try:
             self.storage.upload_activity_files(
-                fit_file_path=fit_file_path,
+                fit_data=fit_data,
                 fit_filename=fit_filename,
                 title=title,
                 race=race,
@@ -124,5 +148,7 @@ class ActivityService:
         for performance in performances:
             self.session.add(performance)
 
-        for performance_power in performance_powers:
-            self.session.add(performance_power)
+        if performance_powers:
+            self.session.add(
+                PowerCurve.from_performance_powers(activity.id, performance_powers)
+            )
@@ -2,14 +2,24 @@ import datetime
 import logging
 import os
 import uuid
+from collections.abc import Sequence
 from dataclasses import dataclass
 
 from sqlmodel import Session, col, delete, select
 
-from api.fit import get_activity_from_fit
-from api.fitness import estimate_running_tss, update_ftp_for_date
+from api.fit import get_activities_from_fits, get_tracepoints_from_fit
+from api.fitness import (
+    calculate_ftp_history,
+    estimate_running_tss,
+    rebuild_daily_fitness,
+    store_daily_statistics,
+    store_weekly_zone_times,
+    update_daily_aggregates,
+    update_ftp_for_date,
+)
 from api.model import (
     Activity,
+    ActivityHistogram,
     ActivityZoneHeartRate,
     ActivityZonePace,
     ActivityZonePower,
@@ -17,7 +27,7 @@ from api.model import (
     Lap,
     Notification,
     Performance,
-    PerformancePower,
+    PowerCurve,
     Tracepoint,
     User,
     Zone,
@@ -27,10 +37,17 @@ from api.services.notification import NotificationService
 from api.services.performance import PerformanceService
 from api.services.storage import StorageService
 from api.services.zone import ZoneService
-from api.utils import MAX_TRACEPOINTS_FOR_RESPONSE
+from api.track import TrackArray
+from api.utils import MAX_TRACEPOINTS_FOR_RESPONSE, calculate_activity_histograms
 
 logger = logging.getLogger(__name__)
 
+type ParsedFit = tuple[Activity, list[Lap], TrackArray]
+
+# Record fields read from FIT files by the maintenance jobs
+POWER_CURVE_FIELDS = ("timestamp", "power")
+ZONE_FIELDS = ("timestamp", "heart_rate", "speed", "power")
+
 
 @dataclass
 class BulkOperationResult:
@@ -64,13 +81,7 @@ class BulkOperationService:
         skipped_count = 0
 
         for activity in cycling_activities:
-            existing_power_performances = self.session.exec(
-                select(PerformancePower).where(
-                    PerformancePower.activity_id == activity.id
-                )
-            ).all()
-
-            if existing_power_performances:
+            if self.session.get(PowerCurve, activity.id) is not None:
                 skipped_count += 1
                 continue
 
@@ -89,7 +100,9 @@ class BulkOperationService:
                 continue
 
             try:
-                _, _, tracepoints = get_activity_from_fit(self.session, fit_file_path)
+                tracepoints = get_tracepoints_from_fit(
+                    fit_file_path, POWER_CURVE_FIELDS
+                )
 
                 if not tracepoints:
                     continue
@@ -101,8 +114,11 @@ class BulkOperationService:
                 )
 
                 if performance_powers:
-                    for performance_power in performance_powers:
-                        self.session.add(performance_power)
+                    self.session.add(
+                        PowerCurve.from_performance_powers(
+                            activity.id, performance_powers
+                        )
+                    )
                     processed_count += 1
 
             except Exception:
@@ -120,95 +136,90 @@ class BulkOperationService:
 
     def update_zones(self) -> BulkOperationResult:
         users = self.session.exec(select(User)).all()
-        updated_count = 0
-        skipped_count = 0
-
-        for user in users:
-            activities = self.session.exec(
-                select(Activity).where(
-                    Activity.user_id == user.id, Activity.status == "created"
-                )
+        active_user_ids = set(
+            self.session.exec(
+                select(Activity.user_id).where(Activity.status == "created").distinct()
             ).all()
+        )
+        zoned_user_ids = set(self.session.exec(select(Zone.user_id).distinct()).all())
 
-            if not activities:
-                skipped_count += 1
-                continue
+        user_ids = [user.id for user in users if user.id in active_user_ids]
+        for user_id in user_ids:
+            if user_id not in zoned_user_ids:
+                self.zone_service.create_default_zones(user_id)
+        self.session.commit()
 
-            existing_zones = self.session.exec(
-                select(Zone).where(Zone.user_id == user.id)
-            ).all()
+        self.zone_service.update_users_zones(user_ids)
+        self.session.commit()
+
+        return BulkOperationResult(
+            processed_count=len(user_ids),
+            skipped_count=len(users) - len(user_ids),
+            total_count=len(users),
+        )
 
-            if not existing_zones:
-                self.zone_service.create_default_zones(user.id)
-                self.session.commit()
+    def update_daily_fitness(self) -> BulkOperationResult:
+        """Rebuild the stored daily statistics, weekly zone times and fitness
+        scores of all users."""
+        users = self.session.exec(select(User)).all()
 
-            self.zone_service.update_user_zones(user.id)
-            updated_count += 1
+        for user in users:
+            store_daily_statistics(self.session, user.id)
+            store_weekly_zone_times(self.session, user.id)
+            rebuild_daily_fitness(self.session, user.id)
+        self.session.commit()
 
         return BulkOperationResult(
-            processed_count=updated_count,
-            skipped_count=skipped_count,
+            processed_count=len(users),
+            skipped_count=0,
             total_count=len(users),
         )
 
     def update_ftps(self) -> BulkOperationResult:
+        """Create the FTP records missing on the days of cycling activities.
+
+        The FTPs of a user are estimated in one pass over their cycling
+        activities and all the new records are committed together.
+        """
         cycling_activities = self.session.exec(
-            select(Activity)
+            select(Activity.user_id, Activity.start_time)
             .where(Activity.sport == "cycling", Activity.status == "created")
             .order_by(col(Activity.start_time))
         ).all()
+        existing_ftps = set(self.session.exec(select(Ftp.user_id, Ftp.date)).all())
 
         processed_count = 0
         skipped_count = 0
-        activities_by_user: dict[str, list[Activity]] = {}
+        dates_by_user: dict[str, set[datetime.date]] = {}
 
-        for activity in cycling_activities:
-            if activity.user_id is None:
+        for user_id, start_time in cycling_activities:
+            if user_id is None:
                 continue
-            if activity.user_id not in activities_by_user:
-                activities_by_user[activity.user_id] = []
-            activities_by_user[activity.user_id].append(activity)
-
-        for user_id, user_activities in activities_by_user.items():
-            processed_activities = set()
+            if user_id not in dates_by_user:
+                dates_by_user[user_id] = set()
+            dates_by_user[user_id].add(datetime.date.fromtimestamp(start_time))
 
-            for activity in user_activities:
-                activity_date = datetime.date.fromtimestamp(activity.start_time)
+        for user_id, dates in dates_by_user.items():
+            missing_dates = {
+                date for date in dates if (user_id, date) not in existing_ftps
+            }
+            skipped_count += len(dates) - len(missing_dates)
 
-                date_key = (user_id, activity_date)
-                if date_key in processed_activities:
-                    continue
-
-                existing_ftp = self.session.exec(
-                    select(Ftp).where(Ftp.user_id == user_id, Ftp.date == activity_date)
-                ).first()
+            try:
+                ftps = calculate_ftp_history(self.session, user_id, missing_dates)
+            except Exception:
+                logger.exception(f"Failed to update FTPs for user {user_id}")
+                skipped_count += len(missing_dates)
+                continue
 
-                if existing_ftp:
+            for date, ftp in sorted(ftps.items()):
+                if ftp > 0:
+                    self.session.add(Ftp(user_id=user_id, date=date, ftp=round(ftp)))
+                    processed_count += 1
+                else:
                     skipped_count += 1
-                    processed_activities.add(date_key)
-                    continue
 
-                try:
-                    update_ftp_for_date(self.session, user_id, activity_date)
-
-                    new_ftp = self.session.exec(
-                        select(Ftp).where(
-                            Ftp.user_id == user_id, Ftp.date == activity_date
-                        )
-                    ).first()
-
-                    if new_ftp:
-                        processed_count += 1
-                    else:
-                        skipped_count += 1
-
-                    processed_activities.add(date_key)
-
-                except Exception:
-                    logger.exception(
-                        f"Failed to update FTP for user {user_id} on {activity_date}"
-                    )
-                    skipped_count += 1
+        self.session.commit()
 
         return BulkOperationResult(
             processed_count=processed_count,
@@ -216,99 +227,165 @@ class BulkOperationService:
             total_count=len(cycling_activities),
         )
 
-    def update_activity_zones(self, fit_dir: str = "./data/fit") -> BulkOperationResult:
-        activities = self.session.exec(
-            select(Activity)
+    def update_activity_zones(
+        self, fit_dir: str = "./data/fit", batch_size: int = 100
+    ) -> BulkOperationResult:
+        """Recompute the zone times of every activity for the current user zones.
+
+        Zone times come from the stored signal histograms; FIT files are only
+        parsed for activities without histograms, which are stored on the way.
+        Activities and their histograms are read `batch_size` at a time.
+        """
+        activity_ids = self.session.exec(
+            select(Activity.id)
             .where(Activity.status == "created")
             .order_by(col(Activity.start_time))
         ).all()
 
+        zones_by_user: dict[str, list[Zone]] = {}
+        user_ids: set[str] = set()
+
         processed_count = 0
         skipped_count = 0
         error_count = 0
 
-        for activity in activities:
-            try:
-                if not activity.user_id:
-                    skipped_count += 1
-                    continue
-
-                fit_file_paths = [
-                    f"{fit_dir}/{activity.fit}",
-                    f"./data/files/{activity.fit}",
-                ]
-                fit_file_path = None
-                for path in fit_file_paths:
-                    if os.path.exists(path):
-                        fit_file_path = path
-                        break
+        for start in range(0, len(activity_ids), batch_size):
+            activities = self.session.exec(
+                select(Activity)
+                .where(col(Activity.id).in_(activity_ids[start : start + batch_size]))
+                .order_by(col(Activity.start_time))
+            ).all()
+            histograms_by_activity = self._read_histogram_batch(activities)
+            user_ids.update(a.user_id for a in activities if a.user_id)
 
-                if fit_file_path is None:
-                    skipped_count += 1
-                    continue
+            for activity in activities:
+                try:
+                    # Each activity in a savepoint, so that a failure only
+                    # discards its own changes
+                    with self.session.begin_nested():
+                        if not activity.user_id:
+                            skipped_count += 1
+                            continue
+
+                        histograms = histograms_by_activity.get(activity.id)
+                        fit_file_path = None
+                        if histograms is None:
+                            fit_file_paths = [
+                                f"{fit_dir}/{activity.fit}",
+                                f"./data/files/{activity.fit}",
+                            ]
+                            for path in fit_file_paths:
+                                if os.path.exists(path):
+                                    fit_file_path = path
+                                    break
+
+                            if fit_file_path is None:
+                                skipped_count += 1
+                                continue
+
+                        self.session.exec(
+                            delete(ActivityZonePace).where(
+                                col(ActivityZonePace.activity_id) == activity.id
+                            )
+                        )
+                        self.session.exec(
+                            delete(ActivityZonePower).where(
+                                col(ActivityZonePower.activity_id) == activity.id
+                            )
+                        )
+                        self.session.exec(
+                            delete(ActivityZoneHeartRate).where(
+                                col(ActivityZoneHeartRate.activity_id) == activity.id
+                            )
+                        )
 
-                self.session.exec(
-                    delete(ActivityZonePace).where(
-                        col(ActivityZonePace.activity_id) == activity.id
-                    )
-                )
-                self.session.exec(
-                    delete(ActivityZonePower).where(
-                        col(ActivityZonePower.activity_id) == activity.id
-                    )
-                )
-                self.session.exec(
-                    delete(ActivityZoneHeartRate).where(
-                        col(ActivityZoneHeartRate.activity_id) == activity.id
-                    )
-                )
+                        if fit_file_path is not None:
+                            try:
+                                tracepoints = get_tracepoints_from_fit(
+                                    fit_file_path, ZONE_FIELDS
+                                )
+                            except Exception:
+                                logger.exception(
+                                    f"Failed to parse FIT file for activity {activity.id}"
+                                )
+                                error_count += 1
+                                continue
+
+                            if not tracepoints:
+                                skipped_count += 1
+                                continue
+
+                            histograms = calculate_activity_histograms(
+                                activity, tracepoints
+                            )
+                            for histogram in histograms:
+                                self.session.add(histogram)
+
+                        user_zones = zones_by_user.get(activity.user_id)
+                        if user_zones is None:
+                            user_zones = list(
+                                self.session.exec(
+                                    select(Zone).where(Zone.user_id == activity.user_id)
+                                ).all()
+                            )
+
+                            if not user_zones:
+                                self.zone_service.create_default_zones(activity.user_id)
+                                user_zones = list(
+                                    self.session.exec(
+                                        select(Zone).where(
+                                            Zone.user_id == activity.user_id
+                                        )
+                                    ).all()
+                                )
+
+                            zones_by_user[activity.user_id] = user_zones
+
+                        self.zone_service.calculate_activity_zones_from_histograms(
+                            activity, histograms or [], user_zones
+                        )
 
-                try:
-                    _, _, tracepoints = get_activity_from_fit(
-                        self.session, fit_file_path
-                    )
                 except Exception:
                     logger.exception(
-                        f"Failed to parse FIT file for activity {activity.id}"
+                        f"Failed to update activity zones for activity {activity.id}"
                     )
                     error_count += 1
+                    # Default zones created in the savepoint were rolled back
+                    zones_by_user.pop(activity.user_id, None)
                     continue
 
-                if not tracepoints:
-                    skipped_count += 1
-                    continue
-
-                user_zones = self.session.exec(
-                    select(Zone).where(Zone.user_id == activity.user_id)
-                ).all()
-
-                if not user_zones:
-                    self.zone_service.create_default_zones(activity.user_id)
-                    self.session.commit()
-
-                self.zone_service.calculate_activity_zones(activity, tracepoints)
-
                 processed_count += 1
 
-                if processed_count % 10 == 0:
-                    self.session.commit()
-
-            except Exception:
-                logger.exception(
-                    f"Failed to update activity zones for activity {activity.id}"
-                )
-                error_count += 1
-                self.session.rollback()
+            self.session.commit()
 
+        for user_id in user_ids:
+            store_weekly_zone_times(self.session, user_id)
         self.session.commit()
 
         return BulkOperationResult(
             processed_count=processed_count,
             skipped_count=skipped_count,
             error_count=error_count,
-            total_count=len(activities),
+            total_count=len(activity_ids),
         )
 
+    def _read_histogram_batch(
+        self, activities: Sequence[Activity]
+    ) -> dict[uuid.UUID, list[ActivityHistogram]]:
+        histograms = self.session.exec(
+            select(ActivityHistogram).where(
+                col(ActivityHistogram.activity_id).in_([a.id for a in activities])
+            )
+        ).all()
+
+        histograms_by_activity: dict[uuid.UUID, list[ActivityHistogram]] = {}
+        for histogram in histograms:
+            histograms_by_activity.setdefault(histogram.activity_id, []).append(
+                histogram
+            )
+
+        return histograms_by_activity
+
     def recompute_activities(
         self,
         fit_dir: str = "./data/fit",
@@ -362,36 +439,27 @@ class BulkOperationService:
         skipped_count = 0
         error_count = 0
 
-        for activity in activities:
-            try:
-                original_title = activity.title
-                original_description = activity.description
-                original_race = activity.race
+        parsed_fits: dict[uuid.UUID, ParsedFit | Exception] = {}
 
-                fit_path = self.fit_file_service.get_fit_file_path(
-                    activity, fit_dir, download_from_s3
+        for index, activity in enumerate(activities):
+            if index % batch_size == 0:
+                parsed_fits = self._read_fit_batch(
+                    activities[index : index + batch_size], fit_dir, download_from_s3
                 )
 
-                if not fit_path:
+            try:
+                parsed_fit = parsed_fits.get(activity.id)
+
+                if parsed_fit is None:
                     skipped_count += 1
                     continue
 
-                try:
-                    parsed_activity, new_laps, new_tracepoints = get_activity_from_fit(
-                        self.session,
-                        fit_path,
-                        title=original_title,
-                        description=original_description or "",
-                        race=original_race,
-                        fit_name=activity.fit,
-                    )
-                except Exception:
-                    logger.exception(
-                        f"Failed to parse FIT file for activity {activity.id}"
-                    )
+                if isinstance(parsed_fit, Exception):
                     error_count += 1
                     continue
 
+                parsed_activity, new_laps, new_track = parsed_fit
+
                 fit_fields_to_update = [
                     "sport",
                     "device",
@@ -437,9 +505,7 @@ class BulkOperationService:
                     )
                 )
                 self.session.exec(
-                    delete(PerformancePower).where(
-                        col(PerformancePower.activity_id) == activity.id
-                    )
+                    delete(PowerCurve).where(col(PowerCurve.activity_id) == activity.id)
                 )
                 self.session.exec(
                     delete(ActivityZonePace).where(
@@ -456,6 +522,11 @@ class BulkOperationService:
                         col(ActivityZoneHeartRate.activity_id) == activity.id
                     )
                 )
+                self.session.exec(
+                    delete(ActivityHistogram).where(
+                        col(ActivityHistogram.activity_id) == activity.id
+                    )
+                )
                 self.session.exec(
                     delete(Notification).where(
                         col(Notification.activity_id) == activity.id
@@ -467,34 +538,28 @@ class BulkOperationService:
                     self.session.add(lap)
 
                 performances = self.performance_service.calculate_running_performances(
-                    activity, new_tracepoints
+                    activity, new_track
                 )
                 for perf in performances:
                     self.session.add(perf)
 
                 performance_powers = (
                     self.performance_service.calculate_cycling_performances(
-                        activity, new_tracepoints
+                        activity, new_track
                     )
                 )
-                for pp in performance_powers:
-                    self.session.add(pp)
-
-                original_tracepoints = new_tracepoints.copy()
-
-                while len(new_tracepoints) > MAX_TRACEPOINTS_FOR_RESPONSE:
-                    new_tracepoints = [
-                        tp for i, tp in enumerate(new_tracepoints) if i % 2 == 0
-                    ]
+                if performance_powers:
+                    self.session.add(
+                        PowerCurve.from_performance_powers(
+                            activity.id, performance_powers
+                        )
+                    )
 
-                for tp in new_tracepoints:
-                    tp.activity_id = activity.id
+                downsampled = new_track.downsample(MAX_TRACEPOINTS_FOR_RESPONSE)
+                for tp in downsampled.to_tracepoints(activity.id):
                     self.session.add(tp)
 
-                if activity.user_id:
-                    self.zone_service.calculate_activity_zones(
-                        activity, original_tracepoints
-                    )
+                self.zone_service.calculate_activity_zones(activity, new_track)
 
                 notifications = self.notification_service.detect_achievements(
                     activity, performances
@@ -523,6 +588,13 @@ class BulkOperationService:
                         self.zone_service.get_threshold_hr(activity.user_id),
                     )
 
+                if activity.user_id:
+                    update_daily_aggregates(
+                        self.session,
+                        activity.user_id,
+                        datetime.date.fromtimestamp(activity.start_time),
+                    )
+
                 if activity.sport == "cycling" and activity.user_id:
                     activity_date = datetime.date.fromtimestamp(activity.start_time)
                     update_ftp_for_date(self.session, activity.user_id, activity_date)
@@ -547,3 +619,44 @@ class BulkOperationService:
             error_count=error_count,
             total_count=len(activities),
         )
+
+    def _read_fit_batch(
+        self,
+        activities: Sequence[Activity],
+        fit_dir: str,
+        download_from_s3: bool,
+    ) -> dict[uuid.UUID, ParsedFit | Exception]:
+        """Locate and parse the FIT files of a batch of activities in parallel.
+
+        Activities without a FIT file are left out of the result.
+        """
+        results: dict[uuid.UUID, ParsedFit | Exception] = {}
+        fit_paths: dict[uuid.UUID, str] = {}
+
+        for activity in activities:
+            try:
+                fit_path = self.fit_file_service.get_fit_file_path(
+                    activity, fit_dir, download_from_s3
+                )
+            except Exception as e:
+                logger.exception(
+                    f"Failed to locate FIT file for activity {activity.id}"
+                )
+                results[activity.id] = e
+                continue
+
+            if fit_path:
+                fit_paths[activity.id] = fit_path
+
+        if not fit_paths:
+            return results
+
+        parsed_fits = get_activities_from_fits(self.session, list(fit_paths.values()))
+        for activity_id, parsed_fit in zip(fit_paths, parsed_fits):
+            if isinstance(parsed_fit, Exception):
+                logger.error(
+                    f"Failed to parse FIT file for activity {activity_id}: {parsed_fit}"
+                )
+            results[activity_id] = parsed_fit
+
+        return results
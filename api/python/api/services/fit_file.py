@@ -4,9 +4,10 @@ import os
 import yaml
 from sqlmodel import Session
 
-from api.fit import get_activity_from_fit
-from api.model import Activity, Lap, Tracepoint
+from api.fit import get_activities_from_fits, get_activity_from_fit
+from api.model import Activity, Lap
 from api.services.storage import StorageService
+from api.track import TrackArray
 
 logger = logging.getLogger(__name__)
 
@@ -57,7 +58,7 @@ class FitFileService:
 
     def read_fit_from_yaml(
         self, yaml_file: str
-    ) -> tuple[Activity, list[Lap], list[Tracepoint]]:
+    ) -> tuple[Activity, list[Lap], TrackArray]:
         with open(yaml_file, "r") as file:
             config = yaml.safe_load(file)
 
@@ -71,13 +72,40 @@ class FitFileService:
 
         return activity, laps, tracepoints
 
+    def read_fit_files(
+        self, input_files: list[str], threads: int | None = None
+    ) -> list[tuple[Activity, list[Lap], TrackArray] | Exception]:
+        """Parse .fit and .yaml inputs in parallel, in input order."""
+        configs = []
+        for input_file in input_files:
+            if input_file.endswith(".yaml"):
+                with open(input_file, "r") as file:
+                    configs.append(yaml.safe_load(file))
+            else:
+                configs.append(None)
+
+        fit_files = [
+            "./data/fit/" + config["fit"] if config else input_file
+            for input_file, config in zip(input_files, configs)
+        ]
+        results = get_activities_from_fits(self.session, fit_files, threads)
+
+        for config, result in zip(configs, results):
+            if config and not isinstance(result, Exception):
+                activity = result[0]
+                activity.title = config.get("title", "")
+                activity.description = config.get("description", "")
+                activity.race = config.get("race", False)
+
+        return results
+
     def read_fit_file(
         self,
         input_file: str,
         title: str = "Activity",
         description: str = "",
         race: bool = False,
-    ) -> tuple[Activity, list[Lap], list[Tracepoint]]:
+    ) -> tuple[Activity, list[Lap], TrackArray]:
         if input_file.endswith(".yaml"):
             return self.read_fit_from_yaml(input_file)
         else:
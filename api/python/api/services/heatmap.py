@@ -1,11 +1,11 @@
 import datetime
 from collections import defaultdict
-from collections.abc import Sequence
 
 from shapely.geometry import LineString
 from sqlmodel import Session, col, select
 
 from api.model import Activity, Heatmap, HeatmapPolyline, HeatmapPublic, Tracepoint
+from api.track import Points, as_track_array
 
 SIMPLIFICATION_TOLERANCE = 0.0001  # ~11 meters at equator
 
@@ -121,13 +121,12 @@ class HeatmapService:
             updated_at=heatmap.updated_at,
         )
 
-    def _simplify_tracepoints(
-        self, tracepoints: Sequence[Tracepoint]
-    ) -> list[list[float]]:
-        if len(tracepoints) < 2:
-            return [[tp.lat, tp.lon] for tp in tracepoints]
+    def _simplify_tracepoints(self, tracepoints: Points) -> list[list[float]]:
+        track = as_track_array(tracepoints)
+        if len(track) < 2:
+            return [[lat, lon] for lat, lon in zip(track.lat, track.lon)]
 
-        coords = [(tp.lon, tp.lat) for tp in tracepoints]
+        coords = list(zip(track.lon, track.lat))
         line = LineString(coords)
         simplified = line.simplify(SIMPLIFICATION_TOLERANCE, preserve_topology=False)
 
@@ -1,9 +1,14 @@
 import bisect
 import datetime
 
-from sqlmodel import Session, col, select
+from sqlmodel import Session, col, select, text
 
-from api.model import Activity, Notification, Performance, PerformancePower
+from api.model import (
+    Activity,
+    Notification,
+    Performance,
+    PerformancePower,
+)
 from api.utils import (
     DISTANCE_1KM,
     DISTANCE_1MILE,
@@ -192,44 +197,54 @@ class NotificationService:
         if not current_perfs:
             return []
 
-        stmt = (
-            select(PerformancePower, Activity.start_time)
-            .join(Activity)
-            .where(
-                Activity.user_id == activity.user_id,
-                Activity.sport == "cycling",
-                Activity.status == "created",
-                Activity.id != activity.id,
-                Activity.start_time < activity.start_time,
-                col(PerformancePower.time).in_(list(current_perfs.keys())),
-                col(PerformancePower.power).is_not(None),
-                PerformancePower.power > 0,
-            )
-        )
-        historical_results = self.session.exec(stmt).all()
-
-        historical_by_duration: dict[
-            datetime.timedelta, list[tuple[float, int, int]]
-        ] = {}
-        for perf, start_time in historical_results:
-            if perf.power is None or perf.power <= 0:
-                continue
-            if perf.time not in historical_by_duration:
-                historical_by_duration[perf.time] = []
-            perf_year = datetime.date.fromtimestamp(start_time).year
-            historical_by_duration[perf.time].append(
-                (perf.power, perf_year, start_time)
+        # Earlier powers better than the current one, over all time and in the
+        # current year, read for the target durations only
+        year_start = datetime.datetime(current_year, 1, 1).timestamp()
+        query = """
+            SELECT
+                d.seconds,
+                COUNT(*) FILTER (WHERE d.power < best.power) AS n_better,
+                COUNT(*) FILTER (
+                    WHERE d.power < best.power AND a.start_time >= :year_start
+                ) AS n_better_yearly
+            FROM powercurve pc
+            JOIN activity a ON pc.activity_id = a.id
+            CROSS JOIN unnest(
+                CAST(:seconds AS integer[]), CAST(:powers AS real[])
+            ) AS d(seconds, power)
+            CROSS JOIN LATERAL (
+                SELECT pc.powers[array_position(pc.durations, d.seconds)] AS power
+            ) AS best
+            WHERE a.user_id = :user_id
+            AND a.sport = 'cycling'
+            AND a.status = 'created'
+            AND a.id != :activity_id
+            AND a.start_time < :start_time
+            AND d.seconds = ANY(pc.durations)
+            GROUP BY d.seconds
+        """
+        results = self.session.execute(  # ty: ignore[deprecated]
+            text(query).bindparams(
+                user_id=activity.user_id,
+                activity_id=activity.id,
+                start_time=activity.start_time,
+                year_start=year_start,
+                seconds=[int(duration.total_seconds()) for duration in current_perfs],
+                powers=[perf.power for perf in current_perfs.values()],
             )
+        ).all()
+        better_counts = {
+            datetime.timedelta(seconds=seconds): (n_better, n_better_yearly)
+            for seconds, n_better, n_better_yearly in results
+        }
 
         notifications = []
 
         for target_duration, current_perf in current_perfs.items():
-            if current_perf.power is None or current_perf.power <= 0:
-                continue
-
-            historical_data = historical_by_duration.get(target_duration, [])
+            n_better, n_better_yearly = better_counts.get(target_duration, (0, 0))
 
-            if not historical_data:
+            # Check all-time top 5, then yearly top 5 if not already notified
+            if n_better < 5:
                 notifications.append(
                     Notification(
                         activity_id=activity.id,
@@ -237,87 +252,21 @@ class NotificationService:
                         duration=target_duration,
                         power=current_perf.power,
                         achievement_year=None,
-                        rank=1,
+                        rank=n_better + 1,
                         message="",
                     )
                 )
-                continue
-
-            all_powers = [power for power, _, _ in historical_data]
-            yearly_powers = [
-                power
-                for power, year, start_time in historical_data
-                if year == current_year and start_time < activity.start_time
-            ]
-
-            # Check all-time top 5 (higher power is better, so sort descending)
-            all_powers_sorted = sorted(all_powers, reverse=True)
-            if len(all_powers) < 5 or current_perf.power >= all_powers_sorted[4]:
-                rank = (
-                    bisect.bisect_left(
-                        [-p for p in all_powers_sorted], -current_perf.power
+            elif n_better_yearly < 5:
+                notifications.append(
+                    Notification(
+                        activity_id=activity.id,
+                        type="best_effort_yearly",
+                        duration=target_duration,
+                        power=current_perf.power,
+                        achievement_year=current_year,
+                        rank=n_better_yearly + 1,
+                        message="",
                     )
-                    + 1
                 )
-                if rank <= 5:
-                    notifications.append(
-                        Notification(
-                            activity_id=activity.id,
-                            type="best_effort_all_time",
-                            duration=target_duration,
-                            power=current_perf.power,
-                            achievement_year=None,
-                            rank=rank,
-                            message="",
-                        )
-                    )
-
-            # Check yearly top 5
-            if not yearly_powers:
-                # First activity of the year - always rank 1
-                if not any(
-                    n.type == "best_effort_all_time" and n.duration == target_duration
-                    for n in notifications
-                ):
-                    notifications.append(
-                        Notification(
-                            activity_id=activity.id,
-                            type="best_effort_yearly",
-                            duration=target_duration,
-                            power=current_perf.power,
-                            achievement_year=current_year,
-                            rank=1,
-                            message="",
-                        )
-                    )
-            else:
-                yearly_powers_sorted = sorted(yearly_powers, reverse=True)
-                if (
-                    len(yearly_powers) < 5
-                    or current_perf.power >= yearly_powers_sorted[4]
-                ):
-                    rank = (
-                        bisect.bisect_left(
-                            [-p for p in yearly_powers_sorted], -current_perf.power
-                        )
-                        + 1
-                    )
-                    # Only create yearly notification if not already created all-time
-                    if rank <= 5 and not any(
-                        n.type == "best_effort_all_time"
-                        and n.duration == target_duration
-                        for n in notifications
-                    ):
-                        notifications.append(
-                            Notification(
-                                activity_id=activity.id,
-                                type="best_effort_yearly",
-                                duration=target_duration,
-                                power=current_perf.power,
-                                achievement_year=current_year,
-                                rank=rank,
-                                message="",
-                            )
-                        )
 
         return notifications
@@ -1,7 +1,12 @@
 import datetime
 import uuid
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from itertools import accumulate, compress, repeat
+from operator import and_, ge, lt, sub, truediv
 
-from api.model import Activity, Performance, PerformancePower, Tracepoint
+from api.model import Activity, Performance, PerformancePower
+from api.track import Points, as_track_array
 from api.utils import (
     DISTANCE_1KM,
     DISTANCE_1MILE,
@@ -15,7 +20,7 @@ from api.utils import (
 
 class PerformanceService:
     def calculate_running_performances(
-        self, activity: Activity, tracepoints: list[Tracepoint]
+        self, activity: Activity, tracepoints: Points
     ) -> list[Performance]:
         if not tracepoints:
             return []
@@ -31,7 +36,8 @@ class PerformanceService:
             DISTANCE_HALF_MARATHON,
             DISTANCE_FULL_MARATHON,
         ]
-        max_distance = tracepoints[-1].distance
+        track = as_track_array(tracepoints)
+        max_distance = track.distance[-1]
         performances = [
             Performance(id=uuid.uuid4(), activity_id=activity.id, distance=d)
             for d in distances
@@ -40,35 +46,52 @@ class PerformanceService:
         if not performances:
             return []
 
-        best_times = [datetime.timedelta.max] * len(performances)
-        n = len(tracepoints)
-
-        for i, perf in enumerate(performances):
-            start = 0
-            end = 0
-            while (
-                start < n
-                and tracepoints[start].distance <= max_distance - perf.distance
-            ):
-                while (
-                    end < n
-                    and tracepoints[end].distance - tracepoints[start].distance
-                    < perf.distance
-                ):
-                    end += 1
-                if end < n:
-                    time = tracepoints[end].timestamp - tracepoints[start].timestamp
-                    if not best_times[i] or time < best_times[i]:
-                        best_times[i] = time
-                start += 1
+        best_times = self.best_efforts(track, [perf.distance for perf in performances])
 
         for perf, t in zip(performances, best_times):
             perf.time = t
 
         return performances
 
+    def best_efforts(
+        self, tracepoints: Points, targets: Sequence[float]
+    ) -> list[datetime.timedelta | None]:
+        """Fastest time to cover each target distance (in meters), or None.
+
+        Distances and timestamps are extracted once; each target then costs a
+        binary search per start point, run through C-level iterators, so an
+        arbitrary grid of distances is cheap to add.
+        """
+        if not tracepoints:
+            return [None] * len(targets)
+
+        # Running maximum, so the searched sequence stays sorted even if a
+        # recorded distance steps back.
+        track = as_track_array(tracepoints)
+        distances = list(accumulate(track.distance, max))
+        timestamps = list(map(sub, track.timestamp, repeat(track.timestamp[0])))
+        max_distance = track.distance[-1]
+
+        best_times: list[datetime.timedelta | None] = []
+        for target in targets:
+            # Start points that can still reach `target` before the end
+            count = bisect_right(distances, max_distance - target)
+            if count == 0:
+                best_times.append(None)
+                continue
+
+            ends = map(
+                bisect_left,
+                repeat(distances, count),
+                [distance + target for distance in distances[:count]],
+            )
+            best = min(map(sub, map(timestamps.__getitem__, ends), timestamps))
+            best_times.append(datetime.timedelta(seconds=best))
+
+        return best_times
+
     def calculate_cycling_performances(
-        self, activity: Activity, tracepoints: list[Tracepoint]
+        self, activity: Activity, tracepoints: Points
     ) -> list[PerformancePower]:
         if not tracepoints:
             return []
@@ -87,68 +110,165 @@ class PerformanceService:
         for m in range(61, 241):
             time_periods.append(datetime.timedelta(minutes=m))
 
-        max_time = tracepoints[-1].timestamp - tracepoints[0].timestamp
+        track = as_track_array(tracepoints)
+        max_time = datetime.timedelta(seconds=track.timestamp[-1] - track.timestamp[0])
         performance_powers = [
-            PerformancePower(
-                id=uuid.uuid4(), activity_id=activity.id, time=t, power=0.0
-            )
+            PerformancePower(activity_id=activity.id, time=t, power=0.0)
             for t in time_periods
             if max_time >= t
         ]
         if not performance_powers:
             return []
 
-        period_seconds = [int(p.time.total_seconds()) for p in performance_powers]
-        best_powers = [0.0] * len(performance_powers)
-        n = len(tracepoints)
-
-        valid_tracepoints = [
-            (i, tp) for i, tp in enumerate(tracepoints) if tp.power is not None
-        ]
-
-        if not valid_tracepoints:
+        if all(power is None for power in track.power):
             return performance_powers
 
-        for period_idx, target_seconds in enumerate(period_seconds):
-            if target_seconds == 0:
-                continue
-
-            max_power = 0.0
-
-            left = 0
-            power_sum = 0.0
-            power_count = 0
-
-            for right in range(n):
-                right_power = tracepoints[right].power
-                if right_power is not None:
-                    power_sum += right_power
-                    power_count += 1
-
-                while left <= right:
-                    time_diff = (
-                        tracepoints[right].timestamp - tracepoints[left].timestamp
-                    ).total_seconds()
-                    if time_diff < target_seconds:
-                        break
-
-                    left_power = tracepoints[left].power
-                    if left_power is not None:
-                        power_sum -= left_power
-                        power_count -= 1
-                    left += 1
-
-                if power_count > 0:
-                    time_diff = (
-                        tracepoints[right].timestamp - tracepoints[left].timestamp
-                    ).total_seconds()
-                    if time_diff >= target_seconds - POWER_TIME_TOLERANCE_SECONDS:
-                        avg_power = power_sum / power_count
-                        max_power = max(max_power, avg_power)
-
-            best_powers[period_idx] = max_power
+        best_powers = self.power_curve(
+            track, [int(p.time.total_seconds()) for p in performance_powers]
+        )
 
         for perf, best_power in zip(performance_powers, best_powers):
             perf.power = best_power
 
         return performance_powers
+
+    def power_curve(self, tracepoints: Points, durations: Sequence[int]) -> list[float]:
+        """Best mean power over each duration (in seconds), 0.0 if none.
+
+        A window ending at a point holds the points recorded less than
+        `duration` seconds before it, and only counts if it spans at least
+        `duration - POWER_TIME_TOLERANCE_SECONDS`. Its mean is taken over the
+        points with power. Window sums and counts come from prefix sums, so each
+        duration is a handful of C-level passes over the arrays.
+        """
+        if not tracepoints:
+            return [0.0] * len(durations)
+
+        track = as_track_array(tracepoints)
+        timestamps = list(map(sub, track.timestamp, repeat(track.timestamp[0])))
+        power_sums = list(accumulate((power or 0 for power in track.power), initial=0))
+        power_counts = list(
+            accumulate((power is not None for power in track.power), initial=0)
+        )
+
+        if all(t.is_integer() for t in timestamps) and all(
+            map(lt, timestamps, timestamps[1:])
+        ):
+            return self._power_curve_by_second(
+                [int(t) for t in timestamps], power_sums, power_counts, durations
+            )
+
+        return self._power_curve_by_point(
+            timestamps, power_sums, power_counts, durations
+        )
+
+    def _power_curve_by_second(
+        self,
+        timestamps: list[int],
+        power_sums: list[int],
+        power_counts: list[int],
+        durations: Sequence[int],
+    ) -> list[float]:
+        # One slot per second (at most one point each), shifted by `pad` slots
+        # so that windows starting before the first point line up too. A window
+        # ending at second u starts at the first point at or after u - d + 1,
+        # and spans enough time if that point is less than `tolerance` seconds
+        # later: every quantity for duration d is a slice offset by d.
+        tolerance = POWER_TIME_TOLERANCE_SECONDS
+        pad = tolerance - 1
+        seconds = timestamps[-1] + 1
+
+        has_point = [False] * seconds
+        end_sums = [0] * seconds
+        end_counts = [0] * seconds
+        for index, second in enumerate(timestamps):
+            has_point[second] = True
+            end_sums[second] = power_sums[index + 1]
+            end_counts[second] = power_counts[index + 1]
+
+        start_sums = [0] * (pad + seconds)
+        start_counts = [0] * (pad + seconds)
+        complete = [True] * pad + [False] * seconds
+        index = 0
+        for second in range(seconds):
+            while timestamps[index] < second:
+                index += 1
+            start_sums[pad + second] = power_sums[index]
+            start_counts[pad + second] = power_counts[index]
+            complete[pad + second] = timestamps[index] - second < tolerance
+
+        best_powers = []
+        for duration in durations:
+            if duration <= 0:
+                best_powers.append(0.0)
+                continue
+
+            end = max(0, duration - tolerance)
+            start = end - duration + tolerance
+
+            counts = list(map(sub, end_counts[end:], start_counts[start:]))
+            sums = map(sub, end_sums[end:], start_sums[start:])
+            selected = list(
+                map(
+                    and_,
+                    map(and_, has_point[end:], complete[start:]),
+                    map(bool, counts),
+                )
+            )
+
+            best_powers.append(
+                max(
+                    map(truediv, compress(sums, selected), compress(counts, selected)),
+                    default=0.0,
+                )
+            )
+
+        return best_powers
+
+    def _power_curve_by_point(
+        self,
+        timestamps: list[float],
+        power_sums: list[int],
+        power_counts: list[int],
+        durations: Sequence[int],
+    ) -> list[float]:
+        # Irregular timestamps: window starts come from a binary search.
+        n = len(timestamps)
+        end_sums = power_sums[1:]
+        end_counts = power_counts[1:]
+
+        best_powers = []
+        for duration in durations:
+            if duration <= 0:
+                best_powers.append(0.0)
+                continue
+
+            starts = list(
+                map(
+                    bisect_right,
+                    repeat(timestamps, n),
+                    map(sub, timestamps, repeat(duration)),
+                )
+            )
+            counts = list(map(sub, end_counts, map(power_counts.__getitem__, starts)))
+            sums = map(sub, end_sums, map(power_sums.__getitem__, starts))
+            selected = list(
+                map(
+                    and_,
+                    map(
+                        ge,
+                        map(sub, timestamps, map(timestamps.__getitem__, starts)),
+                        repeat(duration - POWER_TIME_TOLERANCE_SECONDS),
+                    ),
+                    map(bool, counts),
+                )
+            )
+
+            best_powers.append(
+                max(
+                    map(truediv, compress(sums, selected), compress(counts, selected)),
+                    default=0.0,
+                )
+            )
+
+        return best_powers
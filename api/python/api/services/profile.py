@@ -2,6 +2,7 @@ import datetime
 
 from sqlmodel import Session, col, select, text
 
+from api.fitness import build_missing_daily_aggregates
 from api.model import Profile, Statistic, YearsStatistics, Zone, ZonePublic
 
 STATISTICS_START_YEAR = 2013
@@ -16,34 +17,40 @@ class ProfileService:
     def get_user_profile(self, user_id: str) -> Profile:
         current_date = datetime.datetime.now()
 
+        if build_missing_daily_aggregates(self.session, user_id):
+            self.session.commit()
+
+        # Totals are summed from the daily statistics, see `update_daily_aggregates`
         overall_stats = self.session.execute(  # ty: ignore[deprecated]
             text("""
                 SELECT
-                    COUNT(*) as total_activities,
-                    COUNT(CASE WHEN sport = 'running' THEN 1 END) as run_activities,
+                    COALESCE(SUM(n_activities), 0) as total_activities,
+                    COALESCE(SUM(CASE WHEN sport = 'running' THEN n_activities END), 0) as run_activities,
                     COALESCE(SUM(CASE WHEN sport = 'running' THEN total_distance END), 0) as run_distance,
-                    COUNT(CASE WHEN sport = 'cycling' THEN 1 END) as cycling_activities,
+                    COALESCE(SUM(CASE WHEN sport = 'cycling' THEN n_activities END), 0) as cycling_activities,
                     COALESCE(SUM(CASE WHEN sport = 'cycling' THEN total_distance END), 0) as cycling_distance,
-                    COUNT(CASE WHEN sport = 'swimming' THEN 1 END) as swimming_activities,
+                    COALESCE(SUM(CASE WHEN sport = 'swimming' THEN n_activities END), 0) as swimming_activities,
                     COALESCE(SUM(CASE WHEN sport = 'swimming' THEN total_distance END), 0) as swimming_distance
-                 FROM activity
-                WHERE user_id = :user_id AND status = 'created'
+                 FROM dailystatistic
+                WHERE user_id = :user_id
             """).bindparams(user_id=user_id)
         ).one()
 
         yearly_stats = self.session.execute(  # ty: ignore[deprecated]
             text("""
                 SELECT
-                    EXTRACT(YEAR FROM TO_TIMESTAMP(start_time)) as year,
+                    EXTRACT(YEAR FROM date) as year,
                     sport,
-                    COUNT(*) as n_activities,
+                    SUM(n_activities) as n_activities,
                     COALESCE(SUM(total_distance), 0) as total_distance
-                FROM activity
-                WHERE user_id = :user_id AND status = 'created'
-                AND EXTRACT(YEAR FROM TO_TIMESTAMP(start_time)) >= 2013
+                FROM dailystatistic
+                WHERE user_id = :user_id AND date >= :start_date
                 GROUP BY year, sport
                 ORDER BY year, sport
-            """).bindparams(user_id=user_id)
+            """).bindparams(
+                user_id=user_id,
+                start_date=datetime.date(STATISTICS_START_YEAR, 1, 1),
+            )
         ).all()
 
         yearly_dict: YearlyStats = {}
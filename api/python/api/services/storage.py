@@ -39,13 +39,13 @@ class StorageService:
 
     def upload_activity_files(
         self,
-        fit_file_path: str,
+        fit_data: bytes,
         fit_filename: str,
         title: str,
         race: bool,
     ) -> None:
         fit_s3_key = f"data/fit/{fit_filename}"
-        self.upload_file(fit_file_path, fit_s3_key)
+        self.upload_bytes(fit_data, fit_s3_key)
 
         now = datetime.datetime.now()
         yaml_s3_key = f"data/{now.year}/{now.month:02d}/{generate_random_string()}.yaml"
@@ -66,12 +66,20 @@ class StorageService:
         content: str,
         s3_key: str,
         content_type: str = "text/plain",
+    ) -> None:
+        self.upload_bytes(content.encode("utf-8"), s3_key, content_type)
+
+    def upload_bytes(
+        self,
+        data: bytes,
+        s3_key: str,
+        content_type: str = "application/octet-stream",
     ) -> None:
         try:
             self.client.put_object(
                 Bucket=self.bucket,
                 Key=s3_key,
-                Body=content.encode("utf-8"),
+                Body=data,
                 ContentType=content_type,
             )
         except ClientError as e:
@@ -0,0 +1,134 @@
+import datetime
+import uuid
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass
+from typing import overload
+
+from api.model import Tracepoint
+
+# Record fields of a track, in TrackPoint/TrackArray order
+TRACK_FIELDS = (
+    "lat",
+    "lon",
+    "timestamp",
+    "distance",
+    "heart_rate",
+    "speed",
+    "power",
+    "altitude",
+    "temperature",
+    "cadence",
+)
+
+
+@dataclass(slots=True, frozen=True)
+class TrackPoint:
+    """One record of a TrackArray; `timestamp` is in epoch seconds."""
+
+    lat: float
+    lon: float
+    timestamp: float
+    distance: float
+    heart_rate: int | None
+    speed: float
+    power: int | None
+    altitude: float | None
+    temperature: int | None
+    cadence: int | None
+
+
+@dataclass(slots=True)
+class TrackArray:
+    """Records of an activity stored column by column, timestamps in epoch seconds.
+
+    Columns are plain sequences, such as memoryviews over the buffers decoded by
+    the extension, so no object is built per record. Only the points actually
+    stored are turned into `Tracepoint` rows, see `to_tracepoints`.
+    """
+
+    lat: Sequence[float]
+    lon: Sequence[float]
+    timestamp: Sequence[float]
+    distance: Sequence[float]
+    heart_rate: Sequence[int | None]
+    speed: Sequence[float]
+    power: Sequence[int | None]
+    altitude: Sequence[float | None]
+    temperature: Sequence[int | None]
+    cadence: Sequence[int | None]
+
+    @classmethod
+    def from_tracepoints(cls, tracepoints: Sequence[Tracepoint]) -> "TrackArray":
+        return cls(
+            lat=[tp.lat for tp in tracepoints],
+            lon=[tp.lon for tp in tracepoints],
+            timestamp=[tp.timestamp.timestamp() for tp in tracepoints],
+            distance=[tp.distance for tp in tracepoints],
+            heart_rate=[tp.heart_rate for tp in tracepoints],
+            speed=[tp.speed for tp in tracepoints],
+            power=[tp.power for tp in tracepoints],
+            altitude=[tp.altitude for tp in tracepoints],
+            temperature=[tp.temperature for tp in tracepoints],
+            cadence=[tp.cadence for tp in tracepoints],
+        )
+
+    def columns(self) -> list[Sequence]:
+        return [getattr(self, name) for name in TRACK_FIELDS]
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def __iter__(self) -> Iterator[TrackPoint]:
+        return map(TrackPoint, *self.columns())
+
+    @overload
+    def __getitem__(self, index: int) -> TrackPoint: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "TrackArray": ...
+
+    def __getitem__(self, index: int | slice) -> "TrackPoint | TrackArray":
+        if isinstance(index, slice):
+            return TrackArray(*(column[index] for column in self.columns()))
+        return TrackPoint(*(column[index] for column in self.columns()))
+
+    def downsample(self, max_points: int) -> "TrackArray":
+        """Every 2**k-th point, for the smallest k leaving at most `max_points`.
+
+        These are the points kept by halving the track until it fits.
+        """
+        step = 1
+        while -(-len(self) // step) > max_points:
+            step *= 2
+        return self[::step] if step > 1 else self
+
+    def to_tracepoints(self, activity_id: uuid.UUID) -> list[Tracepoint]:
+        return [
+            Tracepoint(
+                id=uuid.uuid4(),
+                activity_id=activity_id,
+                lat=point.lat,
+                lon=point.lon,
+                timestamp=datetime.datetime.fromtimestamp(
+                    point.timestamp, datetime.UTC
+                ),
+                distance=float(point.distance),
+                heart_rate=point.heart_rate,
+                speed=point.speed,
+                power=point.power,
+                altitude=point.altitude,
+                temperature=point.temperature,
+                cadence=point.cadence,
+            )
+            for point in self
+        ]
+
+
+type Points = TrackArray | Sequence[Tracepoint]
+
+
+def as_track_array(points: Points) -> TrackArray:
+    """The given track, or the tracepoints (e.g. loaded from the database) as one."""
+    if isinstance(points, TrackArray):
+        return points
+    return TrackArray.from_tracepoints(points)
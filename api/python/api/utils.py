@@ -1,22 +1,48 @@
+import base64
 import datetime
+import json
 import math
 import os
 import random
 import string
 import uuid
+from bisect import bisect_left
+from collections.abc import Iterable, Sequence
+from operator import sub
 
-from sqlmodel import Session, select
+from sqlalchemy import ColumnElement, Select, and_, case, func, inspect, or_, update
+from sqlmodel import Session, col, select
 
 from api.model import (
     Activity,
+    ActivityHistogram,
     ActivityZoneHeartRate,
     ActivityZonePace,
     ActivityZonePower,
     Location,
     Notification,
     Performance,
-    Tracepoint,
     Zone,
+    ZoneEstimate,
+)
+from api.track import Points, as_track_array
+
+# Activity zone rows created per zone type
+ACTIVITY_ZONE_MODELS: dict[
+    str, type[ActivityZoneHeartRate | ActivityZonePace | ActivityZonePower]
+] = {
+    "heart_rate": ActivityZoneHeartRate,
+    "pace": ActivityZonePace,
+    "power": ActivityZonePower,
+}
+
+# Sorted value lists of a ZoneEstimate
+ZONE_ESTIMATE_FIELDS = (
+    "max_heart_rates",
+    "threshold_run_speeds",
+    "long_run_speeds",
+    "short_run_speeds",
+    "max_powers",
 )
 
 # Training zone percentages - Heart Rate
@@ -103,34 +129,6 @@ POWER_TIME_TOLERANCE_SECONDS = 1
 MAX_TRACEPOINTS_FOR_RESPONSE = 500
 
 
-def get_lat_lon(points: list[Tracepoint]) -> tuple[float, float]:
-    x = y = z = 0.0
-
-    if len(points) == 0:
-        return 0.0, 0.0
-
-    for point in points:
-        lon = math.radians(float(point.lon))
-        lat = math.radians(float(point.lat))
-
-        x += math.cos(lon) * math.cos(lat)
-        y += math.cos(lon) * math.sin(lat)
-        z += math.sin(lon)
-
-    total = len(points)
-
-    x = x / total
-    y = y / total
-    z = z / total
-
-    lon = math.atan2(y, x)
-    lat = math.atan2(z, math.sqrt(x * x + y * y))
-
-    lat, lon = map(math.degrees, (lon, lat))
-
-    return lat, lon
-
-
 def get_delta_lat_lon(lat: float, max_distance: float) -> tuple[float, float]:
     delta_lat = max_distance / EARTH_RADIUS_METERS * (180 / math.pi)
     delta_lon = (
@@ -266,218 +264,421 @@ def get_activity_location(
     return None, None, None
 
 
+# Zone upper bounds as multiples of each estimated threshold, by zone index
+ZONE_THRESHOLD_FACTORS: dict[str, tuple[float, ...]] = {
+    "heart_rate": (
+        HR_ZONE_1_MAX_PCT,
+        HR_ZONE_2_MAX_PCT,
+        HR_ZONE_3_MAX_PCT,
+        HR_ZONE_4_MAX_PCT,
+        HR_ZONE_5_MAX_PCT,
+    ),
+    "pace": (
+        PACE_ZONE_1_MULTIPLIER,
+        PACE_ZONE_2_MULTIPLIER,
+        PACE_ZONE_3_MULTIPLIER,
+        PACE_ZONE_4_MULTIPLIER,
+        PACE_ZONE_5_MULTIPLIER,
+    ),
+    "power": (
+        POWER_ZONE_1_MAX_PCT,
+        POWER_ZONE_2_MAX_PCT,
+        POWER_ZONE_3_MAX_PCT,
+        POWER_ZONE_4_MAX_PCT,
+        POWER_ZONE_5_MAX_PCT,
+    ),
+}
+
+
 def update_user_zones_from_activities(session: Session, user_id: str) -> None:
     """Update user's training zones based on their existing activities from the last year"""
+    thresholds = estimate_zone_thresholds(session, [user_id]).get(user_id)
+    if not thresholds:
+        return
 
-    # Calculate timestamp for one year ago
-    one_year_ago = datetime.datetime.now() - datetime.timedelta(days=ONE_YEAR_IN_DAYS)
-    one_year_ago_timestamp = int(one_year_ago.timestamp())
+    update_zone_max_values(session, user_id, thresholds)
+    session.commit()
+
+
+def update_zones_from_activities(session: Session, user_ids: Sequence[str]) -> None:
+    """Update the training zones of the given users from their last year of activities.
+
+    The thresholds of all users are estimated in a few aggregate queries, then
+    each user's zones are rewritten by a single UPDATE.
+    """
+    for user_id, thresholds in estimate_zone_thresholds(session, user_ids).items():
+        update_zone_max_values(session, user_id, thresholds)
+
+
+def estimate_zone_thresholds(
+    session: Session, user_ids: Sequence[str]
+) -> dict[str, dict[str, float]]:
+    """Max heart rate, threshold pace and FTP of each user, by zone type.
 
-    # Get user activities from the last year only
-    activities = session.exec(
-        select(Activity).where(
+    Only the columns needed are read, and ranks are computed by window functions
+    so every estimate is one query for all users. Users without the data for an
+    estimate have no entry for it.
+    """
+    if not user_ids:
+        return {}
+
+    recent = (
+        col(Activity.user_id).in_(user_ids),
+        Activity.status == "created",
+        Activity.start_time >= _one_year_ago_timestamp(),
+    )
+
+    thresholds: dict[str, dict[str, float]] = {}
+    for user_id, max_hr in session.exec(_max_heart_rate_query(recent)).all():
+        # Cap the estimate, as outliers above it are usually sensor errors
+        thresholds.setdefault(user_id, {})["heart_rate"] = min(
+            max_hr, MAX_HR_SAFETY_CAP
+        )
+
+    long_run_speeds = dict(session.exec(_long_run_speed_query(recent)).all())
+    short_run_speeds = dict(session.exec(_short_run_speed_query(recent)).all())
+    for user_id in long_run_speeds.keys() | short_run_speeds.keys():
+        if user_id in long_run_speeds:
+            speed = long_run_speeds[user_id]
+            factor = 1.0
+        else:
+            # Only short runs, which are faster than threshold pace
+            speed = short_run_speeds[user_id]
+            factor = PACE_CONSERVATIVENESS_FACTOR
+        if speed:
+            thresholds.setdefault(user_id, {})["pace"] = (
+                SECONDS_PER_KM_CONVERSION / speed
+            ) * factor
+
+    for user_id, max_power in session.exec(_max_power_query(recent)).all():
+        # The highest max power is used as functional threshold power (FTP) estimate
+        # This is simplified - in reality FTP should be based on 20min or 1hr power
+        thresholds.setdefault(user_id, {})["power"] = (
+            max_power * FTP_FROM_MAX_POWER_MULTIPLIER
+        )
+
+    return thresholds
+
+
+def update_zone_max_values(
+    session: Session, user_id: str, thresholds: dict[str, float]
+) -> None:
+    """Set the user's zones of the given types from their thresholds in one UPDATE."""
+    if not thresholds:
+        return
+
+    max_values = [
+        (and_(Zone.type == zone_type, Zone.index == index), threshold * factor)
+        for zone_type, threshold in thresholds.items()
+        for index, factor in enumerate(ZONE_THRESHOLD_FACTORS[zone_type], start=1)
+    ]
+    statement = (
+        update(Zone)
+        .where(
+            col(Zone.user_id) == user_id,
+            col(Zone.type).in_(list(thresholds)),
+        )
+        .values(max_value=case(*max_values, else_=Zone.max_value))
+    )
+    session.execute(statement)  # ty: ignore[deprecated]
+
+
+def build_zone_estimate(session: Session, user_id: str) -> ZoneEstimate:
+    """Rebuild the user's zone estimate from their last year of activities."""
+    rows = session.exec(
+        select(
+            Activity.start_time,
+            Activity.sport,
+            Activity.total_distance,
+            Activity.avg_speed,
+            Activity.max_heart_rate,
+            Activity.max_power,
+        ).where(
             Activity.user_id == user_id,
             Activity.status == "created",
-            Activity.start_time >= one_year_ago_timestamp,
+            Activity.start_time >= _one_year_ago_timestamp(),
         )
     ).all()
 
-    if not activities:
-        return
+    values: dict[str, list[float]] = {field: [] for field in ZONE_ESTIMATE_FIELDS}
+    for row in rows:
+        summary = zone_estimate_values(
+            row.sport,
+            row.total_distance,
+            row.avg_speed,
+            row.max_heart_rate,
+            row.max_power,
+        )
+        for field, value in summary.items():
+            values[field].append(value)
+
+    estimate = session.get(
+        ZoneEstimate, user_id, with_for_update=True, populate_existing=True
+    ) or ZoneEstimate(user_id=user_id)
+    estimate.oldest_start_time = min((row.start_time for row in rows), default=None)
+    for field, field_values in values.items():
+        setattr(estimate, field, sorted(field_values))
+    session.add(estimate)
+    return estimate
+
+
+def update_zone_estimate(
+    session: Session, user_id: str, activity: Activity, deleted: bool = False
+) -> ZoneEstimate:
+    """Add the activity to the user's zone estimate, or remove it if `deleted`.
+
+    Each value is found by bisection in its sorted list, the lists still being
+    copied and rewritten whole. The row is locked until the transaction ends, so
+    that concurrent uploads and deletions do not overwrite each other's changes.
+    The estimate is only rebuilt when missing, stale or not matching the
+    activities.
+    """
+    estimate = session.get(
+        ZoneEstimate, user_id, with_for_update=True, populate_existing=True
+    )
+    one_year_ago = _one_year_ago_timestamp()
+    if estimate is None or (
+        estimate.oldest_start_time is not None
+        and estimate.oldest_start_time < one_year_ago
+    ):
+        return build_zone_estimate(session, user_id)
 
-    # Calculate heart rate zones (based on max HR from activities)
-    heart_rates = [a.max_heart_rate for a in activities if a.max_heart_rate is not None]
-    if heart_rates:
-        # Use 95th percentile of max heart rates to avoid outliers, but ensure it's realistic
-        sorted_hrs = sorted(heart_rates, reverse=True)
-        percentile_95_index = max(0, int(len(sorted_hrs) * HR_PERCENTILE_95_INDEX))
-        estimated_max_hr = sorted_hrs[percentile_95_index]
-
-        # Additional safety: ensure the estimated max HR is reasonable
-        # If it seems too high, cap it at a more conservative value
-        if estimated_max_hr > MAX_HR_SAFETY_CAP:
-            estimated_max_hr = min(estimated_max_hr, MAX_HR_SAFETY_CAP)
-
-        # Using standard 5-zone heart rate model based on estimated max HR
-        # These percentages represent the upper limit of each zone
-        hr_zones = [
-            {
-                "index": 1,
-                "max_value": estimated_max_hr * HR_ZONE_1_MAX_PCT,
-            },
-            {
-                "index": 2,
-                "max_value": estimated_max_hr * HR_ZONE_2_MAX_PCT,
-            },
-            {
-                "index": 3,
-                "max_value": estimated_max_hr * HR_ZONE_3_MAX_PCT,
-            },
-            {
-                "index": 4,
-                "max_value": estimated_max_hr * HR_ZONE_4_MAX_PCT,
-            },
-            {
-                "index": 5,
-                "max_value": estimated_max_hr * HR_ZONE_5_MAX_PCT,
-            },
-        ]
-
-        # Update heart rate zones
-        for zone_data in hr_zones:
-            zone = session.exec(
-                select(Zone).where(
-                    Zone.user_id == user_id,
-                    Zone.type == "heart_rate",
-                    Zone.index == zone_data["index"],
-                )
-            ).first()
-            if zone:
-                zone.max_value = zone_data["max_value"]
-                session.add(zone)
-
-    # Calculate pace zones (based on longer running activities)
-    running_activities = [a for a in activities if a.sport == "running"]
-    if running_activities:
-        # Filter for longer runs (>= 5km) to get more realistic threshold pace estimates
-        # Shorter runs tend to be much faster and not representative of threshold pace
-        longer_runs = [
-            a
-            for a in running_activities
-            if a.total_distance >= LONG_RUN_MIN_DISTANCE_METERS
-        ]
-
-        if longer_runs:
-            # Use activities between 5-15km as they're more likely to be at sustainable paces
-            threshold_candidates = [
-                a
-                for a in longer_runs
-                if THRESHOLD_RUN_MIN_DISTANCE_METERS
-                <= a.total_distance
+    if activity.start_time < one_year_ago:
+        return estimate
+
+    summary = zone_estimate_values(
+        activity.sport,
+        activity.total_distance,
+        activity.avg_speed,
+        activity.max_heart_rate,
+        activity.max_power,
+    )
+    for field, value in summary.items():
+        # Lists are copied, as in-place changes of array columns are not tracked
+        values = list(getattr(estimate, field))
+        index = bisect_left(values, value)
+        if not deleted:
+            values.insert(index, value)
+        elif index < len(values) and values[index] == value:
+            del values[index]
+        else:
+            return build_zone_estimate(session, user_id)
+        setattr(estimate, field, values)
+
+    if not deleted and (
+        estimate.oldest_start_time is None
+        or activity.start_time < estimate.oldest_start_time
+    ):
+        estimate.oldest_start_time = activity.start_time
+    session.add(estimate)
+    return estimate
+
+
+def zone_estimate_values(
+    sport: str,
+    total_distance: float,
+    avg_speed: float | None,
+    max_heart_rate: float | None,
+    max_power: float | None,
+) -> dict[str, float]:
+    """Values an activity adds to each list of a zone estimate."""
+    values = {}
+    if max_heart_rate is not None:
+        values["max_heart_rates"] = max_heart_rate
+    if sport == "running":
+        if total_distance >= LONG_RUN_MIN_DISTANCE_METERS:
+            if (
+                THRESHOLD_RUN_MIN_DISTANCE_METERS
+                <= total_distance
                 <= THRESHOLD_RUN_MAX_DISTANCE_METERS
-            ]
+            ):
+                values["threshold_run_speeds"] = avg_speed or 0.0
+            else:
+                values["long_run_speeds"] = avg_speed or 0.0
+        elif avg_speed is not None:
+            values["short_run_speeds"] = avg_speed
+    if sport == "cycling" and max_power is not None:
+        values["max_powers"] = max_power
+    return values
 
-            if not threshold_candidates:
-                # If no 5-15km runs, use all longer runs
-                threshold_candidates = longer_runs
 
-            # Take the fastest 20% of these longer runs to estimate threshold pace
-            num_candidates = max(
-                1, int(len(threshold_candidates) * FASTEST_RUNS_PERCENTILE)
-            )
-            fastest_longer_runs = sorted(
-                threshold_candidates, key=lambda x: x.avg_speed or 0, reverse=True
-            )[:num_candidates]
-
-            # Calculate threshold pace from these more realistic activities
-            # avg_speed is in km/h, so convert to pace (seconds per km)
-            avg_threshold_speed_kmh = sum(
-                a.avg_speed for a in fastest_longer_runs if a.avg_speed is not None
-            ) / len(fastest_longer_runs)
-            threshold_pace = SECONDS_PER_KM_CONVERSION / avg_threshold_speed_kmh
-        else:
-            # Fallback: if no long runs, use all running activities but be more conservative
-            # Take only the middle 50% of speeds to avoid extremes
-            speeds = sorted(
-                [a.avg_speed for a in running_activities if a.avg_speed is not None]
+def zone_estimate_thresholds(estimate: ZoneEstimate) -> dict[str, float]:
+    """Max heart rate, threshold pace and FTP from a zone estimate, by zone type.
+
+    These are the thresholds `estimate_zone_thresholds` computes in SQL.
+    """
+    thresholds: dict[str, float] = {}
+
+    heart_rates = estimate.max_heart_rates
+    if heart_rates:
+        rank = int(len(heart_rates) * HR_PERCENTILE_95_INDEX)
+        thresholds["heart_rate"] = min(heart_rates[-1 - rank], MAX_HR_SAFETY_CAP)
+
+    long_run_speeds = estimate.threshold_run_speeds or estimate.long_run_speeds
+    if long_run_speeds:
+        count = max(1, int(len(long_run_speeds) * FASTEST_RUNS_PERCENTILE))
+        speed = sum(long_run_speeds[-count:]) / count
+        factor = 1.0
+    else:
+        speeds = estimate.short_run_speeds
+        start = len(speeds) // 4
+        end = start + len(speeds) // 2
+        middle_speeds = speeds[start:end] if end > start else speeds
+        speed = sum(middle_speeds) / len(middle_speeds) if middle_speeds else 0.0
+        factor = PACE_CONSERVATIVENESS_FACTOR
+    if speed:
+        thresholds["pace"] = (SECONDS_PER_KM_CONVERSION / speed) * factor
+
+    if estimate.max_powers:
+        thresholds["power"] = estimate.max_powers[-1] * FTP_FROM_MAX_POWER_MULTIPLIER
+
+    return thresholds
+
+
+def _one_year_ago_timestamp() -> int:
+    one_year_ago = datetime.datetime.now() - datetime.timedelta(days=ONE_YEAR_IN_DAYS)
+    return int(one_year_ago.timestamp())
+
+
+def _max_heart_rate_query(recent: tuple) -> Select:
+    # 95th percentile of max heart rates (rank int(n * 5%) from the top) to
+    # avoid outliers; rank - 1 <= n * 5% < rank picks it without a floor()
+    ranked = (
+        select(
+            col(Activity.user_id).label("user_id"),
+            col(Activity.max_heart_rate).label("max_heart_rate"),
+            func.row_number()
+            .over(
+                partition_by=Activity.user_id,
+                order_by=col(Activity.max_heart_rate).desc(),
             )
-            start_idx = len(speeds) // 4
-            end_idx = start_idx + len(speeds) // 2
-            middle_speeds = speeds[start_idx:end_idx] if end_idx > start_idx else speeds
-            avg_speed_kmh = sum(middle_speeds) / len(middle_speeds)
-            threshold_pace = (
-                SECONDS_PER_KM_CONVERSION / avg_speed_kmh
-            ) * PACE_CONSERVATIVENESS_FACTOR
-
-        # Using standard 5-zone pace model based on threshold pace
-        # Note: Higher pace values = slower, so multipliers work differently
-        pace_zones = [
-            {
-                "index": 1,
-                "max_value": threshold_pace * PACE_ZONE_1_MULTIPLIER,
-            },
-            {
-                "index": 2,
-                "max_value": threshold_pace * PACE_ZONE_2_MULTIPLIER,
-            },
-            {
-                "index": 3,
-                "max_value": threshold_pace * PACE_ZONE_3_MULTIPLIER,
-            },
-            {
-                "index": 4,
-                "max_value": threshold_pace * PACE_ZONE_4_MULTIPLIER,
-            },
-            {
-                "index": 5,
-                "max_value": threshold_pace * PACE_ZONE_5_MULTIPLIER,
-            },
-        ]
-
-        # Update pace zones
-        for zone_data in pace_zones:
-            zone = session.exec(
-                select(Zone).where(
-                    Zone.user_id == user_id,
-                    Zone.type == "pace",
-                    Zone.index == zone_data["index"],
-                )
-            ).first()
-            if zone:
-                zone.max_value = zone_data["max_value"]
-                session.add(zone)
-
-    # Calculate power zones (based on max power from cycling activities)
-    cycling_activities = [
-        a for a in activities if a.sport == "cycling" and a.max_power is not None
-    ]
-    if cycling_activities:
-        # Use the highest max power as functional threshold power (FTP) estimate
-        # This is simplified - in reality FTP should be based on 20min or 1hr power
-        max_powers = [
-            a.max_power for a in cycling_activities if a.max_power is not None
-        ]
-        estimated_ftp = max(max_powers) * FTP_FROM_MAX_POWER_MULTIPLIER
-
-        # Using standard 5-zone power model based on FTP
-        power_zones = [
-            {
-                "index": 1,
-                "max_value": estimated_ftp * POWER_ZONE_1_MAX_PCT,
-            },
-            {
-                "index": 2,
-                "max_value": estimated_ftp * POWER_ZONE_2_MAX_PCT,
-            },
-            {
-                "index": 3,
-                "max_value": estimated_ftp * POWER_ZONE_3_MAX_PCT,
-            },
-            {
-                "index": 4,
-                "max_value": estimated_ftp * POWER_ZONE_4_MAX_PCT,
-            },
-            {
-                "index": 5,
-                "max_value": estimated_ftp * POWER_ZONE_5_MAX_PCT,
-            },
-        ]
-
-        # Update power zones
-        for zone_data in power_zones:
-            zone = session.exec(
-                select(Zone).where(
-                    Zone.user_id == user_id,
-                    Zone.type == "power",
-                    Zone.index == zone_data["index"],
+            .label("rank"),
+            func.count().over(partition_by=Activity.user_id).label("total"),
+        )
+        .where(*recent, col(Activity.max_heart_rate).is_not(None))
+        .subquery()
+    )
+    position = ranked.c.total * HR_PERCENTILE_95_INDEX
+    return select(ranked.c.user_id, ranked.c.max_heart_rate).where(
+        ranked.c.rank - 1 <= position, position < ranked.c.rank
+    )
+
+
+def _long_run_speed_query(recent: tuple) -> Select:
+    # Shorter runs tend to be much faster and not representative of threshold
+    # pace, so only runs >= 5km are used, preferring 5-15km ones as they're more
+    # likely to be at sustainable paces. The fastest 20% of them are averaged.
+    long_runs = (
+        select(
+            col(Activity.user_id).label("user_id"),
+            col(Activity.avg_speed).label("avg_speed"),
+            col(Activity.total_distance).label("total_distance"),
+            func.max(
+                case(
+                    (
+                        col(Activity.total_distance).between(
+                            THRESHOLD_RUN_MIN_DISTANCE_METERS,
+                            THRESHOLD_RUN_MAX_DISTANCE_METERS,
+                        ),
+                        1,
+                    ),
+                    else_=0,
                 )
-            ).first()
-            if zone:
-                zone.max_value = zone_data["max_value"]
-                session.add(zone)
+            )
+            .over(partition_by=Activity.user_id)
+            .label("has_threshold_runs"),
+        )
+        .where(
+            *recent,
+            Activity.sport == "running",
+            Activity.total_distance >= LONG_RUN_MIN_DISTANCE_METERS,
+        )
+        .subquery()
+    )
+    candidates = (
+        select(
+            long_runs.c.user_id,
+            long_runs.c.avg_speed,
+            func.row_number()
+            .over(
+                partition_by=long_runs.c.user_id,
+                order_by=func.coalesce(long_runs.c.avg_speed, 0).desc(),
+            )
+            .label("rank"),
+            func.count().over(partition_by=long_runs.c.user_id).label("total"),
+        )
+        .where(
+            or_(
+                long_runs.c.has_threshold_runs == 0,
+                long_runs.c.total_distance.between(
+                    THRESHOLD_RUN_MIN_DISTANCE_METERS,
+                    THRESHOLD_RUN_MAX_DISTANCE_METERS,
+                ),
+            )
+        )
+        .subquery()
+    )
+    # Runs without speed count in the average as 0 km/h, as before
+    return (
+        select(
+            candidates.c.user_id,
+            func.sum(candidates.c.avg_speed) / func.count(),
+        )
+        .where(
+            or_(
+                candidates.c.rank == 1,
+                candidates.c.rank <= candidates.c.total * FASTEST_RUNS_PERCENTILE,
+            )
+        )
+        .group_by(candidates.c.user_id)
+    )
 
-    # Commit all zone updates
-    session.commit()
+
+def _short_run_speed_query(recent: tuple) -> Select:
+    # Without long runs, average the middle 50% of run speeds to avoid extremes
+    ranked = (
+        select(
+            col(Activity.user_id).label("user_id"),
+            col(Activity.avg_speed).label("avg_speed"),
+            func.row_number()
+            .over(partition_by=Activity.user_id, order_by=col(Activity.avg_speed))
+            .label("rank"),
+            func.count().over(partition_by=Activity.user_id).label("total"),
+        )
+        .where(
+            *recent,
+            Activity.sport == "running",
+            col(Activity.avg_speed).is_not(None),
+        )
+        .subquery()
+    )
+    # The slice [n // 4, n // 4 + n // 2) of speeds, with ranks starting at 1
+    start = ranked.c.total // 4
+    return (
+        select(ranked.c.user_id, func.avg(ranked.c.avg_speed))
+        .where(
+            or_(
+                ranked.c.total < 2,
+                and_(
+                    ranked.c.rank > start,
+                    ranked.c.rank <= start + ranked.c.total // 2,
+                ),
+            )
+        )
+        .group_by(ranked.c.user_id)
+    )
+
+
+def _max_power_query(recent: tuple) -> Select:
+    return (
+        select(Activity.user_id, func.max(Activity.max_power))
+        .where(
+            *recent,
+            Activity.sport == "cycling",
+            col(Activity.max_power).is_not(None),
+        )
+        .group_by(col(Activity.user_id))
+    )
 
 
 def create_default_zones(session: Session, user_id: str):
@@ -562,7 +763,7 @@ def create_default_zones(session: Session, user_id: str):
 
 
 def calculate_activity_zone_data(
-    session: Session, activity: Activity, tracepoints: list[Tracepoint]
+    session: Session, activity: Activity, tracepoints: Points
 ) -> None:
     """Calculate and save time spent in each zone for an activity"""
     if not tracepoints or not activity.user_id:
@@ -576,154 +777,255 @@ def calculate_activity_zone_data(
     if not user_zones:
         return
 
-    # Group zones by type
-    heart_rate_zones = [z for z in user_zones if z.type == "heart_rate"]
-    pace_zones = [z for z in user_zones if z.type == "pace"]
-    power_zones = [z for z in user_zones if z.type == "power"]
-
-    # Calculate heart rate zone data
-    if heart_rate_zones and any(tp.heart_rate for tp in tracepoints):
-        zone_data = _calculate_heart_rate_zones(heart_rate_zones, tracepoints)
-        for zone_id, time_in_zone in zone_data.items():
-            if time_in_zone > 0:
-                activity_zone_hr = ActivityZoneHeartRate(
-                    activity_id=activity.id,
-                    zone_id=zone_id,
-                    time_in_zone=time_in_zone,
-                )
-                session.add(activity_zone_hr)
-
-    # Calculate pace zone data for running
-    if pace_zones and activity.sport == "running":
-        zone_data = _calculate_pace_zones(pace_zones, tracepoints)
-        for zone_id, time_in_zone in zone_data.items():
-            if time_in_zone > 0:
-                activity_zone_pace = ActivityZonePace(
-                    activity_id=activity.id,
-                    zone_id=zone_id,
-                    time_in_zone=time_in_zone,
-                )
-                session.add(activity_zone_pace)
+    times = calculate_zone_times(user_zones, tracepoints, activity.sport)
+    for row in activity_zone_rows(activity.id, times):
+        session.add(row)
 
-    # Calculate power zone data for cycling
-    if (
-        power_zones
-        and activity.sport == "cycling"
-        and any(tp.power for tp in tracepoints)
-    ):
-        zone_data = _calculate_power_zones(power_zones, tracepoints)
-        for zone_id, time_in_zone in zone_data.items():
-            if time_in_zone > 0:
-                activity_zone_power = ActivityZonePower(
-                    activity_id=activity.id,
-                    zone_id=zone_id,
-                    time_in_zone=time_in_zone,
-                )
-                session.add(activity_zone_power)
 
+def activity_zone_rows(
+    activity_id: uuid.UUID, times: dict[str, dict[uuid.UUID, float]]
+) -> list[ActivityZoneHeartRate | ActivityZonePace | ActivityZonePower]:
+    """Rows of the zones an activity spent time in, from calculate_zone_times."""
+    return [
+        model(activity_id=activity_id, zone_id=zone_id, time_in_zone=time_in_zone)
+        for zone_type, model in ACTIVITY_ZONE_MODELS.items()
+        for zone_id, time_in_zone in times[zone_type].items()
+        if time_in_zone > 0
+    ]
 
-def _calculate_heart_rate_zones(
-    zones: list[Zone], tracepoints: list[Tracepoint]
-) -> dict[uuid.UUID, float]:
-    """Calculate time spent in each heart rate zone"""
-    zone_data: dict[uuid.UUID, float] = {}
 
-    # Sort zones by max_value for proper zone assignment
-    sorted_zones = sorted(zones, key=lambda z: z.max_value)
+def zone_signals(tracepoints: Points, sport: str) -> dict[str, Sequence[float | None]]:
+    """Samples of an activity binned into zones, by zone type.
 
-    for i in range(len(tracepoints) - 1):
-        current_tp = tracepoints[i]
-        next_tp = tracepoints[i + 1]
+    Heart rate is used when recorded, pace (s/km) for runs and power for rides
+    with power data.
+    """
+    track = as_track_array(tracepoints)
+    signals: dict[str, Sequence[float | None]] = {}
 
-        if current_tp.heart_rate is None:
-            continue
+    if any(track.heart_rate):
+        signals["heart_rate"] = track.heart_rate
 
-        # Calculate time spent at this heart rate
-        time_diff = (next_tp.timestamp - current_tp.timestamp).total_seconds()
+    if sport == "running":
+        signals["pace"] = _paces(track.speed)
 
-        # Find which zone this heart rate belongs to
-        zone_id = None
-        for zone in sorted_zones:
-            if current_tp.heart_rate <= zone.max_value:
-                zone_id = zone.id
-                break
+    if sport == "cycling" and any(track.power):
+        signals["power"] = track.power
 
-        if zone_id:
-            zone_data[zone_id] = zone_data.get(zone_id, 0) + time_diff
+    return signals
 
-    return zone_data
 
+def calculate_zone_times(
+    zones: Sequence[Zone], tracepoints: Points, sport: str
+) -> dict[str, dict[uuid.UUID, float]]:
+    """Time spent in each zone of an activity, by zone type."""
+    track = as_track_array(tracepoints)
+    times: dict[str, dict[uuid.UUID, float]] = {
+        zone_type: {} for zone_type in ACTIVITY_ZONE_MODELS
+    }
 
-def _calculate_pace_zones(
-    zones: list[Zone], tracepoints: list[Tracepoint]
+    for zone_type, values in zone_signals(track, sport).items():
+        type_zones = [z for z in zones if z.type == zone_type]
+        if type_zones:
+            times[zone_type] = zone_times(
+                values,
+                track.timestamp,
+                type_zones,
+                overflow=_overflow_zone(zone_type, type_zones),
+            )
+
+    return times
+
+
+def calculate_activity_histograms(
+    activity: Activity, tracepoints: Points
+) -> list[ActivityHistogram]:
+    """Histograms of the signals of an activity binned into zones."""
+    track = as_track_array(tracepoints)
+    histograms = []
+
+    for zone_type, values in zone_signals(track, activity.sport).items():
+        seconds: dict[int, float] = {}
+        for value, time_diff in zip(
+            values, map(sub, track.timestamp[1:], track.timestamp)
+        ):
+            if value is not None:
+                value_bin = math.ceil(value)
+                seconds[value_bin] = seconds.get(value_bin, 0) + time_diff
+
+        if seconds:
+            value_bins = sorted(seconds)
+            histograms.append(
+                ActivityHistogram(
+                    activity_id=activity.id,
+                    type=zone_type,
+                    values=value_bins,
+                    seconds=[seconds[value_bin] for value_bin in value_bins],
+                )
+            )
+
+    return histograms
+
+
+def calculate_histogram_zone_times(
+    zones: Sequence[Zone], histograms: Sequence[ActivityHistogram]
+) -> dict[str, dict[uuid.UUID, float]]:
+    """Time spent in each zone of an activity by zone type, from its histograms.
+
+    Histogram bins being rounded up, zone bounds are exact to 1 bpm, 1 s/km or
+    1 W.
+    """
+    times: dict[str, dict[uuid.UUID, float]] = {
+        zone_type: {} for zone_type in ACTIVITY_ZONE_MODELS
+    }
+
+    for histogram in histograms:
+        type_zones = [z for z in zones if z.type == histogram.type]
+        if type_zones:
+            times[histogram.type] = bin_times(
+                histogram.values,
+                histogram.seconds,
+                type_zones,
+                overflow=_overflow_zone(histogram.type, type_zones),
+            )
+
+    return times
+
+
+def zone_times(
+    values: Sequence[float | None],
+    timestamps: Sequence[float],
+    zones: Sequence[Zone],
+    overflow: Zone | None = None,
 ) -> dict[uuid.UUID, float]:
-    """Calculate time spent in each pace zone"""
-    zone_data: dict[uuid.UUID, float] = {}
+    """Time spent in each zone by a sampled signal, a sample lasting until the
+    next one."""
+    return bin_times(values, map(sub, timestamps[1:], timestamps), zones, overflow)
+
 
-    zones_by_index = sorted(zones, key=lambda z: z.index)
+def bin_times(
+    values: Iterable[float | None],
+    seconds: Iterable[float],
+    zones: Sequence[Zone],
+    overflow: Zone | None = None,
+) -> dict[uuid.UUID, float]:
+    """Sum of the seconds of the values falling in each zone.
 
-    for i in range(len(tracepoints) - 1):
-        current_tp = tracepoints[i]
-        next_tp = tracepoints[i + 1]
+    A value falls in the zone with the lowest max_value at or above it, found by
+    binary search over the sorted bounds. Values above every zone count for
+    `overflow`, or are dropped; None values are skipped.
+    """
+    sorted_zones = sorted(zones, key=lambda z: z.max_value)
+    bounds = [zone.max_value for zone in sorted_zones]
+    zone_ids = [zone.id for zone in sorted_zones]
+    zone_ids.append(overflow.id if overflow is not None else None)
 
-        if current_tp.speed <= 0:
+    zone_data: dict[uuid.UUID, float] = {}
+    for value, time_diff in zip(values, seconds):
+        if value is None:
             continue
 
-        # Calculate pace in seconds per km
-        speed_kmh = current_tp.speed  # Treat as km/h directly
-        if speed_kmh > 0:
-            pace = SECONDS_PER_KM_CONVERSION / speed_kmh
-        else:
-            continue  # Skip points with zero speed
+        zone_id = zone_ids[bisect_left(bounds, value)]
+        if zone_id is not None:
+            zone_data[zone_id] = zone_data.get(zone_id, 0) + time_diff
 
-        # Calculate time spent at this pace
-        time_diff = (next_tp.timestamp - current_tp.timestamp).total_seconds()
+    return zone_data
 
-        # Find which zone this pace belongs to
-        zone_id = None
 
-        # Check from fastest to slowest zone to find the most appropriate zone
-        for zone in reversed(zones_by_index):
-            if pace <= zone.max_value:
-                zone_id = zone.id
-                break
+def _paces(speeds: Sequence[float]) -> list[float | None]:
+    # Pace in seconds per km, speeds being in km/h; points at rest are skipped
+    return [
+        SECONDS_PER_KM_CONVERSION / speed if speed > 0 else None for speed in speeds
+    ]
 
-        # If no zone found (pace is slower than all zones), assign to slowest zone
-        if zone_id is None:
-            zone_id = zones_by_index[0].id  # Zone 1 (slowest)
 
-        zone_data[zone_id] = zone_data.get(zone_id, 0) + time_diff
+def _overflow_zone(zone_type: str, zones: Sequence[Zone]) -> Zone | None:
+    # Paces slower than every zone count for zone 1 (slowest)
+    if zone_type == "pace":
+        return min(zones, key=lambda z: z.index)
+    return None
 
-    return zone_data
 
+def encode_activity_cursor(order_by: str, order: str, activity: Activity) -> str:
+    """Opaque cursor of the activities listed after `activity` when ordered by
+    `order_by` then id, in `order`."""
+    payload = [order_by, order, getattr(activity, order_by), str(activity.id)]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
 
-def _calculate_power_zones(
-    zones: list[Zone], tracepoints: list[Tracepoint]
-) -> dict[uuid.UUID, float]:
-    """Calculate time spent in each power zone"""
-    zone_data: dict[uuid.UUID, float] = {}
 
-    # Sort zones by max_value for proper zone assignment
-    sorted_zones = sorted(zones, key=lambda z: z.max_value)
+def decode_activity_cursor(
+    cursor: str, order_by: str, order: str
+) -> tuple[float | None, uuid.UUID]:
+    """Order value and id of the activity of a cursor made by
+    `encode_activity_cursor`, raising ValueError if it is invalid or was made
+    for another order."""
+    try:
+        cursor_order_by, cursor_order, value, activity_id = json.loads(
+            base64.urlsafe_b64decode(cursor.encode())
+        )
+        if not isinstance(activity_id, str):
+            raise TypeError("Cursor id must be a string")
+        activity_id = uuid.UUID(activity_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if (cursor_order_by, cursor_order) != (order_by, order):
+        raise ValueError("Cursor was made for another order")
+    if value is not None and not isinstance(value, int | float):
+        raise ValueError("Invalid cursor")
+    return value, activity_id
+
+
+def activity_cursor_condition(
+    order_by: str, order: str, value: float | None, activity_id: uuid.UUID
+) -> ColumnElement[bool]:
+    """Condition on the activities listed after a cursor, when ordered by
+    `order_by` then id, in `order`, nulls last in ascending order and first in
+    descending order (the PostgreSQL defaults).
+
+    The range condition on the order column comes first so that an index on it
+    can be used, as the (user_id, start_time) one for the default order.
+    """
+    column = inspect(Activity).columns[order_by]
+    if order == "asc":
+        if value is None:
+            return and_(column.is_(None), col(Activity.id) > activity_id)
+        after = and_(
+            column >= value, or_(column > value, col(Activity.id) > activity_id)
+        )
+        return or_(after, column.is_(None)) if column.nullable else after
 
-    for i in range(len(tracepoints) - 1):
-        current_tp = tracepoints[i]
-        next_tp = tracepoints[i + 1]
+    if value is None:
+        return or_(
+            and_(column.is_(None), col(Activity.id) < activity_id),
+            column.is_not(None),
+        )
+    return and_(column <= value, or_(column < value, col(Activity.id) < activity_id))
 
-        if current_tp.power is None:
-            continue
 
-        # Calculate time spent at this power
-        time_diff = (next_tp.timestamp - current_tp.timestamp).total_seconds()
+def _calculate_heart_rate_zones(
+    zones: Sequence[Zone], tracepoints: Points
+) -> dict[uuid.UUID, float]:
+    """Calculate time spent in each heart rate zone"""
+    track = as_track_array(tracepoints)
+    return zone_times(track.heart_rate, track.timestamp, zones)
+
 
-        # Find which zone this power belongs to
-        zone_id = None
-        for zone in sorted_zones:
-            if current_tp.power <= zone.max_value:
-                zone_id = zone.id
-                break
+def _calculate_pace_zones(
+    zones: Sequence[Zone], tracepoints: Points
+) -> dict[uuid.UUID, float]:
+    """Calculate time spent in each pace zone"""
+    track = as_track_array(tracepoints)
+    return zone_times(
+        _paces(track.speed),
+        track.timestamp,
+        zones,
+        overflow=_overflow_zone("pace", zones),
+    )
 
-        if zone_id:
-            zone_data[zone_id] = zone_data.get(zone_id, 0) + time_diff
 
-    return zone_data
+def _calculate_power_zones(
+    zones: Sequence[Zone], tracepoints: Points
+) -> dict[uuid.UUID, float]:
+    """Calculate time spent in each power zone"""
+    track = as_track_array(tracepoints)
+    return zone_times(track.power, track.timestamp, zones)
@@ -1,23 +1,35 @@
+mod track;
 mod types;
 mod utils;
 
 use fit_rust::Fit;
 use fit_rust::protocol::FitMessage;
 use fit_rust::protocol::message_type::MessageType;
+use pyo3::buffer::PyBuffer;
+use pyo3::exceptions::PyValueError;
 use pyo3::prelude::*;
+use pyo3::types::PyList;
 use std::fs;
+use std::sync::atomic::{AtomicUsize, Ordering};
+use std::thread;
 
-use types::{Activity, Device, FitStruct, Lap, Point};
+use track::{Track, smoothed_speeds};
+use types::{
+    Activity, ColumnarFitStruct, Columns, Device, Field, FitData, FitStruct, Lap, ParsedFit,
+    Projection, Record,
+};
 use utils::{extract_f32, extract_i8, extract_u8, extract_u16, extract_u32};
 
-#[pyfunction]
-fn get_fit(file_name: &str) -> FitStruct {
-    let file = fs::read(file_name).unwrap();
-    let fit_file: Fit = Fit::read(file).unwrap();
+/// Extract the messages and Record fields of a FIT file selected by
+/// `projection`. fit-rust has no message filter, so `Fit::read` still parses
+/// every message and field; the projection only skips converting the values
+/// left out.
+fn decode(file: Vec<u8>, projection: &Projection) -> PyResult<FitData> {
+    let fit_file: Fit = Fit::read(file).map_err(|_| PyValueError::new_err("Invalid FIT data"))?;
 
     let mut lap: u16 = 0;
 
-    let mut fit = FitStruct {
+    let mut fit = FitData {
         activity: Activity {
             sport: String::new(),
             device: String::new(),
@@ -46,13 +58,13 @@ fn get_fit(file_name: &str) -> FitStruct {
             num_lengths: None,
         },
         laps: Vec::new(),
-        data_points: Vec::new(),
+        records: Vec::new(),
     };
 
     for data in &fit_file.data {
         match data {
             FitMessage::Data(msg) => match msg.data.message_type {
-                MessageType::DeviceInfo => {
+                MessageType::DeviceInfo if projection.device_info => {
                     for value in &msg.data.values {
                         if value.field_num == 4 && fit.activity.device == "" {
                             let device_id: u16 = extract_u16(&value.value);
@@ -60,7 +72,7 @@ fn get_fit(file_name: &str) -> FitStruct {
                         }
                     }
                 }
-                MessageType::Lap => {
+                MessageType::Lap if projection.laps => {
                     let mut new_lap = Lap {
                         index: lap,
                         start_time: 0,
@@ -99,76 +111,65 @@ fn get_fit(file_name: &str) -> FitStruct {
                     fit.laps.push(new_lap);
                     lap += 1;
                 }
-                MessageType::Record => {
-                    let mut point = Point {
-                        lat: 0.0,
-                        lon: 0.0,
-                        timestamp: 0,
-                        distance: 0,
-                        heart_rate: 0,
-                        speed: 0,
-                        power: None,
-                        altitude: 0,
-                        temperature: None,
-                        cadence: 0,
-                    };
+                MessageType::Record if projection.records => {
+                    let mut record = Record::default();
 
                     for value in &msg.data.values {
                         match value.field_num {
                             0 => {
-                                point.lat = extract_f32(&value.value);
-                                if point.lat == 180.0 {
-                                    point.lat = 0.0;
+                                record.lat = extract_f32(&value.value);
+                                if record.lat == 180.0 {
+                                    record.lat = 0.0;
                                 }
                             }
-                            1 => {
-                                point.lon = extract_f32(&value.value);
+                            1 if projection.includes(Field::Lon) => {
+                                record.lon = extract_f32(&value.value);
                             }
-                            3 => {
-                                point.heart_rate = extract_u8(&value.value);
+                            3 if projection.includes(Field::HeartRate) => {
+                                record.heart_rate = Some(extract_u8(&value.value));
                             }
-                            4 => {
-                                point.cadence = extract_u8(&value.value);
+                            4 if projection.includes(Field::Cadence) => {
+                                record.cadence = Some(extract_u8(&value.value));
                             }
-                            5 => {
-                                point.distance = extract_u32(&value.value) / 100;
+                            5 if projection.includes(Field::Distance) => {
+                                record.distance = extract_u32(&value.value) / 100;
                             }
-                            7 => {
+                            7 if projection.includes(Field::Power) => {
                                 let raw_power: u16 = extract_u16(&value.value);
-                                point.power = if raw_power == u16::MAX {
+                                record.power = if raw_power == u16::MAX {
                                     None
                                 } else {
                                     Some(raw_power)
                                 };
                             }
-                            13 => {
+                            13 if projection.includes(Field::Temperature) => {
                                 let raw_temp: i8 = extract_i8(&value.value);
-                                point.temperature = if raw_temp == i8::MAX {
+                                record.temperature = if raw_temp == i8::MAX {
                                     None
                                 } else {
                                     Some(raw_temp)
                                 };
                             }
-                            73 => {
-                                point.speed = extract_u32(&value.value);
+                            73 if projection.includes(Field::Speed) => {
+                                record.speed = extract_u32(&value.value);
                             }
-                            78 => {
-                                point.altitude = extract_u32(&value.value);
+                            78 if projection.includes(Field::Altitude) => {
+                                record.altitude = extract_u32(&value.value);
                             }
-                            253 => {
-                                point.timestamp = extract_u32(&value.value);
+                            253 if projection.includes(Field::Timestamp) => {
+                                record.timestamp = extract_u32(&value.value);
                             }
                             _ => {}
                         }
                     }
 
-                    if point.lat == 0.0 {
+                    if record.lat == 0.0 {
                         continue;
                     }
 
-                    fit.data_points.push(point);
+                    fit.records.push(record);
                 }
-                MessageType::Session => {
+                MessageType::Session if projection.session => {
                     for value in &msg.data.values {
                         match value.field_num {
                             2 => {
@@ -343,12 +344,179 @@ fn get_fit(file_name: &str) -> FitStruct {
         }
     }
 
-    fit
+    Ok(fit)
+}
+
+fn parse(file: Vec<u8>, columnar: bool, projection: &Projection) -> PyResult<ParsedFit> {
+    let fit = decode(file, projection)?;
+
+    if columnar {
+        let speeds = if projection.includes(Field::Speed) {
+            smoothed_speeds(&fit.records)
+        } else {
+            Vec::new()
+        };
+
+        Ok(ParsedFit::Columns(ColumnarFitStruct {
+            activity: fit.activity,
+            laps: fit.laps,
+            data_points: Columns::from_records(&fit.records, &speeds, projection),
+            track: (projection.includes(Field::Lat) && projection.includes(Field::Lon))
+                .then(|| Track::from_records(&fit.records)),
+        }))
+    } else {
+        Ok(ParsedFit::Rows(FitStruct {
+            activity: fit.activity,
+            laps: fit.laps,
+            data_points: fit.records.iter().map(Record::to_point).collect(),
+        }))
+    }
+}
+
+fn to_python<'py>(py: Python<'py>, fit: ParsedFit) -> PyResult<Bound<'py, PyAny>> {
+    match fit {
+        ParsedFit::Rows(fit) => Ok(fit.into_pyobject(py)?.into_any()),
+        ParsedFit::Columns(fit) => Ok(fit.into_pyobject(py)?.into_any()),
+    }
+}
+
+/// Parse a FIT file. With `columnar=True`, `data_points` is returned as a
+/// dict of packed native-endian buffers (one per field) instead of a list of
+/// dicts, see `Columns`, and `track` holds the centroid, bounding radius and
+/// bounding box of the points (see `Track`), or None if lat/lon are left out.
+///
+/// `fields` restricts the Record fields that are returned (lat, lon,
+/// timestamp, distance, speed, altitude, heart_rate, cadence, power,
+/// temperature) and `messages` the messages (session, device_info, lap,
+/// record); both default to everything. Columns left out are `None`, and
+/// row dicts keep their default values for them. The whole file is still
+/// parsed: only the conversion of the values left out and their Python
+/// objects are saved.
+///
+/// Reading and decoding run without the GIL; Python objects are only built
+/// once the file is fully decoded.
+#[pyfunction]
+#[pyo3(signature = (file_name, columnar = false, fields = None, messages = None))]
+fn get_fit<'py>(
+    py: Python<'py>,
+    file_name: &str,
+    columnar: bool,
+    fields: Option<Vec<String>>,
+    messages: Option<Vec<String>>,
+) -> PyResult<Bound<'py, PyAny>> {
+    let projection = Projection::new(fields, messages)?;
+    let fit = py.detach(|| parse(fs::read(file_name)?, columnar, &projection))?;
+
+    to_python(py, fit)
+}
+
+/// Parse FIT data from any object exposing the buffer protocol (bytes,
+/// bytearray, memoryview, mmap, ...), without going through a file.
+///
+/// The buffer is copied while holding the GIL, since its owner may mutate
+/// it, and is then decoded without the GIL.
+#[pyfunction]
+#[pyo3(signature = (buffer, columnar = false, fields = None, messages = None))]
+fn get_fit_bytes<'py>(
+    py: Python<'py>,
+    buffer: PyBuffer<u8>,
+    columnar: bool,
+    fields: Option<Vec<String>>,
+    messages: Option<Vec<String>>,
+) -> PyResult<Bound<'py, PyAny>> {
+    let projection = Projection::new(fields, messages)?;
+    let file = buffer.to_vec(py)?;
+    let fit = py.detach(|| parse(file, columnar, &projection))?;
+
+    to_python(py, fit)
+}
+
+fn parse_all<F>(paths: &[String], threads: usize, decode_file: F) -> Vec<PyResult<ParsedFit>>
+where
+    F: Fn(Vec<u8>) -> PyResult<ParsedFit> + Sync,
+{
+    let next = AtomicUsize::new(0);
+    let mut results: Vec<Option<PyResult<ParsedFit>>> = paths.iter().map(|_| None).collect();
+
+    thread::scope(|scope| {
+        let workers: Vec<_> = (0..threads)
+            .map(|_| {
+                scope.spawn(|| {
+                    let mut done = Vec::new();
+                    loop {
+                        let index = next.fetch_add(1, Ordering::Relaxed);
+                        if index >= paths.len() {
+                            break;
+                        }
+                        let result = fs::read(&paths[index])
+                            .map_err(PyErr::from)
+                            .and_then(&decode_file);
+                        done.push((index, result));
+                    }
+                    done
+                })
+            })
+            .collect();
+
+        for worker in workers {
+            for (index, result) in worker.join().unwrap() {
+                results[index] = Some(result);
+            }
+        }
+    });
+
+    results.into_iter().map(Option::unwrap).collect()
+}
+
+/// Parse several FIT files in parallel on `threads` worker threads (defaults
+/// to the number of available cores), without the GIL.
+///
+/// Returns one entry per path, in input order: the parsed dict, or the
+/// exception raised for that file.
+#[pyfunction]
+#[pyo3(signature = (paths, threads = None, columnar = false, fields = None, messages = None))]
+fn get_fits<'py>(
+    py: Python<'py>,
+    paths: Vec<String>,
+    threads: Option<usize>,
+    columnar: bool,
+    fields: Option<Vec<String>>,
+    messages: Option<Vec<String>>,
+) -> PyResult<Bound<'py, PyList>> {
+    let projection = Projection::new(fields, messages)?;
+    let threads = worker_count(threads, paths.len());
+    let results =
+        py.detach(|| parse_all(&paths, threads, |file| parse(file, columnar, &projection)));
+
+    results_to_python(py, results)
+}
+
+fn worker_count(threads: Option<usize>, files: usize) -> usize {
+    threads
+        .unwrap_or_else(|| thread::available_parallelism().map_or(1, |n| n.get()))
+        .clamp(1, files.max(1))
+}
+
+fn results_to_python<'py>(
+    py: Python<'py>,
+    results: Vec<PyResult<ParsedFit>>,
+) -> PyResult<Bound<'py, PyList>> {
+    let fits = PyList::empty(py);
+    for result in results {
+        match result.and_then(|fit| to_python(py, fit)) {
+            Ok(fit) => fits.append(fit)?,
+            Err(err) => fits.append(err.into_value(py))?,
+        }
+    }
+
+    Ok(fits)
 }
 
 #[pymodule]
 fn api(m: &Bound<'_, PyModule>) -> PyResult<()> {
     m.add_function(wrap_pyfunction!(get_fit, m)?)?;
+    m.add_function(wrap_pyfunction!(get_fit_bytes, m)?)?;
+    m.add_function(wrap_pyfunction!(get_fits, m)?)?;
 
     Ok(())
 }
@@ -0,0 +1,93 @@
+use crate::types::Record;
+
+const SPEED_MS_TO_KMH: f64 = 3.6;
+const SPEED_CONVERSION_DIVISOR: f64 = 1000.0;
+const SPEED_SMOOTHING_WINDOW_SIZE: usize = 10;
+const METERS_PER_DEGREE: f64 = 111139.0;
+
+/// Centroid, bounding radius (in meters) and bounding box of a track, computed
+/// in a single pass over the records.
+#[derive(pyo3::IntoPyObject)]
+pub struct Track {
+    pub lat: f64,
+    pub lon: f64,
+    pub max_distance: f64,
+    pub min_lat: f64,
+    pub min_lon: f64,
+    pub max_lat: f64,
+    pub max_lon: f64,
+}
+
+impl Track {
+    pub fn from_records(records: &[Record]) -> Track {
+        let mut track = Track {
+            lat: 0.0,
+            lon: 0.0,
+            max_distance: 1.0,
+            min_lat: 0.0,
+            min_lon: 0.0,
+            max_lat: 0.0,
+            max_lon: 0.0,
+        };
+
+        if records.is_empty() {
+            return track;
+        }
+
+        track.min_lat = f64::INFINITY;
+        track.min_lon = f64::INFINITY;
+        track.max_lat = f64::NEG_INFINITY;
+        track.max_lon = f64::NEG_INFINITY;
+
+        let (mut x, mut y, mut z) = (0.0, 0.0, 0.0);
+        for record in records {
+            let (lat, lon) = (record.lat as f64, record.lon as f64);
+            let (lat_rad, lon_rad) = (lat.to_radians(), lon.to_radians());
+
+            x += lon_rad.cos() * lat_rad.cos();
+            y += lon_rad.cos() * lat_rad.sin();
+            z += lon_rad.sin();
+
+            track.min_lat = track.min_lat.min(lat);
+            track.min_lon = track.min_lon.min(lon);
+            track.max_lat = track.max_lat.max(lat);
+            track.max_lon = track.max_lon.max(lon);
+        }
+
+        // Same (axis-swapped) formula as api.utils.get_lat_lon, so centroids
+        // match the ones already stored.
+        let total = records.len() as f64;
+        let (x, y, z) = (x / total, y / total, z / total);
+        track.lat = y.atan2(x).to_degrees();
+        track.lon = z.atan2((x * x + y * y).sqrt()).to_degrees();
+
+        for record in records {
+            let distance = ((record.lat as f64 - track.lat).powi(2)
+                + (record.lon as f64 - track.lon).powi(2))
+            .sqrt()
+                * METERS_PER_DEGREE;
+            track.max_distance = track.max_distance.max(distance);
+        }
+
+        track
+    }
+}
+
+/// Speeds in km/h, each averaged with the previous points over a window of
+/// `SPEED_SMOOTHING_WINDOW_SIZE` samples once the window is full.
+pub fn smoothed_speeds(records: &[Record]) -> Vec<f64> {
+    let speeds: Vec<f64> = records
+        .iter()
+        .map(|record| record.speed as f64 * SPEED_MS_TO_KMH / SPEED_CONVERSION_DIVISOR)
+        .collect();
+
+    (0..speeds.len())
+        .map(|index| {
+            if index + 1 < SPEED_SMOOTHING_WINDOW_SIZE {
+                return speeds[index];
+            }
+            let window = &speeds[index + 1 - SPEED_SMOOTHING_WINDOW_SIZE..=index];
+            window.iter().sum::<f64>() / SPEED_SMOOTHING_WINDOW_SIZE as f64
+        })
+        .collect()
+}
@@ -1,3 +1,8 @@
+use pyo3::exceptions::PyValueError;
+use pyo3::prelude::*;
+
+use crate::track::Track;
+
 pub enum Device {
     FR110,
     FR10,
@@ -97,3 +102,245 @@ pub struct FitStruct {
     pub laps: Vec<Lap>,
     pub data_points: Vec<Point>,
 }
+
+#[derive(Default)]
+pub struct Record {
+    pub lat: f32,
+    pub lon: f32,
+    pub timestamp: u32,
+    pub distance: u32,
+    pub heart_rate: Option<u8>,
+    pub speed: u32,
+    pub power: Option<u16>,
+    pub altitude: u32,
+    pub temperature: Option<i8>,
+    pub cadence: Option<u8>,
+}
+
+impl Record {
+    pub fn to_point(&self) -> Point {
+        Point {
+            lat: self.lat,
+            lon: self.lon,
+            timestamp: self.timestamp,
+            distance: self.distance,
+            heart_rate: self.heart_rate.unwrap_or(0),
+            speed: self.speed,
+            power: self.power,
+            altitude: self.altitude,
+            temperature: self.temperature,
+            cadence: self.cadence.unwrap_or(0),
+        }
+    }
+}
+
+pub struct FitData {
+    pub activity: Activity,
+    pub laps: Vec<Lap>,
+    pub records: Vec<Record>,
+}
+
+/// Record fields stored column by column. Each column is a contiguous buffer
+/// of native-endian values (exposed to Python as `bytes`), and optional fields
+/// carry a `*_valid` byte mask alongside their values. `smoothed_speed` holds
+/// the speed in km/h (f64) after smoothing. Columns left out of the projection
+/// are `None`.
+#[derive(pyo3::IntoPyObject)]
+pub struct Columns {
+    pub len: usize,
+    pub lat: Option<Vec<u8>>,
+    pub lon: Option<Vec<u8>>,
+    pub timestamp: Option<Vec<u8>>,
+    pub distance: Option<Vec<u8>>,
+    pub speed: Option<Vec<u8>>,
+    pub smoothed_speed: Option<Vec<u8>>,
+    pub altitude: Option<Vec<u8>>,
+    pub heart_rate: Option<Vec<u8>>,
+    pub heart_rate_valid: Option<Vec<u8>>,
+    pub cadence: Option<Vec<u8>>,
+    pub cadence_valid: Option<Vec<u8>>,
+    pub power: Option<Vec<u8>>,
+    pub power_valid: Option<Vec<u8>>,
+    pub temperature: Option<Vec<u8>>,
+    pub temperature_valid: Option<Vec<u8>>,
+}
+
+fn column<const N: usize>(
+    records: &[Record],
+    include: bool,
+    bytes: impl Fn(&Record) -> [u8; N],
+) -> Option<Vec<u8>> {
+    include.then(|| {
+        let mut column = Vec::with_capacity(records.len() * N);
+        for record in records {
+            column.extend_from_slice(&bytes(record));
+        }
+        column
+    })
+}
+
+impl Columns {
+    /// `smoothed_speeds` are the smoothed speeds of `records` (see
+    /// `track::smoothed_speeds`), computed over the whole file.
+    pub fn from_records(
+        records: &[Record],
+        smoothed_speeds: &[f64],
+        projection: &Projection,
+    ) -> Columns {
+        let heart_rate = projection.includes(Field::HeartRate);
+        let cadence = projection.includes(Field::Cadence);
+        let power = projection.includes(Field::Power);
+        let temperature = projection.includes(Field::Temperature);
+
+        Columns {
+            len: records.len(),
+            lat: column(records, projection.includes(Field::Lat), |r| {
+                (r.lat as f64).to_ne_bytes()
+            }),
+            lon: column(records, projection.includes(Field::Lon), |r| {
+                (r.lon as f64).to_ne_bytes()
+            }),
+            timestamp: column(records, projection.includes(Field::Timestamp), |r| {
+                r.timestamp.to_ne_bytes()
+            }),
+            distance: column(records, projection.includes(Field::Distance), |r| {
+                r.distance.to_ne_bytes()
+            }),
+            speed: column(records, projection.includes(Field::Speed), |r| {
+                r.speed.to_ne_bytes()
+            }),
+            smoothed_speed: projection.includes(Field::Speed).then(|| {
+                smoothed_speeds
+                    .iter()
+                    .flat_map(|speed| speed.to_ne_bytes())
+                    .collect()
+            }),
+            altitude: column(records, projection.includes(Field::Altitude), |r| {
+                r.altitude.to_ne_bytes()
+            }),
+            heart_rate: column(records, heart_rate, |r| [r.heart_rate.unwrap_or(0)]),
+            heart_rate_valid: column(records, heart_rate, |r| [r.heart_rate.is_some() as u8]),
+            cadence: column(records, cadence, |r| [r.cadence.unwrap_or(0)]),
+            cadence_valid: column(records, cadence, |r| [r.cadence.is_some() as u8]),
+            power: column(records, power, |r| r.power.unwrap_or(0).to_ne_bytes()),
+            power_valid: column(records, power, |r| [r.power.is_some() as u8]),
+            temperature: column(records, temperature, |r| {
+                r.temperature.unwrap_or(0).to_ne_bytes()
+            }),
+            temperature_valid: column(records, temperature, |r| [r.temperature.is_some() as u8]),
+        }
+    }
+}
+
+#[derive(Clone, Copy)]
+pub enum Field {
+    Lat,
+    Lon,
+    Timestamp,
+    Distance,
+    Speed,
+    Altitude,
+    HeartRate,
+    Cadence,
+    Power,
+    Temperature,
+}
+
+impl Field {
+    const NAMES: [(&'static str, Field); 10] = [
+        ("lat", Field::Lat),
+        ("lon", Field::Lon),
+        ("timestamp", Field::Timestamp),
+        ("distance", Field::Distance),
+        ("speed", Field::Speed),
+        ("altitude", Field::Altitude),
+        ("heart_rate", Field::HeartRate),
+        ("cadence", Field::Cadence),
+        ("power", Field::Power),
+        ("temperature", Field::Temperature),
+    ];
+
+    fn bit(self) -> u16 {
+        1 << self as u16
+    }
+}
+
+/// Messages and Record fields to extract. Anything left out is still parsed
+/// by fit-rust, but is not converted and never reaches Python.
+#[derive(Clone, Copy)]
+pub struct Projection {
+    pub session: bool,
+    pub device_info: bool,
+    pub laps: bool,
+    pub records: bool,
+    fields: u16,
+}
+
+impl Projection {
+    pub const ALL: Projection = Projection {
+        session: true,
+        device_info: true,
+        laps: true,
+        records: true,
+        fields: u16::MAX,
+    };
+
+    /// Build a projection from the `fields=` / `messages=` arguments; `None`
+    /// keeps everything.
+    pub fn new(fields: Option<Vec<String>>, messages: Option<Vec<String>>) -> PyResult<Projection> {
+        let mut projection = Projection::ALL;
+
+        if let Some(messages) = messages {
+            projection.session = false;
+            projection.device_info = false;
+            projection.laps = false;
+            projection.records = false;
+
+            for message in &messages {
+                match message.as_str() {
+                    "session" => projection.session = true,
+                    "device_info" => projection.device_info = true,
+                    "lap" => projection.laps = true,
+                    "record" => projection.records = true,
+                    _ => {
+                        return Err(PyValueError::new_err(format!(
+                            "Unknown FIT message: {message}"
+                        )));
+                    }
+                }
+            }
+        }
+
+        if let Some(fields) = fields {
+            projection.fields = 0;
+
+            for name in &fields {
+                let Some((_, field)) = Field::NAMES.iter().find(|(n, _)| n == name) else {
+                    return Err(PyValueError::new_err(format!(
+                        "Unknown record field: {name}"
+                    )));
+                };
+                projection.fields |= field.bit();
+            }
+        }
+
+        Ok(projection)
+    }
+
+    pub fn includes(&self, field: Field) -> bool {
+        self.records && self.fields & field.bit() != 0
+    }
+}
+
+#[derive(pyo3::IntoPyObject)]
+pub struct ColumnarFitStruct {
+    pub activity: Activity,
+    pub laps: Vec<Lap>,
+    pub data_points: Columns,
+    pub track: Option<Track>,
+}
+
+pub enum ParsedFit {
+    Rows(FitStruct),
+    Columns(ColumnarFitStruct),
+}
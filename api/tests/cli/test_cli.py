@@ -0,0 +1,51 @@
+import datetime
+import uuid
+from unittest.mock import Mock, call, patch
+
+from api.cli import save_activity
+from api.model import Activity
+
+
+class TestSaveActivity:
+    @patch("api.cli.PerformanceService")
+    @patch("api.cli.update_daily_aggregates")
+    @patch("api.cli.ZoneService")
+    def test_stores_zones_before_daily_aggregates(
+        self, mock_zone_service, mock_update_daily_aggregates, mock_performance_service
+    ):
+        performance_service = mock_performance_service.return_value
+        performance_service.calculate_running_performances.return_value = []
+        performance_service.calculate_cycling_performances.return_value = []
+        session = Mock()
+        track = Mock()
+        track.downsample.return_value.to_tracepoints.return_value = []
+        activity = Activity(
+            id=uuid.uuid4(),
+            user_id="test-user",
+            sport="running",
+            title="Morning Run",
+            start_time=1700000000,
+            total_distance=5000,
+            total_elapsed_time=1800,
+            total_timer_time=1800,
+            fit="test.fit",
+            device="Garmin",
+            race=False,
+            timestamp=1700000000,
+        )
+        calls = Mock()
+        calls.attach_mock(
+            mock_zone_service.return_value.calculate_activity_zones, "zones"
+        )
+        calls.attach_mock(mock_update_daily_aggregates, "aggregates")
+        calls.attach_mock(session.commit, "commit")
+
+        save_activity(session, activity, [], track)
+
+        assert calls.mock_calls == [
+            call.zones(activity, track),
+            call.aggregates(
+                session, "test-user", datetime.date.fromtimestamp(1700000000)
+            ),
+            call.commit(),
+        ]
@@ -86,13 +86,11 @@ class TestActivityFormatter:
     def sample_performance_powers(self, sample_activity):
         return [
             PerformancePower(
-                id=uuid.uuid4(),
                 activity_id=sample_activity.id,
                 time=datetime.timedelta(seconds=5),
                 power=350.0,
             ),
             PerformancePower(
-                id=uuid.uuid4(),
                 activity_id=sample_activity.id,
                 time=datetime.timedelta(minutes=20),
                 power=250.0,
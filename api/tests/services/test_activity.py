@@ -3,11 +3,24 @@ import uuid
 from unittest.mock import Mock, patch
 
 import pytest
-from api.model import Activity, Lap, Performance, PerformancePower, Tracepoint
+from api.model import (
+    Activity,
+    Lap,
+    Performance,
+    PerformancePower,
+    PowerCurve,
+    Tracepoint,
+)
 from api.services.activity import ActivityService
+from api.track import TrackArray
 
 
 class TestActivityService:
+    @pytest.fixture(autouse=True)
+    def mock_update_daily_aggregates(self):
+        with patch("api.services.activity.update_daily_aggregates") as mock:
+            yield mock
+
     @pytest.fixture
     def mock_session(self):
         return Mock()
@@ -112,7 +125,7 @@ class TestActivityService:
             for i in range(10)
         ]
 
-    @patch("api.services.activity.get_activity_from_fit")
+    @patch("api.services.activity.get_activity_from_fit_bytes")
     @patch("api.services.activity.update_ftp_for_date")
     def test_create_activity_running_success(
         self,
@@ -126,11 +139,12 @@ class TestActivityService:
         mock_storage_service,
         mock_zone_service,
         mock_notification_service,
+        mock_update_daily_aggregates,
     ):
         mock_get_activity.return_value = (
             running_activity,
             sample_laps,
-            sample_tracepoints,
+            TrackArray.from_tracepoints(sample_tracepoints),
         )
 
         performances = [
@@ -143,7 +157,7 @@ class TestActivityService:
 
         result = service.create_activity(
             user_id="test-user",
-            fit_file_path="/tmp/test.fit",
+            fit_data=b"fitdata",
             fit_filename="test.fit",
             title="Morning Run",
             race=False,
@@ -154,11 +168,11 @@ class TestActivityService:
 
         mock_get_activity.assert_called_once_with(
             session=mock_session,
-            fit_file="/tmp/test.fit",
+            fit_data=b"fitdata",
+            fit_name="test.fit",
             title="Morning Run",
             description="",
             race=False,
-            fit_name="test.fit",
         )
 
         service.performance.calculate_running_performances.assert_called_once()
@@ -168,18 +182,56 @@ class TestActivityService:
         mock_session.commit.assert_called()
 
         mock_storage_service.upload_activity_files.assert_called_once_with(
-            fit_file_path="/tmp/test.fit",
+            fit_data=b"fitdata",
             fit_filename="test.fit",
             title="Morning Run",
             race=False,
         )
 
         mock_zone_service.calculate_activity_zones.assert_called_once()
-        mock_zone_service.update_user_zones.assert_called_once_with("test-user")
+        mock_zone_service.add_activity_to_zones.assert_called_once_with(
+            "test-user", running_activity
+        )
 
         mock_update_ftp.assert_not_called()
+        mock_update_daily_aggregates.assert_called_once_with(
+            mock_session,
+            "test-user",
+            datetime.date.fromtimestamp(running_activity.start_time),
+        )
+
+    @patch("api.services.activity.get_activity_from_fit_bytes")
+    @patch("api.services.activity.update_ftp_for_date")
+    def test_create_activity_reuses_parsed_fit(
+        self,
+        mock_update_ftp,
+        mock_get_activity,
+        service,
+        running_activity,
+        sample_laps,
+        sample_tracepoints,
+        mock_storage_service,
+    ):
+        parsed = (
+            running_activity,
+            sample_laps,
+            TrackArray.from_tracepoints(sample_tracepoints),
+        )
+
+        result = service.create_activity(
+            user_id="test-user",
+            fit_data=b"fitdata",
+            fit_filename="test.fit",
+            title="Morning Run",
+            race=False,
+            parsed=parsed,
+        )
 
-    @patch("api.services.activity.get_activity_from_fit")
+        assert result == running_activity
+        mock_get_activity.assert_not_called()
+        mock_storage_service.upload_activity_files.assert_called_once()
+
+    @patch("api.services.activity.get_activity_from_fit_bytes")
     @patch("api.services.activity.update_ftp_for_date")
     def test_create_activity_cycling_updates_ftp(
         self,
@@ -194,12 +246,12 @@ class TestActivityService:
         mock_get_activity.return_value = (
             cycling_activity,
             sample_laps,
-            sample_tracepoints,
+            TrackArray.from_tracepoints(sample_tracepoints),
         )
 
         result = service.create_activity(
             user_id="test-user",
-            fit_file_path="/tmp/test.fit",
+            fit_data=b"fitdata",
             fit_filename="test.fit",
             title="Bike Ride",
             race=False,
@@ -212,7 +264,7 @@ class TestActivityService:
             mock_session, "test-user", expected_date
         )
 
-    @patch("api.services.activity.get_activity_from_fit")
+    @patch("api.services.activity.get_activity_from_fit_bytes")
     def test_create_activity_storage_upload_failure(
         self,
         mock_get_activity,
@@ -225,7 +277,7 @@ class TestActivityService:
         mock_get_activity.return_value = (
             running_activity,
             sample_laps,
-            sample_tracepoints,
+            TrackArray.from_tracepoints(sample_tracepoints),
         )
 
         mock_storage_service.upload_activity_files.side_effect = Exception(
@@ -237,13 +289,13 @@ class TestActivityService:
         ):
             service.create_activity(
                 user_id="test-user",
-                fit_file_path="/tmp/test.fit",
+                fit_data=b"fitdata",
                 fit_filename="test.fit",
                 title="Morning Run",
                 race=False,
             )
 
-    @patch("api.services.activity.get_activity_from_fit")
+    @patch("api.services.activity.get_activity_from_fit_bytes")
     def test_create_activity_with_notifications(
         self,
         mock_get_activity,
@@ -257,7 +309,7 @@ class TestActivityService:
         mock_get_activity.return_value = (
             running_activity,
             sample_laps,
-            sample_tracepoints,
+            TrackArray.from_tracepoints(sample_tracepoints),
         )
 
         from api.model import Notification
@@ -275,7 +327,7 @@ class TestActivityService:
 
         service.create_activity(
             user_id="test-user",
-            fit_file_path="/tmp/test.fit",
+            fit_data=b"fitdata",
             fit_filename="test.fit",
             title="Fast Run",
             race=True,
@@ -288,7 +340,7 @@ class TestActivityService:
         ]
         assert len(notification_objects) == 1
 
-    @patch("api.services.activity.get_activity_from_fit")
+    @patch("api.services.activity.get_activity_from_fit_bytes")
     def test_create_activity_downsamples_large_tracepoint_set(
         self, mock_get_activity, service, running_activity, mock_session
     ):
@@ -308,11 +360,15 @@ class TestActivityService:
             for i in range(MAX_TRACEPOINTS_FOR_RESPONSE + 1000)
         ]
 
-        mock_get_activity.return_value = (running_activity, [], large_tracepoints)
+        mock_get_activity.return_value = (
+            running_activity,
+            [],
+            TrackArray.from_tracepoints(large_tracepoints),
+        )
 
         service.create_activity(
             user_id="test-user",
-            fit_file_path="/tmp/test.fit",
+            fit_data=b"fitdata",
             fit_filename="test.fit",
             title="Long Run",
             race=False,
@@ -325,7 +381,7 @@ class TestActivityService:
 
         assert len(added_tracepoints) <= MAX_TRACEPOINTS_FOR_RESPONSE
 
-    @patch("api.services.activity.get_activity_from_fit")
+    @patch("api.services.activity.get_activity_from_fit_bytes")
     def test_create_activity_preserves_original_tracepoints_for_zones(
         self, mock_get_activity, service, running_activity, mock_zone_service
     ):
@@ -345,11 +401,15 @@ class TestActivityService:
             for i in range(MAX_TRACEPOINTS_FOR_RESPONSE + 1000)
         ]
 
-        mock_get_activity.return_value = (running_activity, [], large_tracepoints)
+        mock_get_activity.return_value = (
+            running_activity,
+            [],
+            TrackArray.from_tracepoints(large_tracepoints),
+        )
 
         service.create_activity(
             user_id="test-user",
-            fit_file_path="/tmp/test.fit",
+            fit_data=b"fitdata",
             fit_filename="test.fit",
             title="Long Run",
             race=False,
@@ -368,11 +428,15 @@ class TestActivityService:
         ]
         performance_powers = [
             PerformancePower(
-                id=uuid.uuid4(),
                 activity_id=running_activity.id,
                 time=datetime.timedelta(seconds=60),
                 power=200.0,
-            )
+            ),
+            PerformancePower(
+                activity_id=running_activity.id,
+                time=datetime.timedelta(seconds=5),
+                power=400.0,
+            ),
         ]
 
         service._persist_activity_data(
@@ -386,11 +450,7 @@ class TestActivityService:
         add_calls = mock_session.add.call_args_list
 
         assert len(add_calls) == (
-            1
-            + len(sample_laps)
-            + len(sample_tracepoints)
-            + len(performances)
-            + len(performance_powers)
+            1 + len(sample_laps) + len(sample_tracepoints) + len(performances) + 1
         )
 
         added_objects = [call[0][0] for call in add_calls]
@@ -398,7 +458,10 @@ class TestActivityService:
         assert all(lap in added_objects for lap in sample_laps)
         assert all(tp in added_objects for tp in sample_tracepoints)
         assert all(perf in added_objects for perf in performances)
-        assert all(pp in added_objects for pp in performance_powers)
+        (power_curve,) = [obj for obj in added_objects if isinstance(obj, PowerCurve)]
+        assert power_curve.activity_id == running_activity.id
+        assert power_curve.durations == [5, 60]
+        assert power_curve.powers == [400.0, 200.0]
 
     def test_persist_activity_data_empty_lists(
         self, service, running_activity, mock_session
@@ -1,9 +1,23 @@
+import datetime
+import random
 import uuid
+from unittest.mock import patch
 
 import pytest
-from api.model import Activity, SQLModel, User, Zone
+from api.fitness import calculate_ftp_from_activities
+from api.model import (
+    Activity,
+    ActivityHistogram,
+    ActivityZonePower,
+    DailyFitness,
+    DailyStatistic,
+    Ftp,
+    SQLModel,
+    User,
+    Zone,
+)
 from api.services.bulk_operations import BulkOperationService
-from sqlmodel import Session, create_engine, select
+from sqlmodel import Session, col, create_engine, select
 from sqlmodel.pool import StaticPool
 
 
@@ -135,17 +149,9 @@ def test_update_performance_powers_skips_activities_with_existing_powers(
     session.add(activity)
     session.commit()
 
-    import datetime
-
-    from api.model import PerformancePower
+    from api.model import PowerCurve
 
-    pp = PerformancePower(
-        id=uuid.uuid4(),
-        activity_id=activity.id,
-        time=datetime.timedelta(seconds=5),
-        power=350.0,
-    )
-    session.add(pp)
+    session.add(PowerCurve(activity_id=activity.id, durations=[5], powers=[350.0]))
     session.commit()
 
     result = bulk_service.update_performance_powers()
@@ -246,6 +252,45 @@ def test_update_ftps_skips_existing_ftp_records(session, bulk_service, test_user
     assert result.processed_count == 0
 
 
+def test_update_ftps_matches_ftp_for_each_date(session, bulk_service, test_user):
+    rnd = random.Random(5)
+    first_day = datetime.datetime(2023, 1, 1, 8)
+    for _ in range(80):
+        start_time = int(
+            (first_day + datetime.timedelta(days=rnd.randrange(500))).timestamp()
+        )
+        session.add(
+            Activity(
+                id=uuid.uuid4(),
+                user_id=test_user.id,
+                fit="test.fit",
+                sport="cycling",
+                device="Test Device",
+                race=False,
+                start_time=start_time,
+                timestamp=start_time,
+                title="Ride",
+                total_timer_time=rnd.choice([900.0, 2400.0, 7500.0, 16000.0]),
+                total_elapsed_time=16000.0,
+                total_distance=30000.0,
+                avg_power=rnd.choice([None, float(rnd.randrange(120, 300))]),
+                np_power=rnd.choice([None, float(rnd.randrange(150, 320))]),
+                max_power=rnd.choice([None, float(rnd.randrange(400, 1100))]),
+                status="created",
+            )
+        )
+    session.commit()
+
+    result = bulk_service.update_ftps()
+
+    ftps = session.exec(select(Ftp)).all()
+    assert result.processed_count == len(ftps) > 0
+    for ftp in ftps:
+        assert ftp.ftp == round(
+            calculate_ftp_from_activities(session, test_user.id, ftp.date)
+        )
+
+
 def test_update_activity_zones_skips_activities_without_user(session, bulk_service):
     activity = Activity(
         id=uuid.uuid4(),
@@ -298,6 +343,150 @@ def test_update_activity_zones_skips_missing_fit_files(
     assert result.processed_count == 0
 
 
+def test_update_activity_zones_from_histograms(session, bulk_service, test_user):
+    activity = Activity(
+        id=uuid.uuid4(),
+        user_id=test_user.id,
+        fit="nonexistent.fit",
+        sport="cycling",
+        device="Test Device",
+        race=False,
+        start_time=1234567890,
+        timestamp=1234567890,
+        title="Test Activity",
+        total_timer_time=1800.0,
+        total_elapsed_time=1800.0,
+        total_distance=15000.0,
+        status="created",
+    )
+    session.add(activity)
+    session.add(
+        ActivityHistogram(
+            activity_id=activity.id,
+            type="power",
+            values=[100, 200, 300],
+            seconds=[600.0, 900.0, 300.0],
+        )
+    )
+    for index, max_value in enumerate([150.0, 250.0, 2000.0], start=1):
+        session.add(
+            Zone(user_id=test_user.id, type="power", index=index, max_value=max_value)
+        )
+    session.commit()
+
+    result = bulk_service.update_activity_zones()
+
+    assert result.processed_count == 1
+    assert result.skipped_count == 0
+    zone_powers = session.exec(select(ActivityZonePower)).all()
+    assert sorted(zone.time_in_zone for zone in zone_powers) == [300.0, 600.0, 900.0]
+
+
+def test_update_activity_zones_in_batches(session, bulk_service, test_user):
+    for index, max_value in enumerate([150.0, 250.0, 2000.0], start=1):
+        session.add(
+            Zone(user_id=test_user.id, type="power", index=index, max_value=max_value)
+        )
+    activity_ids = []
+    for day, status in enumerate(["created", "deleted", "created", "created"]):
+        activity = Activity(
+            id=uuid.uuid4(),
+            user_id=test_user.id,
+            fit="nonexistent.fit",
+            sport="cycling",
+            device="Test Device",
+            race=False,
+            start_time=1234567890 + day * 86400,
+            timestamp=1234567890 + day * 86400,
+            title="Test Activity",
+            total_timer_time=1800.0,
+            total_elapsed_time=1800.0,
+            total_distance=15000.0,
+            status=status,
+        )
+        session.add(activity)
+        session.add(
+            ActivityHistogram(
+                activity_id=activity.id,
+                type="power",
+                values=[100, 200],
+                seconds=[600.0, 1200.0],
+            )
+        )
+        activity_ids.append(activity.id)
+    session.commit()
+
+    result = bulk_service.update_activity_zones(batch_size=2)
+
+    assert result.total_count == 3
+    assert result.processed_count == 3
+    zone_powers = session.exec(select(ActivityZonePower)).all()
+    assert {zone.activity_id for zone in zone_powers} == {
+        activity_ids[0],
+        activity_ids[2],
+        activity_ids[3],
+    }
+    assert (
+        sorted(zone.time_in_zone for zone in zone_powers) == [600.0] * 3 + [1200.0] * 3
+    )
+
+
+def test_update_activity_zones_failure_keeps_batch(session, bulk_service, test_user):
+    for index, max_value in enumerate([150.0, 250.0, 2000.0], start=1):
+        session.add(
+            Zone(user_id=test_user.id, type="power", index=index, max_value=max_value)
+        )
+    activity_ids = []
+    for day in range(3):
+        activity = Activity(
+            id=uuid.uuid4(),
+            user_id=test_user.id,
+            fit="nonexistent.fit",
+            sport="cycling",
+            device="Test Device",
+            race=False,
+            start_time=1234567890 + day * 86400,
+            timestamp=1234567890 + day * 86400,
+            title="Test Activity",
+            total_timer_time=1800.0,
+            total_elapsed_time=1800.0,
+            total_distance=15000.0,
+        )
+        session.add(activity)
+        session.add(
+            ActivityHistogram(
+                activity_id=activity.id,
+                type="power",
+                values=[100],
+                seconds=[600.0],
+            )
+        )
+        activity_ids.append(activity.id)
+    session.commit()
+
+    calculate_zones = bulk_service.zone_service.calculate_activity_zones_from_histograms
+
+    def fail_second_activity(activity, histograms, zones):
+        calculate_zones(activity, histograms, zones)
+        if activity.id == activity_ids[1]:
+            raise RuntimeError("Zone rows failed")
+
+    with patch.object(
+        bulk_service.zone_service,
+        "calculate_activity_zones_from_histograms",
+        side_effect=fail_second_activity,
+    ):
+        result = bulk_service.update_activity_zones()
+
+    assert result.processed_count == 2
+    assert result.error_count == 1
+    zone_powers = session.exec(select(ActivityZonePower)).all()
+    assert {zone.activity_id for zone in zone_powers} == {
+        activity_ids[0],
+        activity_ids[2],
+    }
+
+
 def test_recompute_activities_no_activities(session, bulk_service):
     result = bulk_service.recompute_activities()
 
@@ -453,3 +642,41 @@ def test_recompute_activities_activity_id_not_found(session, bulk_service, test_
     result = bulk_service.recompute_activities(activity_id=str(random_id))
 
     assert result.total_count == 0
+
+
+def test_update_daily_fitness(session, bulk_service, test_user):
+    start_time = int(datetime.datetime(2024, 3, 6, 12).timestamp())
+    activity = Activity(
+        id=uuid.uuid4(),
+        user_id=test_user.id,
+        fit="test.fit",
+        sport="running",
+        device="Test Device",
+        race=False,
+        start_time=start_time,
+        timestamp=start_time,
+        title="Ultra",
+        total_timer_time=18000.0,
+        total_elapsed_time=18000.0,
+        total_distance=50000.0,
+        status="created",
+    )
+    session.add(activity)
+    session.add(
+        DailyFitness(user_id=test_user.id, date=datetime.date(2020, 1, 1), overall=3)
+    )
+    session.commit()
+
+    result = bulk_service.update_daily_fitness()
+
+    assert result.processed_count == 1
+    daily_fitness = session.exec(
+        select(DailyFitness).order_by(col(DailyFitness.date))
+    ).all()
+    assert daily_fitness[0].date == datetime.date(2024, 3, 6)
+    assert daily_fitness[0].overall == 5
+    assert daily_fitness[-1].date <= datetime.date(2024, 4, 17)
+    statistics = session.exec(select(DailyStatistic)).all()
+    assert [(s.date, s.sport, s.n_activities) for s in statistics] == [
+        (datetime.date(2024, 3, 6), "running", 1)
+    ]
@@ -267,7 +267,7 @@ class TestNotificationService:
         )
 
         assert notifications == []
-        mock_session.exec.assert_not_called()
+        mock_session.execute.assert_not_called()
 
     def test_detect_power_achievements_no_performances(
         self, service, cycling_activity, mock_session
@@ -278,29 +278,25 @@ class TestNotificationService:
         )
 
         assert notifications == []
-        mock_session.exec.assert_not_called()
+        mock_session.execute.assert_not_called()
 
     def test_detect_power_achievements_first_time(
         self, service, cycling_activity, mock_session
     ):
         performance_powers = [
             PerformancePower(
-                id=uuid.uuid4(),
                 activity_id=cycling_activity.id,
                 time=datetime.timedelta(seconds=5),
                 power=800.0,
             ),
             PerformancePower(
-                id=uuid.uuid4(),
                 activity_id=cycling_activity.id,
                 time=datetime.timedelta(seconds=60),
                 power=450.0,
             ),
         ]
 
-        mock_exec = Mock()
-        mock_exec.all.return_value = []
-        mock_session.exec.return_value = mock_exec
+        mock_session.execute.return_value.all.return_value = []
 
         notifications = service.detect_power_achievements(
             cycling_activity, performance_powers
@@ -320,22 +316,13 @@ class TestNotificationService:
     ):
         performance_powers = [
             PerformancePower(
-                id=uuid.uuid4(),
                 activity_id=cycling_activity.id,
                 time=datetime.timedelta(seconds=300),
                 power=400.0,
             ),
         ]
-
-        mock_historical_perf = Mock()
-        mock_historical_perf.power = 350.0
-        mock_historical_perf.time = datetime.timedelta(seconds=300)
-
-        historical_timestamp = int(datetime.datetime(2023, 6, 15).timestamp())
-
-        mock_exec = Mock()
-        mock_exec.all.return_value = [(mock_historical_perf, historical_timestamp)]
-        mock_session.exec.return_value = mock_exec
+        # Earlier powers better than the current one, overall and in 2024
+        mock_session.execute.return_value.all.return_value = [(300, 0, 0)]
 
         notifications = service.detect_power_achievements(
             cycling_activity, performance_powers
@@ -352,95 +339,60 @@ class TestNotificationService:
     ):
         performance_powers = [
             PerformancePower(
-                id=uuid.uuid4(),
                 activity_id=cycling_activity.id,
                 time=datetime.timedelta(seconds=300),
                 power=380.0,
             ),
         ]
-
-        mock_historical_perf = Mock()
-        mock_historical_perf.power = 400.0
-        mock_historical_perf.time = datetime.timedelta(seconds=300)
-
-        historical_timestamp = int(datetime.datetime(2023, 6, 15).timestamp())
-
-        mock_exec = Mock()
-        mock_exec.all.return_value = [(mock_historical_perf, historical_timestamp)]
-        mock_session.exec.return_value = mock_exec
+        # Earlier powers better than the current one, overall and in 2024
+        mock_session.execute.return_value.all.return_value = [(300, 6, 0)]
 
         notifications = service.detect_power_achievements(
             cycling_activity, performance_powers
         )
 
-        # With top-5 logic, this creates all-time notification (rank 2)
         assert len(notifications) == 1
-        assert notifications[0].type == "best_effort_all_time"
+        assert notifications[0].type == "best_effort_yearly"
         assert notifications[0].duration == datetime.timedelta(seconds=300)
-        assert notifications[0].rank == 2
+        assert notifications[0].rank == 1
+        assert notifications[0].achievement_year == 2024
 
     def test_detect_power_achievements_no_improvement(
         self, service, cycling_activity, mock_session
     ):
         performance_powers = [
             PerformancePower(
-                id=uuid.uuid4(),
                 activity_id=cycling_activity.id,
                 time=datetime.timedelta(seconds=300),
                 power=350.0,
             ),
         ]
-
-        mock_historical_perf_1 = Mock()
-        mock_historical_perf_1.power = 400.0
-        mock_historical_perf_1.time = datetime.timedelta(seconds=300)
-
-        mock_historical_perf_2 = Mock()
-        mock_historical_perf_2.power = 360.0
-        mock_historical_perf_2.time = datetime.timedelta(seconds=300)
-
-        historical_timestamp_old = int(datetime.datetime(2023, 6, 15).timestamp())
-        historical_timestamp_current_year = int(
-            datetime.datetime(2024, 3, 15).timestamp()
-        )
-
-        mock_exec = Mock()
-        mock_exec.all.return_value = [
-            (mock_historical_perf_1, historical_timestamp_old),
-            (mock_historical_perf_2, historical_timestamp_current_year),
-        ]
-        mock_session.exec.return_value = mock_exec
+        # Earlier powers better than the current one, overall and in 2024
+        mock_session.execute.return_value.all.return_value = [(300, 8, 5)]
 
         notifications = service.detect_power_achievements(
             cycling_activity, performance_powers
         )
 
-        # With top-5 logic, this performance still makes top 5 (rank 3)
-        assert len(notifications) == 1
-        assert notifications[0].type == "best_effort_all_time"
-        assert notifications[0].rank == 3
+        assert notifications == []
 
     def test_detect_power_achievements_filters_zero_power(
         self, service, cycling_activity, mock_session
     ):
         performance_powers = [
             PerformancePower(
-                id=uuid.uuid4(),
                 activity_id=cycling_activity.id,
                 time=datetime.timedelta(seconds=300),
                 power=0.0,
             ),
             PerformancePower(
-                id=uuid.uuid4(),
                 activity_id=cycling_activity.id,
                 time=datetime.timedelta(seconds=1200),
                 power=320.0,
             ),
         ]
 
-        mock_exec = Mock()
-        mock_exec.all.return_value = []
-        mock_session.exec.return_value = mock_exec
+        mock_session.execute.return_value.all.return_value = []
 
         notifications = service.detect_power_achievements(
             cycling_activity, performance_powers
@@ -476,15 +428,15 @@ class TestNotificationService:
             ),
         ]
 
-        mock_historical_perf_future = Mock()
-        mock_historical_perf_future.time = datetime.timedelta(minutes=3, seconds=30)
-        mock_historical_perf_future.distance = 1000
+        historical_curve_future = Mock()
+        historical_curve_future.time = datetime.timedelta(minutes=3, seconds=30)
+        historical_curve_future.distance = 1000
 
         future_same_year_timestamp = int(datetime.datetime(2024, 12, 15).timestamp())
 
         mock_exec = Mock()
         mock_exec.all.return_value = [
-            (mock_historical_perf_future, future_same_year_timestamp)
+            (historical_curve_future, future_same_year_timestamp)
         ]
         mock_session.exec.return_value = mock_exec
 
@@ -515,33 +467,31 @@ class TestNotificationService:
 
         performance_powers = [
             PerformancePower(
-                id=uuid.uuid4(),
                 activity_id=past_activity.id,
                 time=datetime.timedelta(seconds=300),
                 power=380.0,
             ),
+            PerformancePower(
+                activity_id=past_activity.id,
+                time=datetime.timedelta(seconds=301),
+                power=379.0,
+            ),
         ]
-
-        mock_historical_perf_future = Mock()
-        mock_historical_perf_future.power = 400.0
-        mock_historical_perf_future.time = datetime.timedelta(seconds=300)
-
-        future_same_year_timestamp = int(datetime.datetime(2024, 12, 15).timestamp())
-
-        mock_exec = Mock()
-        mock_exec.all.return_value = [
-            (mock_historical_perf_future, future_same_year_timestamp)
-        ]
-        mock_session.exec.return_value = mock_exec
+        mock_session.execute.return_value.all.return_value = []
 
         notifications = service.detect_power_achievements(
             past_activity, performance_powers
         )
 
-        # With top-5 logic, this creates all-time notification (rank 2)
+        # Only activities before this one are compared, for target durations only
+        params = mock_session.execute.call_args.args[0].compile().params
+        assert params["start_time"] == past_activity.start_time
+        assert params["year_start"] == datetime.datetime(2024, 1, 1).timestamp()
+        assert params["seconds"] == [300]
+        assert params["powers"] == [380.0]
         assert len(notifications) == 1
         assert notifications[0].type == "best_effort_all_time"
-        assert notifications[0].rank == 2
+        assert notifications[0].rank == 1
 
     def test_detect_achievements_top_5_ranks(
         self, service, running_activity, mock_session
@@ -618,29 +568,15 @@ class TestNotificationService:
         self, service, cycling_activity, mock_session
     ):
         """Test that ranks 2-5 create notifications correctly for power."""
-        # Create 3 historical performances better than current
-        historical_perfs = []
-        for i, power in enumerate([500, 450, 400]):
-            perf = Mock()
-            perf.power = power
-            perf.time = datetime.timedelta(seconds=300)
-            historical_perfs.append(
-                (perf, int(datetime.datetime(2023, i + 1, 15).timestamp()))
-            )
-
-        mock_exec = Mock()
-        mock_exec.all.return_value = historical_perfs
-        mock_session.exec.return_value = mock_exec
-
-        # Current performance: 350W (rank 4)
         performance_powers = [
             PerformancePower(
-                id=uuid.uuid4(),
                 activity_id=cycling_activity.id,
                 time=datetime.timedelta(seconds=300),
                 power=350.0,
             ),
         ]
+        # Earlier powers better than the current one, overall and in 2024
+        mock_session.execute.return_value.all.return_value = [(300, 3, 0)]
 
         notifications = service.detect_power_achievements(
             cycling_activity, performance_powers
@@ -655,29 +591,15 @@ class TestNotificationService:
         self, service, cycling_activity, mock_session
     ):
         """Test that 6th place all-time creates yearly rank 1 if first of year."""
-        # Create 5 historical performances better than current
-        historical_perfs = []
-        for i, power in enumerate([500, 450, 400, 380, 360]):
-            perf = Mock()
-            perf.power = power
-            perf.time = datetime.timedelta(seconds=300)
-            historical_perfs.append(
-                (perf, int(datetime.datetime(2023, i + 1, 15).timestamp()))
-            )
-
-        mock_exec = Mock()
-        mock_exec.all.return_value = historical_perfs
-        mock_session.exec.return_value = mock_exec
-
-        # Current performance: 340W (rank 6 all-time, rank 1 for 2024)
         performance_powers = [
             PerformancePower(
-                id=uuid.uuid4(),
                 activity_id=cycling_activity.id,
                 time=datetime.timedelta(seconds=300),
                 power=340.0,
             ),
         ]
+        # Earlier powers better than the current one, overall and in 2024
+        mock_session.execute.return_value.all.return_value = [(300, 5, 0)]
 
         notifications = service.detect_power_achievements(
             cycling_activity, performance_powers
@@ -2,7 +2,7 @@ import datetime
 import uuid
 
 import pytest
-from api.model import Activity, Tracepoint
+from api.model import Activity, PerformancePower, PowerCurve, Tracepoint
 from api.services.performance import PerformanceService
 
 
@@ -322,3 +322,88 @@ class TestPerformanceService:
 
         km_perf = next(p for p in performances if p.distance == 1000)
         assert km_perf.time == datetime.timedelta(seconds=250)
+
+    def test_best_efforts_arbitrary_distances(self, service, running_activity):
+        tracepoints = [
+            Tracepoint(
+                id=uuid.uuid4(),
+                activity_id=running_activity.id,
+                timestamp=datetime.datetime.fromtimestamp(seconds),
+                distance=distance,
+                lat=0.0,
+                lon=0.0,
+                heart_rate=None,
+                speed=0.0,
+            )
+            for seconds, distance in [(0, 0), (100, 400), (180, 800), (300, 1200)]
+        ]
+
+        best_times = service.best_efforts(tracepoints, [400, 800, 1000, 1200, 1500])
+
+        assert best_times == [
+            datetime.timedelta(seconds=80),
+            datetime.timedelta(seconds=180),
+            datetime.timedelta(seconds=300),
+            datetime.timedelta(seconds=300),
+            None,
+        ]
+
+    def test_best_efforts_empty_tracepoints(self, service):
+        assert service.best_efforts([], [1000]) == [None]
+
+    def test_power_curve_regular_and_irregular_sampling(self, service):
+        def tracepoints(samples):
+            return [
+                Tracepoint(
+                    id=uuid.uuid4(),
+                    activity_id=uuid.uuid4(),
+                    timestamp=datetime.datetime.fromtimestamp(seconds),
+                    distance=0,
+                    lat=0.0,
+                    lon=0.0,
+                    heart_rate=None,
+                    speed=0.0,
+                    power=power,
+                )
+                for seconds, power in samples
+            ]
+
+        regular = tracepoints([(0, 100), (1, 300), (2, None), (3, 200), (5, 400)])
+        assert service.power_curve(regular, [1, 2, 3, 4, 10]) == [
+            400.0,
+            300.0,
+            300.0,
+            300.0,
+            0.0,
+        ]
+
+        irregular = tracepoints([(0, 100), (0.5, 300), (1.5, 200), (3, 400)])
+        assert service.power_curve(irregular, [1, 2]) == [400.0, 300.0]
+
+    def test_power_curve_empty_tracepoints(self, service):
+        assert service.power_curve([], [1, 5]) == [0.0, 0.0]
+
+    def test_power_curve_storage(self):
+        activity_id = uuid.uuid4()
+        curve = PowerCurve.from_performance_powers(
+            activity_id,
+            [
+                PerformancePower(
+                    activity_id=activity_id,
+                    time=datetime.timedelta(seconds=seconds),
+                    power=power,
+                )
+                for seconds, power in [(130, 280.0), (5, 600.0), (120, 300.0)]
+            ],
+        )
+
+        assert curve.durations == [5, 120, 130]
+        assert curve.powers == [600.0, 300.0, 280.0]
+        assert curve.power_at(datetime.timedelta(seconds=120)) == 300.0
+        assert curve.power_at(datetime.timedelta(seconds=125)) == 280.0
+        assert curve.power_at(datetime.timedelta(seconds=140)) is None
+        assert [p.time for p in curve.performance_powers] == [
+            datetime.timedelta(seconds=5),
+            datetime.timedelta(seconds=120),
+            datetime.timedelta(seconds=130),
+        ]
@@ -110,16 +110,17 @@ class TestStorageService:
         mock_boto_client.return_value = mock_s3
 
         service = StorageService()
-        service.upload_activity_files("/tmp/test.fit", "test.fit", "Morning Run", True)
+        service.upload_activity_files(b"fitdata", "test.fit", "Morning Run", True)
 
-        assert mock_s3.upload_file.call_count == 1
-        upload_file_call = mock_s3.upload_file.call_args[0]
-        assert upload_file_call[0] == "/tmp/test.fit"
-        assert upload_file_call[1] == "test-bucket"
-        assert upload_file_call[2] == "data/fit/test.fit"
+        assert mock_s3.upload_file.call_count == 0
+        assert mock_s3.put_object.call_count == 2
+        fit_call = mock_s3.put_object.call_args_list[0][1]
+        assert fit_call["Key"] == "data/fit/test.fit"
+        assert fit_call["Bucket"] == "test-bucket"
+        assert fit_call["Body"] == b"fitdata"
+        assert fit_call["ContentType"] == "application/octet-stream"
 
-        assert mock_s3.put_object.call_count == 1
-        put_object_call = mock_s3.put_object.call_args[1]
+        put_object_call = mock_s3.put_object.call_args_list[1][1]
         assert put_object_call["Key"] == "data/2024/03/abc12345.yaml"
         assert put_object_call["ContentType"] == "text/yaml"
         assert b"fit: test.fit" in put_object_call["Body"]
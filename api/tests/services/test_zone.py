@@ -1,10 +1,25 @@
 import datetime
+import random
 import uuid
 from unittest.mock import Mock
 
 import pytest
-from api.model import Activity, Tracepoint, Zone
+from api.model import (
+    Activity,
+    ActivityHistogram,
+    ActivityZoneHeartRate,
+    ActivityZonePace,
+    SQLModel,
+    Tracepoint,
+    Zone,
+    ZoneEstimate,
+)
 from api.services.zone import ZoneService
+from api.utils import estimate_zone_thresholds, zone_estimate_thresholds
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql
+from sqlmodel import Session, col, create_engine, select
+from sqlmodel.pool import StaticPool
 
 
 class TestZoneService:
@@ -252,6 +267,85 @@ class TestZoneService:
 
         assert mock_session.add.call_count > 0
 
+    def test_calculate_activity_zones_stores_histograms(
+        self, service, running_activity, mock_session
+    ):
+        zones = [
+            Zone(
+                id=uuid.uuid4(),
+                user_id="test-user",
+                type="heart_rate",
+                index=index,
+                max_value=max_value,
+            )
+            for index, max_value in [(1, 120.0), (2, 140.0)]
+        ]
+        tracepoints = [
+            Tracepoint(
+                id=uuid.uuid4(),
+                activity_id=running_activity.id,
+                timestamp=datetime.datetime.fromtimestamp(seconds),
+                distance=0,
+                heart_rate=heart_rate,
+                lat=0.0,
+                lon=0.0,
+                speed=0.0,
+            )
+            for seconds, heart_rate in [(0, 110), (60, 130), (90, 130)]
+        ]
+        mock_session.exec.return_value.all.return_value = zones
+
+        service.calculate_activity_zones(running_activity, tracepoints)
+
+        added = [call.args[0] for call in mock_session.add.call_args_list]
+        histograms = [row for row in added if isinstance(row, ActivityHistogram)]
+        assert [(h.type, h.values, h.seconds) for h in histograms] == [
+            ("heart_rate", [110, 130], [60, 30])
+        ]
+        zone_rows = [row for row in added if isinstance(row, ActivityZoneHeartRate)]
+        assert {row.zone_id: row.time_in_zone for row in zone_rows} == {
+            zones[0].id: 60,
+            zones[1].id: 30,
+        }
+
+    def test_calculate_activity_zones_non_integer_pace_bound(
+        self, service, running_activity, mock_session
+    ):
+        zones = [
+            Zone(
+                id=uuid.uuid4(),
+                user_id="test-user",
+                type="pace",
+                index=index,
+                max_value=max_value,
+            )
+            for index, max_value in [(1, 400.0), (2, 300.5)]
+        ]
+        # 300.25 s/km is in zone 2, but its histogram bin (301) is not
+        tracepoints = [
+            Tracepoint(
+                id=uuid.uuid4(),
+                activity_id=running_activity.id,
+                timestamp=datetime.datetime.fromtimestamp(seconds),
+                distance=0,
+                heart_rate=None,
+                lat=0.0,
+                lon=0.0,
+                speed=speed,
+            )
+            for seconds, speed in [(0, 3600 / 300.25), (60, 10.0), (90, 10.0)]
+        ]
+        mock_session.exec.return_value.all.return_value = zones
+
+        service.calculate_activity_zones(running_activity, tracepoints)
+
+        added = [call.args[0] for call in mock_session.add.call_args_list]
+        zone_rows = [row for row in added if isinstance(row, ActivityZonePace)]
+        assert {row.zone_id: row.time_in_zone for row in zone_rows} == {
+            zones[0].id: 30,
+            zones[1].id: 60,
+        }
+
     def test_update_user_zones_no_activities(self, service, mock_session):
         mock_exec = Mock()
         mock_exec.all.return_value = []
@@ -261,139 +355,253 @@ class TestZoneService:
 
         mock_session.commit.assert_not_called()
 
-    def test_update_user_zones_updates_heart_rate(self, service, mock_session):
-        activities = [
+    @pytest.fixture
+    def db_session(self):
+        engine = create_engine(
+            "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+        )
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            ZoneService(session).create_default_zones("test-user")
+            session.commit()
+            yield session
+
+    def add_activity(self, session, **kwargs):
+        kwargs.setdefault("start_time", int(datetime.datetime.now().timestamp()))
+        session.add(
             Activity(
                 id=uuid.uuid4(),
-                sport="running",
                 user_id="test-user",
-                title="Run 1",
-                start_time=int(datetime.datetime.now().timestamp()),
-                total_distance=5000,
+                title="Activity",
                 total_elapsed_time=1800,
                 total_timer_time=1800,
-                max_heart_rate=180,
-                avg_speed=10.0,
                 fit="test.fit",
                 device="Test",
                 race=False,
                 timestamp=0,
-            ),
-            Activity(
-                id=uuid.uuid4(),
+                status="created",
+                **kwargs,
+            )
+        )
+
+    def zone_values(self, session, zone_type):
+        zones = session.exec(
+            select(Zone)
+            .where(Zone.user_id == "test-user", Zone.type == zone_type)
+            .order_by(col(Zone.index))
+        ).all()
+        return [pytest.approx(zone.max_value) for zone in zones]
+
+    def test_update_user_zones_updates_heart_rate(self, db_session):
+        for max_heart_rate in [180, 185, 150, None]:
+            self.add_activity(
+                db_session,
                 sport="running",
-                user_id="test-user",
-                title="Run 2",
-                start_time=int(datetime.datetime.now().timestamp()),
                 total_distance=5000,
-                total_elapsed_time=1800,
-                total_timer_time=1800,
-                max_heart_rate=185,
-                avg_speed=10.5,
-                fit="test.fit",
-                device="Test",
-                race=False,
-                timestamp=0,
-            ),
-        ]
-
-        hr_zone = Zone(
-            id=uuid.uuid4(),
-            user_id="test-user",
-            type="heart_rate",
-            index=1,
-            max_value=100.0,
+                max_heart_rate=max_heart_rate,
+                avg_speed=10.0,
+            )
+        self.add_activity(
+            db_session,
+            sport="running",
+            total_distance=5000,
+            max_heart_rate=210,
+            start_time=0,
         )
 
-        mock_exec_activities = Mock()
-        mock_exec_activities.all.return_value = activities
-
-        mock_exec_zone = Mock()
-        mock_exec_zone.first.return_value = hr_zone
+        ZoneService(db_session).update_user_zones("test-user")
 
-        mock_session.exec.side_effect = [mock_exec_activities] + [mock_exec_zone] * 20
+        assert self.zone_values(db_session, "heart_rate") == [
+            111.0,
+            129.5,
+            148.0,
+            166.5,
+            185.0,
+        ]
 
-        service.update_user_zones("test-user")
+    def test_update_user_zones_updates_pace(self, db_session):
+        for total_distance, avg_speed in [
+            (10000, 12.5),
+            (8000, 10.0),
+            (12000, 9.0),
+            (30000, 15.0),
+            (3000, 16.0),
+        ]:
+            self.add_activity(
+                db_session,
+                sport="running",
+                total_distance=total_distance,
+                avg_speed=avg_speed,
+            )
 
-        mock_session.add.assert_called()
+        ZoneService(db_session).update_user_zones("test-user")
 
-    def test_update_user_zones_updates_pace(self, service, mock_session):
-        activities = [
-            Activity(
-                id=uuid.uuid4(),
-                sport="running",
-                user_id="test-user",
-                title="Run 1",
-                start_time=int(datetime.datetime.now().timestamp()),
-                total_distance=10000,
-                total_elapsed_time=3000,
-                total_timer_time=3000,
-                avg_speed=12.0,
-                fit="test.fit",
-                device="Test",
-                race=False,
-                timestamp=0,
-            ),
+        assert self.zone_values(db_session, "pace") == [
+            374.4,
+            345.6,
+            316.8,
+            288.0,
+            259.2,
+        ]
+        assert self.zone_values(db_session, "power") == [
+            138.0,
+            184.0,
+            230.0,
+            264.0,
+            310.0,
         ]
 
-        pace_zone = Zone(
-            id=uuid.uuid4(),
-            user_id="test-user",
-            type="pace",
-            index=1,
-            max_value=360.0,
-        )
-
-        mock_exec_activities = Mock()
-        mock_exec_activities.all.return_value = activities
+    def test_update_user_zones_updates_pace_from_short_runs(self, db_session):
+        for avg_speed in [8.0, 10.0, 12.0, 14.0, None]:
+            self.add_activity(
+                db_session, sport="running", total_distance=3000, avg_speed=avg_speed
+            )
 
-        mock_exec_zone = Mock()
-        mock_exec_zone.first.return_value = pace_zone
+        ZoneService(db_session).update_user_zones("test-user")
 
-        mock_session.exec.side_effect = [mock_exec_activities] + [mock_exec_zone] * 10
+        threshold_pace = 3600 / 11.0 * 1.15
+        assert self.zone_values(db_session, "pace") == [
+            threshold_pace * multiplier for multiplier in [1.3, 1.2, 1.1, 1.0, 0.9]
+        ]
 
-        service.update_user_zones("test-user")
+    def test_update_user_zones_updates_power(self, db_session):
+        for max_power in [300.0, 400.0, None]:
+            self.add_activity(
+                db_session, sport="cycling", total_distance=30000, max_power=max_power
+            )
 
-        mock_session.add.assert_called()
+        ZoneService(db_session).update_user_zones("test-user")
 
-    def test_update_user_zones_updates_power(self, service, mock_session):
-        activities = [
-            Activity(
-                id=uuid.uuid4(),
-                sport="cycling",
-                user_id="test-user",
-                title="Ride 1",
-                start_time=int(datetime.datetime.now().timestamp()),
-                total_distance=30000,
-                total_elapsed_time=3600,
-                total_timer_time=3600,
-                max_power=300.0,
-                fit="test.fit",
-                device="Test",
-                race=False,
-                timestamp=0,
-            ),
+        assert self.zone_values(db_session, "power") == [
+            187.0,
+            255.0,
+            306.0,
+            357.0,
+            408.0,
+        ]
+        assert self.zone_values(db_session, "heart_rate") == [
+            114.0,
+            133.0,
+            152.0,
+            171.0,
+            190.0,
         ]
 
-        power_zone = Zone(
+    def test_zone_estimate_follows_uploads_and_deletions(self, db_session):
+        service = ZoneService(db_session)
+        rnd = random.Random(42)
+        now = int(datetime.datetime.now().timestamp())
+        activities = []
+        for _ in range(120):
+            if activities and rnd.random() < 0.25:
+                activity = activities.pop(rnd.randrange(len(activities)))
+                activity.status = "deleted"
+                service.remove_activity_from_zones("test-user", activity)
+            else:
+                activity = Activity(
+                    id=uuid.uuid4(),
+                    user_id="test-user",
+                    title="Activity",
+                    sport=rnd.choice(["running", "cycling"]),
+                    start_time=now - rnd.randint(-30, 400) * 86400,
+                    total_distance=rnd.choice([3000, 5000, 15000, 21000]),
+                    total_elapsed_time=1800,
+                    total_timer_time=1800,
+                    avg_speed=rnd.choice([None, rnd.uniform(8, 16)]),
+                    max_heart_rate=rnd.choice([None, rnd.randint(150, 210)]),
+                    max_power=rnd.choice([None, rnd.randint(200, 900)]),
+                    fit="test.fit",
+                    device="Test",
+                    race=False,
+                    timestamp=0,
+                )
+                db_session.add(activity)
+                activities.append(activity)
+                service.add_activity_to_zones("test-user", activity)
+
+            estimate = db_session.get(ZoneEstimate, "test-user")
+            expected = estimate_zone_thresholds(db_session, ["test-user"])
+            assert zone_estimate_thresholds(estimate) == pytest.approx(
+                expected.get("test-user", {})
+            )
+
+    def test_zone_estimate_rebuilt_when_stale(self, db_session):
+        now = int(datetime.datetime.now().timestamp())
+        self.add_activity(
+            db_session, sport="cycling", total_distance=30000, max_power=500.0
+        )
+        db_session.add(
+            ZoneEstimate(
+                user_id="test-user",
+                oldest_start_time=now - 400 * 86400,
+                max_heart_rates=[],
+                threshold_run_speeds=[],
+                long_run_speeds=[],
+                short_run_speeds=[],
+                max_powers=[900.0],
+            )
+        )
+        activity = Activity(
             id=uuid.uuid4(),
             user_id="test-user",
-            type="power",
-            index=1,
-            max_value=150.0,
+            title="Ride",
+            sport="cycling",
+            start_time=now,
+            total_distance=30000,
+            total_elapsed_time=3600,
+            total_timer_time=3600,
+            max_power=400.0,
+            fit="test.fit",
+            device="Test",
+            race=False,
+            timestamp=0,
         )
+        db_session.add(activity)
 
-        mock_exec_activities = Mock()
-        mock_exec_activities.all.return_value = activities
+        ZoneService(db_session).add_activity_to_zones("test-user", activity)
 
-        mock_exec_zone = Mock()
-        mock_exec_zone.first.return_value = power_zone
-
-        mock_session.exec.side_effect = [mock_exec_activities] + [mock_exec_zone] * 5
+        estimate = db_session.get(ZoneEstimate, "test-user")
+        assert estimate.max_powers == [400.0, 500.0]
+        assert estimate.oldest_start_time >= now
+        assert self.zone_values(db_session, "power")[-1] == 500.0 * 0.85 * 1.2
 
+    def test_zone_estimate_locked_while_updated(self, db_session):
+        self.add_activity(
+            db_session, sport="cycling", total_distance=30000, max_power=500.0
+        )
+        service = ZoneService(db_session)
         service.update_user_zones("test-user")
+        statements = []
+        event.listen(
+            db_session,
+            "do_orm_execute",
+            lambda state: statements.append(
+                str(state.statement.compile(dialect=postgresql.dialect()))
+            ),
+        )
 
-        mock_session.add.assert_called()
+        activity = Activity(
+            id=uuid.uuid4(),
+            user_id="test-user",
+            title="Ride",
+            sport="cycling",
+            start_time=int(datetime.datetime.now().timestamp()),
+            total_distance=30000,
+            total_elapsed_time=3600,
+            total_timer_time=3600,
+            max_power=400.0,
+            fit="test.fit",
+            device="Test",
+            race=False,
+            timestamp=0,
+        )
+        db_session.add(activity)
+        service.add_activity_to_zones("test-user", activity)
+
+        assert any(
+            "FROM zoneestimate" in statement and "FOR UPDATE" in statement
+            for statement in statements
+        )
 
     def test_create_default_zones(self, service, mock_session):
         service.create_default_zones("test-user")
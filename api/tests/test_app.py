@@ -1,4 +1,5 @@
 import asyncio
+import base64
 import datetime
 import json
 import os
@@ -14,16 +15,30 @@ from api.app import (
 )
 from api.auth import create_token_response
 from api.dependencies import get_current_user_id, get_session, verify_jwt_token
+from api.fit import COLUMN_FORMATS
+from api.fitness import update_daily_fitness
 from api.model import (
     Activity,
+    DailyFitness,
+    DailyStatistic,
     HeatmapPolyline,
     HeatmapPublic,
+    Lap,
+    Notification,
+    Performance,
+    PowerCurve,
     Profile,
+    SQLModel,
+    Tracepoint,
     User,
 )
+from api.services import ActivityService, NotificationService, ZoneService
+from api.utils import decode_activity_cursor, encode_activity_cursor
 from fastapi import HTTPException
 from fastapi.testclient import TestClient
-from sqlmodel import Session
+from sqlalchemy import event
+from sqlmodel import Session, create_engine, select
+from sqlmodel.pool import StaticPool
 
 
 class TestApp(unittest.TestCase):
@@ -649,6 +664,61 @@ class TestReadActivities(_AuthenticatedTestCase):
         self.assertEqual(data["pagination"]["per_page"], 5)
         self.assertEqual(data["pagination"]["total"], 25)
 
+    def test_returns_next_cursor(self):
+        activities = [_make_activity(start_time=1700000000 - i) for i in range(3)]
+        self.mock_session.exec.side_effect = [
+            MagicMock(one=MagicMock(return_value=3)),
+            MagicMock(all=MagicMock(return_value=activities)),
+            MagicMock(all=MagicMock(return_value=[])),
+        ]
+
+        response = self.client.get("/activities/?limit=2", headers=self.auth_headers)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data["activities"]), 2)
+        self.assertEqual(
+            decode_activity_cursor(
+                data["pagination"]["next_cursor"], "start_time", "desc"
+            ),
+            (1699999999, activities[1].id),
+        )
+
+    def test_cursor_skips_total(self):
+        activity = _make_activity()
+        cursor = encode_activity_cursor("start_time", "desc", activity)
+        self.mock_session.exec.side_effect = [
+            MagicMock(all=MagicMock(return_value=[])),
+            MagicMock(all=MagicMock(return_value=[])),
+        ]
+
+        response = self.client.get(
+            f"/activities/?cursor={cursor}", headers=self.auth_headers
+        )
+        self.assertEqual(response.status_code, 200)
+        pagination = response.json()["pagination"]
+        self.assertIsNone(pagination["total"])
+        self.assertIsNone(pagination["next_cursor"])
+
+    def test_rejects_invalid_cursor(self):
+        cursor = encode_activity_cursor("start_time", "desc", _make_activity())
+        for query in [
+            "cursor=invalid",
+            f"cursor={cursor}&order=asc",
+            f"cursor={cursor}&order_by=avg_power",
+            *(
+                "cursor="
+                + base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+                for payload in [
+                    ["start_time", "desc", 1, 123],
+                    ["start_time", "desc", 1, [1]],
+                ]
+            ),
+        ]:
+            response = self.client.get(
+                f"/activities/?{query}", headers=self.auth_headers
+            )
+            self.assertEqual(response.status_code, 400)
+
     def test_order_asc(self):
         self.mock_session.exec.side_effect = [
             MagicMock(one=MagicMock(return_value=0)),
@@ -744,6 +814,136 @@ class TestReadActivities(_AuthenticatedTestCase):
         self.assertEqual(response.status_code, 422)
 
 
+class _DatabaseTestCase(unittest.TestCase):
+    """Base test class that sets up authenticated client with a sqlite session."""
+
+    def setUp(self):
+        self.client = TestClient(app)
+        self.test_user_id = "test-user-123"
+        token = create_token_response(self.test_user_id, "test@example.com")
+        self.auth_headers = {"Authorization": f"Bearer {token.access_token}"}
+
+        self.engine = create_engine(
+            "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+        )
+        SQLModel.metadata.create_all(self.engine)
+        self.session = Session(self.engine)
+        self.session.add(_make_user(id=self.test_user_id))
+        self.session.commit()
+
+        app.dependency_overrides[get_session] = lambda: self.session
+        app.dependency_overrides[get_current_user_id] = lambda: self.test_user_id
+
+    def tearDown(self):
+        app.dependency_overrides.clear()
+        self.session.close()
+        self.engine.dispose()
+
+
+class TestReadActivitiesMapQueries(_DatabaseTestCase):
+    """Test GET /activities/?map=true against a database, counting queries."""
+
+    def setUp(self):
+        super().setUp()
+        self.statements: list[str] = []
+        event.listen(self.engine, "before_cursor_execute", self._count_statement)
+
+    def _count_statement(self, conn, cursor, statement, parameters, context, many):
+        self.statements.append(statement)
+
+    def _add_activities(self, n: int):
+        start = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+        for i in range(n):
+            activity = _make_activity(start_time=1700000000 + i * 3600)
+            self.session.add(activity)
+            self.session.flush()
+            self.session.add_all(
+                [
+                    Lap(
+                        id=uuid.uuid4(),
+                        activity_id=activity.id,
+                        index=index,
+                        start_time=index * 600,
+                        total_elapsed_time=600.0,
+                        total_timer_time=600.0,
+                        total_distance=2500.0,
+                    )
+                    for index in range(2)
+                ]
+            )
+            self.session.add_all(
+                [
+                    Tracepoint(
+                        id=uuid.uuid4(),
+                        activity_id=activity.id,
+                        lat=48.8 + index / 1000,
+                        lon=2.3,
+                        timestamp=start + datetime.timedelta(seconds=index),
+                        distance=index * 3.0,
+                        heart_rate=150,
+                        speed=3.0,
+                    )
+                    for index in range(3)
+                ]
+            )
+            self.session.add(
+                Performance(
+                    id=uuid.uuid4(),
+                    activity_id=activity.id,
+                    distance=1000.0,
+                    time=datetime.timedelta(minutes=5),
+                )
+            )
+            self.session.add(
+                Notification(
+                    activity_id=activity.id,
+                    type="best_effort_all_time",
+                    distance=1000.0,
+                    message="Best 1k",
+                )
+            )
+            self.session.add(
+                PowerCurve(
+                    activity_id=activity.id, durations=[1, 60], powers=[400.0, 250.0]
+                )
+            )
+        self.session.commit()
+        self.session.expunge_all()
+
+    def _get_map(self, limit: int):
+        self.statements.clear()
+        response = self.client.get(
+            f"/activities/?map=true&limit={limit}", headers=self.auth_headers
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(self.statements)
+
+    def test_map_mode_serializes_relationships(self):
+        self._add_activities(2)
+
+        data, _ = self._get_map(limit=10)
+
+        self.assertEqual(len(data["activities"]), 2)
+        for activity in data["activities"]:
+            self.assertEqual(len(activity["laps"]), 2)
+            self.assertEqual(len(activity["tracepoints"]), 3)
+            self.assertEqual(len(activity["performances"]), 1)
+            self.assertEqual(len(activity["notifications"]), 1)
+            self.assertEqual(
+                [p["power"] for p in activity["performance_power"]], [400.0, 250.0]
+            )
+
+    def test_map_mode_query_budget(self):
+        self._add_activities(12)
+
+        _, small_page_queries = self._get_map(limit=2)
+        _, large_page_queries = self._get_map(limit=10)
+
+        # count, activities, then one query per relationship of ActivityPublic
+        self.assertLessEqual(large_page_queries, 7)
+        self.assertEqual(small_page_queries, large_page_queries)
+
+
 class TestReadActivity(_AuthenticatedTestCase):
     """Test GET /activities/{id}/ endpoint logic."""
 
@@ -829,13 +1029,55 @@ class TestCreateActivity(_AuthenticatedTestCase):
         self.assertEqual(response.status_code, 409)
         self.assertIn("already exists", response.json()["detail"])
 
+    def _mock_service(self, activity=None):
+        mock_service = MagicMock()
+        mock_service.parse_activity.return_value = (
+            activity or _make_activity(start_time=1000),
+            [],
+            MagicMock(),
+        )
+        app.dependency_overrides[get_activity_service_dependency] = lambda: mock_service
+        return mock_service
+
+    def test_rejects_duplicate_fit_content(self):
+        mock_service = self._mock_service()
+        existing = _make_activity(fit="other.fit")
+        self.mock_session.exec.side_effect = [
+            MagicMock(first=MagicMock(return_value=None)),  # filename lookup
+            MagicMock(first=MagicMock(return_value=existing)),  # start time lookup
+        ]
+
+        files = {"fit_file": ("copy.fit", b"fitdata", "application/octet-stream")}
+        data = {"title": "Test", "race": "false"}
+        response = self.client.post(
+            "/activities/", files=files, data=data, headers=self.auth_headers
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertIn("already exists", response.json()["detail"])
+        mock_service.parse_activity.assert_called_once_with(
+            b"fitdata", "copy.fit", "Test", False
+        )
+        mock_service.create_activity.assert_not_called()
+
+    def test_rejects_invalid_fit_data(self):
+        mock_service = self._mock_service()
+        mock_service.parse_activity.side_effect = ValueError("Invalid FIT data")
+        self.mock_session.exec.return_value.first.return_value = None
+
+        files = {"fit_file": ("test.fit", b"garbage", "application/octet-stream")}
+        data = {"title": "Test", "race": "false"}
+        response = self.client.post(
+            "/activities/", files=files, data=data, headers=self.auth_headers
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["detail"], "Invalid FIT file")
+
     def test_successful_creation(self):
         self.mock_session.exec.return_value.first.return_value = None  # no duplicate
 
-        mock_service = MagicMock()
+        mock_service = self._mock_service()
         created_activity = _make_activity(title="New Activity")
         mock_service.create_activity.return_value = created_activity
-        app.dependency_overrides[get_activity_service_dependency] = lambda: mock_service
 
         files = {"fit_file": ("test.fit", b"fitdata", "application/octet-stream")}
         data = {"title": "New Activity", "race": "false"}
@@ -844,13 +1086,18 @@ class TestCreateActivity(_AuthenticatedTestCase):
         )
         self.assertEqual(response.status_code, 201)
         self.assertEqual(response.json()["title"], "New Activity")
+        # The upload is parsed once, for the duplicate check and the creation
+        mock_service.parse_activity.assert_called_once()
+        self.assertIs(
+            mock_service.create_activity.call_args.kwargs["parsed"],
+            mock_service.parse_activity.return_value,
+        )
 
     def test_handles_processing_error(self):
         self.mock_session.exec.return_value.first.return_value = None
 
-        mock_service = MagicMock()
+        mock_service = self._mock_service()
         mock_service.create_activity.side_effect = RuntimeError("Parse error")
-        app.dependency_overrides[get_activity_service_dependency] = lambda: mock_service
 
         files = {"fit_file": ("test.fit", b"fitdata", "application/octet-stream")}
         data = {"title": "Test", "race": "false"}
@@ -862,6 +1109,130 @@ class TestCreateActivity(_AuthenticatedTestCase):
         self.mock_session.rollback.assert_called_once()
 
 
+def _make_fit(**overrides) -> dict:
+    """Parsed FIT file, as returned by get_fit_bytes(..., columnar=True)."""
+    activity = {
+        "sport": "running",
+        "device": "Forerunner",
+        "start_time": 1700000000,
+        "timestamp": 1700001800,
+        "total_timer_time": 1800.0,
+        "total_elapsed_time": 1800.0,
+        "total_distance": 5000.0,
+    }
+    activity.update(overrides)
+    return {
+        "activity": activity,
+        "laps": [],
+        "data_points": {**dict.fromkeys(COLUMN_FORMATS, b""), "len": 0},
+        "track": {"lat": 48.8, "lon": 2.3, "max_distance": 0.0},
+    }
+
+
+class TestUpdateActivityRace(_DatabaseTestCase):
+    """Test PATCH /activities/{id}/ keeps the stored fitness scores up to date."""
+
+    def _overall(self, date: datetime.date) -> float:
+        daily_fitness = self.session.exec(
+            select(DailyFitness).where(
+                DailyFitness.user_id == self.test_user_id, DailyFitness.date == date
+            )
+        ).one()
+        return daily_fitness.overall
+
+    def test_race_updates_fitness_scores(self):
+        # Long enough for the 5% race bonus to change the rounded score
+        activity = _make_activity(
+            total_distance=200000.0, laps=[], performances=[], performance_power=[]
+        )
+        self.session.add(activity)
+        update_daily_fitness(
+            self.session,
+            self.test_user_id,
+            datetime.date.fromtimestamp(activity.start_time),
+        )
+        self.session.commit()
+        # A day's score counts the activities of the days before it
+        date = datetime.date.fromtimestamp(activity.start_time) + datetime.timedelta(
+            days=1
+        )
+        overall = self._overall(date)
+
+        response = self.client.patch(
+            f"/activities/{activity.id}/",
+            json={"race": True},
+            headers=self.auth_headers,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(self._overall(date), overall)
+
+
+class TestCreateActivityUploads(_DatabaseTestCase):
+    """Test POST /activities/ against a database."""
+
+    def setUp(self):
+        super().setUp()
+        self.storage = MagicMock()
+        app.dependency_overrides[get_activity_service_dependency] = lambda: (
+            ActivityService(
+                session=self.session,
+                storage_service=self.storage,
+                zone_service=ZoneService(self.session),
+                notification_service=NotificationService(self.session),
+            )
+        )
+
+        patcher = patch("api.fit.api.api.get_fit_bytes")
+        self.mock_get_fit_bytes = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_get_fit_bytes.side_effect = lambda *args, **kwargs: _make_fit()
+
+    def _upload(self, filename: str = "Morning_Ride.fit"):
+        files = {"fit_file": (filename, b"fitdata", "application/octet-stream")}
+        data = {"title": "Morning Run", "race": "false"}
+        return self.client.post(
+            "/activities/", files=files, data=data, headers=self.auth_headers
+        )
+
+    def test_reupload_after_delete(self):
+        first = self._upload()
+        self.assertEqual(first.status_code, 201)
+
+        response = self.client.delete(
+            f"/activities/{first.json()['id']}/", headers=self.auth_headers
+        )
+        self.assertEqual(response.status_code, 204)
+
+        second = self._upload()
+        self.assertEqual(second.status_code, 201)
+        self.assertNotEqual(second.json()["id"], first.json()["id"])
+        # Each upload is decoded once
+        self.assertEqual(self.mock_get_fit_bytes.call_count, 2)
+
+    def test_same_filename_for_two_users(self):
+        first = self._upload()
+        self.assertEqual(first.status_code, 201)
+
+        other_user_id = "other-user-456"
+        self.session.add(
+            _make_user(
+                id=other_user_id, email="other@example.com", google_id="google-456"
+            )
+        )
+        self.session.commit()
+        app.dependency_overrides[get_current_user_id] = lambda: other_user_id
+
+        second = self._upload()
+        self.assertEqual(second.status_code, 201)
+        self.assertNotEqual(second.json()["id"], first.json()["id"])
+
+        activities = self.session.exec(select(Activity)).all()
+        self.assertEqual(
+            sorted(a.user_id for a in activities),
+            sorted([self.test_user_id, other_user_id]),
+        )
+
+
 class TestDeleteActivity(_AuthenticatedTestCase):
     """Test DELETE /activities/{id}/ endpoint logic."""
 
@@ -869,13 +1240,25 @@ class TestDeleteActivity(_AuthenticatedTestCase):
         activity = _make_activity()
         self.mock_session.exec.return_value.first.return_value = activity
 
-        response = self.client.delete(
-            f"/activities/{activity.id}/", headers=self.auth_headers
-        )
+        with (
+            patch("api.app.get_zone_service") as mock_zone_svc,
+            patch("api.app.update_daily_aggregates") as mock_update_daily_aggregates,
+        ):
+            response = self.client.delete(
+                f"/activities/{activity.id}/", headers=self.auth_headers
+            )
         self.assertEqual(response.status_code, 204)
         self.assertEqual(activity.status, "deleted")
         self.mock_session.add.assert_called_once_with(activity)
         self.mock_session.commit.assert_called_once()
+        mock_zone_svc.return_value.remove_activity_from_zones.assert_called_once_with(
+            self.test_user_id, activity
+        )
+        mock_update_daily_aggregates.assert_called_once_with(
+            self.mock_session,
+            self.test_user_id,
+            datetime.date.fromtimestamp(activity.start_time),
+        )
 
     def test_activity_not_found(self):
         self.mock_session.exec.return_value.first.return_value = None
@@ -903,7 +1286,8 @@ class TestUpdateActivity(_AuthenticatedTestCase):
         self.assertEqual(activity.title, "New Title")
         self.mock_session.commit.assert_called_once()
 
-    def test_updates_race(self):
+    @patch("api.app.update_daily_fitness")
+    def test_updates_race(self, mock_update_daily_fitness):
         activity = _make_activity(race=False)
         self.mock_session.exec.return_value.first.return_value = activity
         self.mock_session.refresh.side_effect = lambda a: None
@@ -915,6 +1299,25 @@ class TestUpdateActivity(_AuthenticatedTestCase):
         )
         self.assertEqual(response.status_code, 200)
         self.assertTrue(activity.race)
+        mock_update_daily_fitness.assert_called_once_with(
+            self.mock_session,
+            self.test_user_id,
+            datetime.date.fromtimestamp(activity.start_time),
+        )
+
+    @patch("api.app.update_daily_fitness")
+    def test_unchanged_race_keeps_fitness(self, mock_update_daily_fitness):
+        activity = _make_activity(race=True)
+        self.mock_session.exec.return_value.first.return_value = activity
+        self.mock_session.refresh.side_effect = lambda a: None
+
+        response = self.client.patch(
+            f"/activities/{activity.id}/",
+            json={"title": "New Title", "race": True},
+            headers=self.auth_headers,
+        )
+        self.assertEqual(response.status_code, 200)
+        mock_update_daily_fitness.assert_not_called()
 
     def test_activity_not_found(self):
         self.mock_session.exec.return_value.first.return_value = None
@@ -1170,13 +1573,9 @@ class TestReadPowerProfile(_AuthenticatedTestCase):
 
     def test_returns_profile_with_data(self):
         mock_row_1 = MagicMock()
-        mock_row_1.__iter__ = Mock(
-            return_value=iter([datetime.timedelta(minutes=1), 300.0, 2024])
-        )
+        mock_row_1.__iter__ = Mock(return_value=iter([60, 300.0, 2024]))
         mock_row_2 = MagicMock()
-        mock_row_2.__iter__ = Mock(
-            return_value=iter([datetime.timedelta(minutes=5), 250.0, 2024])
-        )
+        mock_row_2.__iter__ = Mock(return_value=iter([300, 250.0, 2024]))
         self.mock_session.execute.return_value.all.return_value = [
             mock_row_1,
             mock_row_2,
@@ -1186,6 +1585,9 @@ class TestReadPowerProfile(_AuthenticatedTestCase):
         self.assertEqual(response.status_code, 200)
         data = response.json()
         self.assertIn(2024, data["available_years"])
+        powers = dict(zip(data["labels"], data["years"]["2024"]))
+        self.assertEqual(powers["1min"], 300.0)
+        self.assertEqual(powers["5min"], 250.0)
 
 
 class TestReadWeeks(_AuthenticatedTestCase):
@@ -1211,7 +1613,20 @@ class TestReadWeeks(_AuthenticatedTestCase):
             total_timer_time=3600.0,
             training_stress_score=50.0,
         )
-        self.mock_session.exec.return_value.all.return_value = [activity]
+        statistic = DailyStatistic(
+            user_id=self.test_user_id,
+            date=now.date(),
+            sport="running",
+            n_activities=1,
+            total_distance=10000.0,
+            total_timer_time=3600.0,
+            training_stress_score=50.0,
+        )
+        self.mock_session.exec.return_value.all.side_effect = [
+            [now.date() - datetime.timedelta(days=now.weekday())],
+            [activity],
+            [statistic],
+        ]
 
         response = self.client.get("/weeks/", headers=self.auth_headers)
         self.assertEqual(response.status_code, 200)
@@ -1220,6 +1635,7 @@ class TestReadWeeks(_AuthenticatedTestCase):
         week = data["weeks"][0]
         self.assertEqual(week["total_activities"], 1)
         self.assertEqual(week["total_distance"], 10000.0)
+        self.assertEqual(week["total_tss"], 50.0)
         self.assertIn("running", week["sports_breakdown"])
 
     def test_weeks_pagination(self):
@@ -1232,16 +1648,24 @@ class TestReadWeeks(_AuthenticatedTestCase):
 
     def test_weeks_has_more(self):
         activities = []
+        week_starts = []
         now = datetime.datetime.now()
-        for i in range(10):
-            ts = int((now - datetime.timedelta(weeks=i)).timestamp())
-            activities.append(_make_activity(start_time=ts))
-        self.mock_session.exec.return_value.all.return_value = activities
+        for i in range(4):
+            day = now - datetime.timedelta(weeks=i)
+            activities.append(_make_activity(start_time=int(day.timestamp())))
+            week_starts.append(day.date() - datetime.timedelta(days=day.weekday()))
+        self.mock_session.exec.return_value.all.side_effect = [
+            week_starts,
+            activities[:3],
+            [],
+        ]
 
         response = self.client.get("/weeks/?limit=3", headers=self.auth_headers)
         self.assertEqual(response.status_code, 200)
         data = response.json()
         self.assertTrue(data["has_more"])
+        self.assertEqual(data["next_offset"], 3)
+        self.assertEqual([len(week["activities"]) for week in data["weeks"]], [1, 1, 1])
 
     def test_weeks_sports_breakdown(self):
         now = datetime.datetime.now()
@@ -1258,7 +1682,29 @@ class TestReadWeeks(_AuthenticatedTestCase):
             total_distance=40000.0,
             total_timer_time=7200.0,
         )
-        self.mock_session.exec.return_value.all.return_value = [run, ride]
+        statistics = [
+            DailyStatistic(
+                user_id=self.test_user_id,
+                date=now.date(),
+                sport="running",
+                n_activities=1,
+                total_distance=10000.0,
+                total_timer_time=3600.0,
+            ),
+            DailyStatistic(
+                user_id=self.test_user_id,
+                date=now.date(),
+                sport="cycling",
+                n_activities=1,
+                total_distance=40000.0,
+                total_timer_time=7200.0,
+            ),
+        ]
+        self.mock_session.exec.return_value.all.side_effect = [
+            [now.date() - datetime.timedelta(days=now.weekday())],
+            [ride, run],
+            statistics,
+        ]
 
         response = self.client.get("/weeks/", headers=self.auth_headers)
         self.assertEqual(response.status_code, 200)
@@ -1396,7 +1842,98 @@ class TestReadFitness(_AuthenticatedTestCase):
 
         response = self.client.get("/fitness/scores/", headers=self.auth_headers)
         self.assertEqual(response.status_code, 200)
-        mock_fitness.assert_called_once_with(self.mock_session, self.test_user_id)
+        mock_fitness.assert_called_once_with(
+            self.mock_session,
+            self.test_user_id,
+            start=None,
+            end=None,
+            resolution="day",
+        )
+
+    @patch("api.app.calculate_fitness_and_weekly_data")
+    def test_passes_date_range(self, mock_fitness):
+        mock_fitness.return_value = {}
+
+        response = self.client.get(
+            "/fitness/scores/?start=2024-01-01&end=2024-06-30&resolution=week",
+            headers=self.auth_headers,
+        )
+        self.assertEqual(response.status_code, 200)
+        mock_fitness.assert_called_once_with(
+            self.mock_session,
+            self.test_user_id,
+            start=datetime.date(2024, 1, 1),
+            end=datetime.date(2024, 6, 30),
+            resolution="week",
+        )
+
+    def test_rejects_invalid_date_range(self):
+        response = self.client.get(
+            "/fitness/scores/?start=2024-06-30&end=2024-01-01",
+            headers=self.auth_headers,
+        )
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(
+            "/fitness/scores/?resolution=month", headers=self.auth_headers
+        )
+        self.assertEqual(response.status_code, 422)
+
+    def test_rejects_too_long_date_range(self):
+        response = self.client.get(
+            "/fitness/scores/?start=0001-01-01&end=2024-01-01",
+            headers=self.auth_headers,
+        )
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(
+            "/fitness/scores/?start=0001-01-01", headers=self.auth_headers
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class TestReadFitnessLoad(_AuthenticatedTestCase):
+    """Test GET /fitness/load/ endpoint logic."""
+
+    @patch("api.app.calculate_training_load")
+    def test_returns_training_load(self, mock_load):
+        mock_load.return_value = {"load": []}
+
+        response = self.client.get(
+            "/fitness/load/?start=2024-01-01&end=2024-06-30&sports=true",
+            headers=self.auth_headers,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"load": []})
+        mock_load.assert_called_once_with(
+            self.mock_session,
+            self.test_user_id,
+            start=datetime.date(2024, 1, 1),
+            end=datetime.date(2024, 6, 30),
+            sports=True,
+        )
+        self.mock_session.commit.assert_called_once()
+
+    def test_rejects_invalid_date_range(self):
+        response = self.client.get(
+            "/fitness/load/?start=2024-06-30&end=2024-01-01",
+            headers=self.auth_headers,
+        )
+        self.assertEqual(response.status_code, 400)
+
+    @patch("api.app.calculate_training_load")
+    def test_rejects_out_of_bounds_dates(self, mock_load):
+        for query in [
+            "start=0001-01-01&end=0001-01-02",
+            "start=0001-01-01",
+            "start=9999-12-30&end=9999-12-31",
+            "end=9999-12-31",
+        ]:
+            response = self.client.get(
+                f"/fitness/load/?{query}", headers=self.auth_headers
+            )
+            self.assertEqual(response.status_code, 400, query)
+        mock_load.assert_not_called()
 
 
 class TestReadFitnessZones(_AuthenticatedTestCase):
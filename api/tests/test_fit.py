@@ -1,14 +1,44 @@
+import array
 import glob
 import json
+import math
 import os
 import unittest
 import uuid
 from unittest.mock import Mock
 
+from api.api import get_fit
+from api.fit import (
+    COLUMN_FORMATS,
+    get_activities_from_fits,
+    get_activity_from_fit_bytes,
+    get_columns,
+    get_tracepoints_from_fit,
+    get_track,
+)
 from api.model import Location
 from api.services.fit_file import FitFileService
 
 
+def _centroid(points: list[tuple[float, float]]) -> tuple[float, float]:
+    """Reference for the track centroid computed by the extension."""
+    if not points:
+        return 0.0, 0.0
+
+    x = y = z = 0.0
+    for lat, lon in points:
+        lat, lon = math.radians(lat), math.radians(lon)
+        x += math.cos(lon) * math.cos(lat)
+        y += math.cos(lon) * math.sin(lat)
+        z += math.sin(lon)
+    x, y, z = x / len(points), y / len(points), z / len(points)
+
+    # Same axis order as the extension, so lat comes from atan2(y, x)
+    return math.degrees(math.atan2(y, x)), math.degrees(
+        math.atan2(z, math.sqrt(x * x + y * y))
+    )
+
+
 class TestFit(unittest.TestCase):
     def test_fit(self):
         mock_session = Mock()
@@ -44,6 +74,167 @@ class TestFit(unittest.TestCase):
             activity_data.pop("updated_at", None)
             self.assertEqual(activity_data, data)
 
+    def test_fit_bytes(self):
+        mock_session = Mock()
+        mock_session.exec.return_value.first.return_value = None
+
+        test_dir = os.path.dirname(os.path.abspath(__file__))
+        data_dir = os.path.join(test_dir, "data")
+
+        for fit_path in glob.glob(os.path.join(data_dir, "*.fit")):
+            with open(fit_path, "rb") as f:
+                fit_data = f.read()
+
+            activity, laps, tracepoints = get_activity_from_fit_bytes(
+                mock_session, memoryview(fit_data), os.path.basename(fit_path)
+            )
+            expected, expected_laps, expected_tracepoints = FitFileService(
+                mock_session
+            ).read_fit_file(fit_path)
+
+            # Uploads get a random id, not one derived from their name
+            self.assertNotEqual(activity.id, expected.id)
+            self.assertNotEqual(
+                get_activity_from_fit_bytes(
+                    mock_session, memoryview(fit_data), os.path.basename(fit_path)
+                )[0].id,
+                activity.id,
+            )
+            self.assertEqual(activity.fit, expected.fit)
+            self.assertEqual(activity.total_distance, expected.total_distance)
+            self.assertEqual(len(laps), len(expected_laps))
+            self.assertEqual(
+                [(tp.lat, tp.lon, tp.speed) for tp in tracepoints],
+                [(tp.lat, tp.lon, tp.speed) for tp in expected_tracepoints],
+            )
+
+    def test_fits(self):
+        mock_session = Mock()
+        mock_session.exec.return_value.first.return_value = None
+
+        test_dir = os.path.dirname(os.path.abspath(__file__))
+        fit_files = sorted(glob.glob(os.path.join(test_dir, "data", "*.fit")))
+        missing = os.path.join(test_dir, "data", "missing.fit")
+
+        results = get_activities_from_fits(
+            mock_session, [fit_files[0], missing, *fit_files[1:]], threads=2
+        )
+
+        self.assertEqual(len(results), len(fit_files) + 1)
+        self.assertIsInstance(results[1], OSError)
+        for fit_path, result in zip(fit_files, [results[0], *results[2:]]):
+            self.assertNotIsInstance(result, Exception)
+            activity, _, _ = result
+            self.assertEqual(activity.fit, os.path.basename(fit_path))
+
+    def test_fit_projection(self):
+        test_dir = os.path.dirname(os.path.abspath(__file__))
+
+        for fit_path in glob.glob(os.path.join(test_dir, "data", "*.fit")):
+            expected = get_fit(fit_path, columnar=True)
+            fit = get_fit(
+                fit_path,
+                columnar=True,
+                fields=["timestamp", "power"],
+                messages=["record"],
+            )
+
+            self.assertEqual(fit["laps"], [])
+            self.assertEqual(fit["data_points"]["len"], expected["data_points"]["len"])
+            for name in ("timestamp", "power", "power_valid"):
+                self.assertEqual(
+                    fit["data_points"][name], expected["data_points"][name]
+                )
+            for name in ("lat", "speed", "heart_rate", "heart_rate_valid"):
+                self.assertIsNone(fit["data_points"][name])
+
+            tracepoints = get_tracepoints_from_fit(fit_path, ["timestamp", "power"])
+            _, _, expected_tracepoints = FitFileService(Mock()).read_fit_file(fit_path)
+            self.assertEqual(
+                [(tp.timestamp, tp.power) for tp in tracepoints],
+                [(tp.timestamp, tp.power) for tp in expected_tracepoints],
+            )
+
+        with self.assertRaises(ValueError):
+            get_fit(fit_path, fields=["unknown"])
+        with self.assertRaises(ValueError):
+            get_fit(fit_path, messages=["unknown"])
+
+    def test_fit_track(self):
+        test_dir = os.path.dirname(os.path.abspath(__file__))
+
+        for fit_path in glob.glob(os.path.join(test_dir, "data", "*.fit")):
+            fit = get_fit(fit_path, columnar=True)
+            columns = get_columns(fit["data_points"])
+            track = fit["track"]
+
+            points = list(zip(columns["lat"], columns["lon"]))
+            lat, lon = _centroid(points)
+            self.assertAlmostEqual(track["lat"], lat)
+            self.assertAlmostEqual(track["lon"], lon)
+
+            if points:
+                self.assertEqual(track["min_lat"], min(columns["lat"]))
+                self.assertEqual(track["max_lon"], max(columns["lon"]))
+                self.assertGreaterEqual(track["max_distance"], 1.0)
+
+            speeds = [speed * 3.6 / 1000.0 for speed in columns["speed"]]
+            for index, speed in enumerate(columns["smoothed_speed"]):
+                window = speeds[max(0, index - 9) : index + 1]
+                expected = sum(window) / 10 if index >= 9 else speeds[index]
+                self.assertAlmostEqual(speed, expected)
+
+    def test_get_columns(self):
+        values = {
+            "lat": [47.2, 47.3],
+            "lon": [-1.5, -1.6],
+            "timestamp": [1000, 1001],
+            "power": [250, 0],
+            "power_valid": [1, 0],
+            "temperature": [-3, 12],
+        }
+        data_points = {
+            name: array.array(fmt, values.get(name, [0, 0])).tobytes()
+            for name, fmt in COLUMN_FORMATS.items()
+        }
+
+        columns = get_columns(data_points)
+
+        self.assertEqual(columns["lat"].tolist(), [47.2, 47.3])
+        self.assertEqual(columns["lon"].tolist(), [-1.5, -1.6])
+        self.assertEqual(columns["timestamp"].tolist(), [1000, 1001])
+        self.assertEqual(columns["power"].tolist(), [250, 0])
+        self.assertEqual(columns["power_valid"].tolist(), [1, 0])
+        self.assertEqual(columns["temperature"].tolist(), [-3, 12])
+        self.assertEqual(columns["heart_rate"].tolist(), [0, 0])
+
+        data_points["lat"] = None
+        self.assertNotIn("lat", get_columns(data_points))
+
+    def test_get_track(self):
+        values = {
+            "timestamp": [1000, 1001],
+            "smoothed_speed": [10.8, 11.2],
+            "altitude": [2600, 2650],
+            "power": [250, 0],
+            "power_valid": [1, 0],
+        }
+        data_points = {
+            name: array.array(fmt, values[name]).tobytes() if name in values else None
+            for name, fmt in COLUMN_FORMATS.items()
+        }
+        data_points["len"] = 2
+
+        track = get_track(data_points)
+
+        self.assertEqual(len(track), 2)
+        self.assertEqual(list(track.timestamp), [1000, 1001])
+        self.assertEqual(list(track.speed), [10.8, 11.2])
+        self.assertEqual(track.altitude, [20.0, 30.0])
+        self.assertEqual(track.power, [250, None])
+        self.assertEqual(track.lat, [0.0, 0.0])
+        self.assertEqual(track.heart_rate, [None, None])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,14 +1,58 @@
 import datetime
+import random
 import unittest
 import uuid
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
+import pytest
 from api.fitness import (
+    _store_training_load,
+    build_missing_daily_aggregates,
     calculate_activity_score,
+    calculate_daily_fitness,
     calculate_fitness_and_weekly_data,
+    calculate_training_load,
+    calculate_weekly_zone_data,
     estimate_running_tss,
+    rebuild_daily_fitness,
+    reset_training_load,
+    store_daily_statistics,
+    update_daily_aggregates,
+    update_daily_fitness,
 )
-from api.model import Activity
+from api.model import (
+    Activity,
+    ActivityZoneHeartRate,
+    ActivityZonePower,
+    DailyFitness,
+    DailyStatistic,
+    SQLModel,
+    TrainingLoad,
+    User,
+    Zone,
+)
+from sqlmodel import Session, col, create_engine, select
+from sqlmodel.pool import StaticPool
+
+
+@pytest.fixture
+def session():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(
+            User(
+                id="test-user-id",
+                first_name="Test",
+                last_name="User",
+                email="test@example.com",
+                google_id="test123",
+            )
+        )
+        session.commit()
+        yield session
 
 
 class TestFitness(unittest.TestCase):
@@ -276,36 +320,12 @@ class TestFitness(unittest.TestCase):
 
     def test_calculate_fitness_and_weekly_data_with_activities(self):
         """Test calculate_fitness_and_weekly_data with some activities"""
-        # Create mock activities - make it a longer run to ensure scoring
         now = datetime.datetime.now()
         recent_timestamp = int((now - datetime.timedelta(days=1)).timestamp())
 
-        mock_activities = [
-            Activity(
-                id=uuid.uuid4(),
-                fit="recent_run.fit",
-                title="Recent Long Run",
-                description="Recent long running activity",
-                sport="running",
-                device="test",
-                race=False,
-                start_time=recent_timestamp,
-                timestamp=recent_timestamp,
-                total_timer_time=3600.0,  # 1 hour
-                total_elapsed_time=3600.0,
-                total_distance=10000.0,  # 10km to ensure scoring
-                total_ascent=100.0,
-                avg_speed=2.78,
-                user_id="test-user-id",
-            )
-        ]
-
         mock_session = Mock()
 
         # Create mock results for all the queries made by calculate_fitness_and_weekly_data
-        mock_activities_result = Mock()
-        mock_activities_result.all.return_value = mock_activities
-
         mock_ftp_result = Mock()
         mock_ftp_result.all.return_value = []  # No FTP records
 
@@ -316,8 +336,24 @@ class TestFitness(unittest.TestCase):
         mock_weekly_activities_result = Mock()
         mock_weekly_activities_result.all.return_value = []
 
-        # Mock session.exec to return the activities result for the single main query
-        mock_session.exec.return_value = mock_activities_result
+        # No stored daily fitness, then the daily statistics of the weekly metrics
+        mock_stored_fitness_result = Mock()
+        mock_stored_fitness_result.all.return_value = []
+        mock_statistics_result = Mock()
+        mock_statistics_result.all.return_value = [
+            DailyStatistic(
+                user_id="test-user-id",
+                date=datetime.date.fromtimestamp(recent_timestamp),
+                sport="running",
+                n_activities=1,
+                total_distance=10000.0,
+                total_timer_time=3600.0,
+            )
+        ]
+        mock_session.exec.side_effect = [
+            mock_stored_fitness_result,
+            mock_statistics_result,
+        ]
 
         result = calculate_fitness_and_weekly_data(mock_session, "test-user-id")
 
@@ -379,6 +415,532 @@ class TestFitness(unittest.TestCase):
             self.assertGreaterEqual(daily_score["cycling"], 0)
             self.assertLessEqual(daily_score["cycling"], 200)
 
+    def test_calculate_daily_fitness(self):
+        """Test daily fitness scores around an activity"""
+        day = datetime.date(2024, 3, 6)
+        mock_session = Mock()
+        mock_session.exec.return_value.all.return_value = [self.ultra_activity()]
+
+        daily_fitness = calculate_daily_fitness(
+            mock_session,
+            "test-user-id",
+            day - datetime.timedelta(days=1),
+            day + datetime.timedelta(days=43),
+        )
+
+        scores = {daily.date.strftime("%Y-%m-%d"): daily for daily in daily_fitness}
+        self.assertEqual(len(scores), 45)
+        self.assertEqual(scores["2024-03-05"].overall, 0)
+        # 11.26 points, decayed by 1 - 0.5 / 84 on its day and 1 - 42.5 / 84
+        # at the end of the 42 days window
+        self.assertEqual(scores["2024-03-06"].overall, 5)
+        self.assertEqual(scores["2024-03-06"].running, 5)
+        self.assertEqual(scores["2024-03-06"].cycling, 0)
+        self.assertEqual(scores["2024-04-17"].overall, 2)
+        self.assertEqual(scores["2024-04-18"].overall, 0)
+
+    def test_calculate_fitness_and_weekly_data_date_range(self):
+        """Test scores and weekly data between start and end dates"""
+        day = datetime.date(2024, 3, 6)
+        mock_session = Mock()
+        mock_stored_fitness_result = Mock()
+        mock_stored_fitness_result.all.return_value = [
+            DailyFitness(user_id="test-user-id", date=day, overall=5, running=5)
+        ]
+        mock_statistics_result = Mock()
+        mock_statistics_result.all.return_value = [
+            DailyStatistic(
+                user_id="test-user-id",
+                date=day,
+                sport="running",
+                n_activities=1,
+                total_distance=50000.0,
+                total_timer_time=18000.0,
+            )
+        ]
+        mock_session.exec.side_effect = [
+            mock_stored_fitness_result,
+            mock_statistics_result,
+        ]
+
+        result = calculate_fitness_and_weekly_data(
+            mock_session,
+            "test-user-id",
+            start=day - datetime.timedelta(days=1),
+            end=day + datetime.timedelta(days=43),
+            resolution="week",
+        )
+
+        self.assertEqual(
+            result["scores"],
+            [
+                {
+                    "date": date,
+                    "overall": 0,
+                    "running": 0,
+                    "cycling": 0,
+                    "swimming": 0,
+                }
+                for date in [
+                    "2024-03-07",
+                    "2024-03-14",
+                    "2024-03-21",
+                    "2024-03-28",
+                    "2024-04-04",
+                    "2024-04-11",
+                    "2024-04-18",
+                ]
+            ],
+        )
+
+        weeks = [week["week_start"] for week in result["weekly_running"]]
+        self.assertEqual(weeks[0], "2024-03-04")
+        self.assertEqual(weeks[-1], "2024-04-15")
+        self.assertEqual(len(result["weekly_tss"]), 7)
+        self.assertEqual(
+            result["weekly_running"][0],
+            {"week_start": "2024-03-04", "distance": 50.0, "time": 5.0},
+        )
+
+    def ultra_activity(self):
+        start_time = int(datetime.datetime(2024, 3, 6, 12).timestamp())
+        return Activity(
+            id=uuid.uuid4(),
+            fit="ultra.fit",
+            title="Ultra",
+            sport="running",
+            device="test",
+            race=False,
+            start_time=start_time,
+            timestamp=start_time,
+            total_timer_time=18000.0,  # 5 hours
+            total_elapsed_time=18000.0,
+            total_distance=50000.0,
+            user_id="test-user-id",
+            status="created",
+        )
+
+
+class TestStoredDailyFitness:
+    def stored_scores(self, session):
+        return [
+            (daily.date, daily.overall, daily.running, daily.cycling, daily.swimming)
+            for daily in session.exec(
+                select(DailyFitness).order_by(col(DailyFitness.date))
+            ).all()
+        ]
+
+    def test_update_daily_fitness_matches_rebuild(self, session):
+        rnd = random.Random(7)
+        first_day = datetime.date(2024, 1, 1)
+        activities = []
+        for _ in range(60):
+            if activities and rnd.random() < 0.3:
+                activity = activities.pop(rnd.randrange(len(activities)))
+                activity.status = "deleted"
+            else:
+                start_time = int(
+                    datetime.datetime.combine(
+                        first_day + datetime.timedelta(days=rnd.randrange(200)),
+                        datetime.time(rnd.randrange(24)),
+                    ).timestamp()
+                )
+                activity = Activity(
+                    id=uuid.uuid4(),
+                    fit="test.fit",
+                    title="Activity",
+                    sport=rnd.choice(["running", "cycling", "swimming"]),
+                    device="test",
+                    race=False,
+                    start_time=start_time,
+                    timestamp=start_time,
+                    total_timer_time=rnd.uniform(1800, 18000),
+                    total_elapsed_time=18000.0,
+                    total_distance=rnd.uniform(1000, 60000),
+                    user_id="test-user-id",
+                )
+                activities.append(activity)
+            session.add(activity)
+            update_daily_fitness(
+                session,
+                "test-user-id",
+                datetime.date.fromtimestamp(activity.start_time),
+            )
+            session.commit()
+
+        stored = self.stored_scores(session)
+        assert stored
+        assert all(any(scores[1:]) for scores in stored)
+
+        rebuild_daily_fitness(session, "test-user-id")
+        session.commit()
+
+        assert self.stored_scores(session) == stored
+
+
+class TestDailyStatistics:
+    def stored_statistics(self, session):
+        return [
+            (
+                statistic.date,
+                statistic.sport,
+                statistic.n_activities,
+                statistic.total_distance,
+                statistic.total_timer_time,
+                statistic.training_stress_score,
+            )
+            for statistic in session.exec(
+                select(DailyStatistic).order_by(
+                    col(DailyStatistic.date), col(DailyStatistic.sport)
+                )
+            ).all()
+        ]
+
+    def test_update_daily_aggregates_matches_rebuild(self, session):
+        day = datetime.datetime(2024, 3, 6, 9)
+        activities = []
+        for days, sport, distance, tss in [
+            (0, "running", 10000.0, 50.0),
+            (0, "running", 5000.0, None),
+            (0, "cycling", 40000.0, 80.0),
+            (1, "swimming", 2000.0, 30.0),
+        ]:
+            start_time = int((day + datetime.timedelta(days=days)).timestamp())
+            activity = Activity(
+                id=uuid.uuid4(),
+                fit="test.fit",
+                title="Activity",
+                sport=sport,
+                device="test",
+                race=False,
+                start_time=start_time,
+                timestamp=start_time,
+                total_timer_time=3600.0,
+                total_elapsed_time=3600.0,
+                total_distance=distance,
+                training_stress_score=tss,
+                user_id="test-user-id",
+            )
+            activities.append(activity)
+            session.add(activity)
+            update_daily_aggregates(
+                session, "test-user-id", datetime.date.fromtimestamp(start_time)
+            )
+            session.commit()
+
+        activities[0].status = "deleted"
+        session.add(activities[0])
+        update_daily_aggregates(session, "test-user-id", day.date())
+        session.commit()
+
+        stored = self.stored_statistics(session)
+        assert stored == [
+            (datetime.date(2024, 3, 6), "cycling", 1, 40000.0, 3600.0, 80.0),
+            (datetime.date(2024, 3, 6), "running", 1, 5000.0, 3600.0, 0.0),
+            (datetime.date(2024, 3, 7), "swimming", 1, 2000.0, 3600.0, 30.0),
+        ]
+
+        store_daily_statistics(session, "test-user-id")
+        session.commit()
+
+        assert self.stored_statistics(session) == stored
+
+    def test_builds_missing_aggregates(self, session):
+        # Activities created before the daily aggregates were stored
+        day = datetime.datetime(2024, 3, 6, 9)
+        for days in range(3):
+            start_time = int((day + datetime.timedelta(days=days)).timestamp())
+            session.add(
+                Activity(
+                    id=uuid.uuid4(),
+                    fit="test.fit",
+                    title="Activity",
+                    sport="running",
+                    device="test",
+                    race=False,
+                    start_time=start_time,
+                    timestamp=start_time,
+                    total_timer_time=3600.0,
+                    total_elapsed_time=3600.0,
+                    total_distance=10000.0,
+                    user_id="test-user-id",
+                )
+            )
+        session.commit()
+
+        update_daily_aggregates(session, "test-user-id", day.date())
+        session.commit()
+
+        assert [statistic[:3] for statistic in self.stored_statistics(session)] == [
+            (datetime.date(2024, 3, 6), "running", 1),
+            (datetime.date(2024, 3, 7), "running", 1),
+            (datetime.date(2024, 3, 8), "running", 1),
+        ]
+        assert session.exec(select(DailyFitness)).first() is not None
+        assert not build_missing_daily_aggregates(session, "test-user-id")
+
+    def test_build_missing_aggregates_keeps_concurrent_rows(self, session):
+        day = datetime.datetime(2024, 3, 6, 9)
+        start_time = int(day.timestamp())
+        session.add(
+            Activity(
+                id=uuid.uuid4(),
+                fit="test.fit",
+                title="Activity",
+                sport="running",
+                device="test",
+                race=False,
+                start_time=start_time,
+                timestamp=start_time,
+                total_timer_time=3600.0,
+                total_elapsed_time=3600.0,
+                total_distance=10000.0,
+                user_id="test-user-id",
+            )
+        )
+        session.commit()
+
+        # The rows stored by a concurrent request conflict on flush
+        def store_concurrent_rows(session, user_id):
+            rebuild_daily_fitness(session, user_id)
+            session.add(
+                DailyStatistic(
+                    user_id=user_id, date=day.date(), sport="running", n_activities=1
+                )
+            )
+
+        with patch(
+            "api.fitness.rebuild_daily_fitness", side_effect=store_concurrent_rows
+        ):
+            assert not build_missing_daily_aggregates(session, "test-user-id")
+        session.commit()
+        assert self.stored_statistics(session) == []
+
+        assert build_missing_daily_aggregates(session, "test-user-id")
+        session.commit()
+        assert len(self.stored_statistics(session)) == 1
+        assert not build_missing_daily_aggregates(session, "test-user-id")
+
+
+class TestWeeklyZoneData:
+    def add_activity(self, session, start, sport, zone_times):
+        start_time = int(start.timestamp())
+        activity = Activity(
+            id=uuid.uuid4(),
+            fit="test.fit",
+            title="Activity",
+            sport=sport,
+            device="test",
+            race=False,
+            start_time=start_time,
+            timestamp=start_time,
+            total_timer_time=3600.0,
+            total_elapsed_time=3600.0,
+            total_distance=10000.0,
+            user_id="test-user-id",
+        )
+        session.add(activity)
+        for zone, time_in_zone in zone_times:
+            zone_model = (
+                ActivityZoneHeartRate
+                if zone.type == "heart_rate"
+                else ActivityZonePower
+            )
+            session.add(
+                zone_model(
+                    activity_id=activity.id, zone_id=zone.id, time_in_zone=time_in_zone
+                )
+            )
+        update_daily_aggregates(session, "test-user-id", start.date())
+        session.commit()
+        return activity
+
+    def test_calculate_weekly_zone_data(self, session):
+        hr_1, hr_2, power_1 = (
+            Zone(user_id="test-user-id", type="heart_rate", index=1, max_value=140.0),
+            Zone(user_id="test-user-id", type="heart_rate", index=2, max_value=170.0),
+            Zone(user_id="test-user-id", type="power", index=1, max_value=200.0),
+        )
+        session.add_all([hr_1, hr_2, power_1])
+        session.commit()
+
+        monday = datetime.datetime.combine(
+            datetime.date.today()
+            - datetime.timedelta(days=datetime.date.today().weekday()),
+            datetime.time(9),
+        )
+        self.add_activity(session, monday, "running", [(hr_1, 600.0), (hr_2, 1200.0)])
+        ride = self.add_activity(
+            session, monday, "cycling", [(hr_1, 300.0), (power_1, 900.0)]
+        )
+        self.add_activity(session, monday - datetime.timedelta(weeks=1), "swimming", [])
+
+        previous_week, current_week = calculate_weekly_zone_data(
+            session, "test-user-id", weeks=2
+        )
+
+        assert previous_week["heart_rate_zones"] == [
+            {
+                "zone_index": index,
+                "total_time": 0.0,
+                "running_time": 0.0,
+                "cycling_time": 0.0,
+                "max_value": max_value,
+            }
+            for index, max_value in [(1, 140.0), (2, 170.0)]
+        ]
+        assert previous_week["pace_zones"] == []
+        assert current_week["week_start"] == monday.strftime("%Y-%m-%d")
+        assert current_week["heart_rate_zones"] == [
+            {
+                "zone_index": 1,
+                "total_time": 900.0,
+                "running_time": 600.0,
+                "cycling_time": 300.0,
+                "max_value": 140.0,
+            },
+            {
+                "zone_index": 2,
+                "total_time": 1200.0,
+                "running_time": 1200.0,
+                "cycling_time": 0.0,
+                "max_value": 170.0,
+            },
+        ]
+        assert current_week["power_zones"] == [
+            {"zone_index": 1, "total_time": 900.0, "max_value": 200.0}
+        ]
+
+        ride.status = "deleted"
+        session.add(ride)
+        update_daily_aggregates(session, "test-user-id", monday.date())
+        session.commit()
+
+        current_week = calculate_weekly_zone_data(session, "test-user-id", weeks=1)[0]
+        assert [zone["total_time"] for zone in current_week["heart_rate_zones"]] == [
+            600.0,
+            1200.0,
+        ]
+        assert current_week["power_zones"] == [
+            {"zone_index": 1, "total_time": 0.0, "max_value": 200.0}
+        ]
+
+
+class TestTrainingLoad:
+    def add_activity(self, session, date, sport, training_stress_score):
+        start_time = int(datetime.datetime.combine(date, datetime.time(10)).timestamp())
+        session.add(
+            Activity(
+                id=uuid.uuid4(),
+                fit="test.fit",
+                title="Activity",
+                sport=sport,
+                device="test",
+                race=False,
+                start_time=start_time,
+                timestamp=start_time,
+                total_timer_time=3600.0,
+                total_elapsed_time=3600.0,
+                total_distance=10000.0,
+                training_stress_score=training_stress_score,
+                user_id="test-user-id",
+            )
+        )
+        session.commit()
+
+    def test_calculate_training_load(self, session):
+        self.add_activity(session, datetime.date(2024, 1, 1), "running", 84.0)
+        self.add_activity(session, datetime.date(2024, 1, 2), "cycling", 42.0)
+
+        load = calculate_training_load(
+            session,
+            "test-user-id",
+            start=datetime.date(2024, 1, 1),
+            end=datetime.date(2024, 1, 3),
+            sports=True,
+        )
+
+        assert load["load"] == [
+            {"date": "2024-01-01", "tss": 84.0, "ctl": 2.0, "atl": 12.0, "tsb": 0.0},
+            {
+                "date": "2024-01-02",
+                "tss": 42.0,
+                "ctl": 3.0,
+                "atl": 16.3,
+                "tsb": -10.0,
+            },
+            {"date": "2024-01-03", "tss": 0.0, "ctl": 2.9, "atl": 14.0, "tsb": -13.3},
+        ]
+        assert [day["tss"] for day in load["sports"]["running"]] == [84.0, 0.0, 0.0]
+        assert [day["tss"] for day in load["sports"]["cycling"]] == [0.0, 42.0, 0.0]
+        assert [day["tss"] for day in load["sports"]["swimming"]] == [0.0, 0.0, 0.0]
+
+    def test_resumes_from_stored_load(self, session):
+        rnd = random.Random(3)
+        first_day = datetime.date(2024, 1, 1)
+        for _ in range(40):
+            self.add_activity(
+                session,
+                first_day + datetime.timedelta(days=rnd.randrange(120)),
+                rnd.choice(["running", "cycling", "swimming"]),
+                rnd.uniform(20, 150),
+            )
+        end = first_day + datetime.timedelta(days=150)
+
+        expected = calculate_training_load(
+            session, "test-user-id", start=first_day, end=end, sports=True
+        )
+        start = first_day + datetime.timedelta(days=60)
+        calculate_training_load(session, "test-user-id", start=start, end=end)
+        session.commit()
+
+        stored = {
+            load.sport: load.date for load in session.exec(select(TrainingLoad)).all()
+        }
+        assert stored["overall"] == start - datetime.timedelta(days=1)
+        assert stored["running"] == first_day - datetime.timedelta(days=1)
+        resumed = calculate_training_load(
+            session, "test-user-id", start=start, end=end, sports=True
+        )
+        session.commit()
+
+        assert resumed["load"] == expected["load"][60:]
+        assert resumed["sports"] == {
+            sport: series[60:] for sport, series in expected["sports"].items()
+        }
+        assert len(session.exec(select(TrainingLoad)).all()) == 4
+
+        reset_training_load(session, "test-user-id", start - datetime.timedelta(days=1))
+        session.commit()
+        assert session.exec(select(TrainingLoad)).all() == []
+
+    def test_stores_load_stored_concurrently(self, session):
+        # Another request stored the load after this one read the stored loads
+        session.add(
+            TrainingLoad(
+                user_id="test-user-id",
+                sport="overall",
+                date=datetime.date(2024, 1, 10),
+                ctl=1.0,
+                atl=2.0,
+            )
+        )
+        session.commit()
+
+        _store_training_load(
+            session, None, "test-user-id", "overall", datetime.date(2024, 1, 5), 3, 4
+        )
+        session.commit()
+        load = session.exec(select(TrainingLoad)).one()
+        assert (load.date, load.ctl, load.atl) == (datetime.date(2024, 1, 10), 1, 2)
+
+        _store_training_load(
+            session, None, "test-user-id", "overall", datetime.date(2024, 1, 20), 5, 6
+        )
+        session.commit()
+        load = session.exec(select(TrainingLoad)).one()
+        assert (load.date, load.ctl, load.atl) == (datetime.date(2024, 1, 20), 5, 6)
+
 
 class TestSwimmingScore(unittest.TestCase):
     """Test swimming activity scoring"""
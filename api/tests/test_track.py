@@ -0,0 +1,79 @@
+import datetime
+import uuid
+
+from api.model import Tracepoint
+from api.track import TrackArray, TrackPoint, as_track_array
+from hypothesis import given
+from hypothesis import strategies as st
+
+
+def make_tracepoints(count: int) -> list[Tracepoint]:
+    return [
+        Tracepoint(
+            id=uuid.uuid4(),
+            activity_id=uuid.uuid4(),
+            lat=47.0 + i / 1000,
+            lon=-1.5,
+            timestamp=datetime.datetime.fromtimestamp(1_700_000_000 + i, datetime.UTC),
+            distance=i * 3.0,
+            heart_rate=140,
+            speed=10.8,
+            power=200 if i % 2 else None,
+            altitude=12.5,
+        )
+        for i in range(count)
+    ]
+
+
+class TestTrackArray:
+    def test_from_tracepoints(self):
+        track = TrackArray.from_tracepoints(make_tracepoints(3))
+
+        assert len(track) == 3
+        assert track.timestamp == [1_700_000_000, 1_700_000_001, 1_700_000_002]
+        assert track.power == [None, 200, None]
+        assert track[1] == TrackPoint(
+            lat=47.001,
+            lon=-1.5,
+            timestamp=1_700_000_001,
+            distance=3.0,
+            heart_rate=140,
+            speed=10.8,
+            power=200,
+            altitude=12.5,
+            temperature=None,
+            cadence=None,
+        )
+        assert [point.distance for point in track[1:]] == [3.0, 6.0]
+
+    def test_as_track_array(self):
+        track = TrackArray.from_tracepoints(make_tracepoints(2))
+
+        assert as_track_array(track) is track
+        assert as_track_array(make_tracepoints(2)).distance == [0.0, 3.0]
+        assert len(as_track_array([])) == 0
+
+    @given(
+        st.integers(min_value=0, max_value=2000),
+        st.integers(min_value=1, max_value=600),
+    )
+    def test_downsample_matches_halving(self, count, max_points):
+        track = TrackArray(*[list(range(count))] * 10)
+
+        indices = list(range(count))
+        while len(indices) > max_points:
+            indices = [index for i, index in enumerate(indices) if i % 2 == 0]
+
+        assert track.downsample(max_points).timestamp == indices
+
+    def test_to_tracepoints(self):
+        tracepoints = make_tracepoints(4)
+        activity_id = uuid.uuid4()
+
+        stored = TrackArray.from_tracepoints(tracepoints).to_tracepoints(activity_id)
+
+        assert all(isinstance(tp, Tracepoint) for tp in stored)
+        assert {tp.activity_id for tp in stored} == {activity_id}
+        assert [tp.timestamp for tp in stored] == [tp.timestamp for tp in tracepoints]
+        assert [tp.power for tp in stored] == [tp.power for tp in tracepoints]
+        assert len({tp.id for tp in stored}) == 4
@@ -1,5 +1,6 @@
+import base64
 import datetime
-import math
+import json
 import os
 import uuid
 from unittest.mock import Mock, patch
@@ -7,133 +8,28 @@ from unittest.mock import Mock, patch
 import pytest
 from api.model import Activity, Location, Tracepoint, Zone
 from api.services.storage import create_s3_client
+from api.track import TrackArray
 from api.utils import (
     _calculate_heart_rate_zones,
     _calculate_pace_zones,
     _calculate_power_zones,
+    calculate_activity_histograms,
     calculate_activity_zone_data,
+    calculate_histogram_zone_times,
+    calculate_zone_times,
     create_default_zones,
+    decode_activity_cursor,
     detect_best_effort_achievements,
+    encode_activity_cursor,
     generate_random_string,
     get_activity_location,
     get_delta_lat_lon,
-    get_lat_lon,
     get_uuid,
     update_user_zones_from_activities,
+    zone_times,
 )
 from hypothesis import assume, given
 from hypothesis import strategies as st
-from hypothesis.strategies import composite
-
-
-@composite
-def tracepoint_strategy(draw):
-    return Tracepoint(
-        id=draw(st.uuids()),
-        activity_id=draw(st.uuids()),
-        lat=draw(
-            st.floats(
-                min_value=-90.0,
-                max_value=90.0,
-                allow_nan=False,
-                allow_infinity=False,
-            )
-        ),
-        lon=draw(
-            st.floats(
-                min_value=-179.9,
-                max_value=179.9,
-                allow_nan=False,
-                allow_infinity=False,
-            )
-        ),
-        timestamp=datetime.datetime.fromtimestamp(
-            draw(st.integers(min_value=0, max_value=36000))
-        ),
-        distance=draw(
-            st.floats(
-                min_value=0.0,
-                max_value=100000.0,
-                allow_nan=False,
-                allow_infinity=False,
-            )
-        ),
-        heart_rate=draw(st.integers(min_value=0, max_value=300)),
-        speed=draw(
-            st.floats(
-                min_value=0.0, max_value=50.0, allow_nan=False, allow_infinity=False
-            )
-        ),
-    )
-
-
-class TestGetLatLon:
-    def test_empty_points(self):
-        lat, lon = get_lat_lon([])
-        assert lat == 0.0
-        assert lon == 0.0
-
-    @given(st.lists(st.nothing(), min_size=0, max_size=0))
-    def test_empty_points_property(self, empty_list):
-        lat, lon = get_lat_lon(empty_list)
-        assert lat == 0.0
-        assert lon == 0.0
-
-    def test_single_point(self):
-        tracepoint = Tracepoint(
-            id=uuid.uuid4(),
-            activity_id=uuid.uuid4(),
-            lat=47.2183,
-            lon=-1.5536,
-            timestamp=datetime.datetime.fromtimestamp(0),
-            distance=0.0,
-            heart_rate=150,
-            speed=5.0,
-        )
-        lat, lon = get_lat_lon([tracepoint])
-        assert lat == pytest.approx(47.2183, abs=0.001)
-        assert lon == pytest.approx(-1.5536, abs=0.001)
-
-    @given(st.lists(tracepoint_strategy(), min_size=0, max_size=0))  # type: ignore[call-arg]
-    def test_empty_property(self, empty_tracepoints):
-        lat, lon = get_lat_lon(empty_tracepoints)
-        assert lat == 0.0
-        assert lon == 0.0
-
-    def test_multiple_points(self):
-        points = [
-            Tracepoint(
-                id=uuid.uuid4(),
-                activity_id=uuid.uuid4(),
-                lat=47.2183,
-                lon=-1.5536,
-                timestamp=datetime.datetime.fromtimestamp(0),
-                distance=0.0,
-                heart_rate=150,
-                speed=5.0,
-            ),
-            Tracepoint(
-                id=uuid.uuid4(),
-                activity_id=uuid.uuid4(),
-                lat=47.2200,
-                lon=-1.5500,
-                timestamp=datetime.datetime.fromtimestamp(100),
-                distance=100.0,
-                heart_rate=155,
-                speed=5.2,
-            ),
-        ]
-        lat, lon = get_lat_lon(points)
-        assert 47.21 < lat < 47.23
-        assert -1.56 < lon < -1.54
-
-    @given(st.lists(tracepoint_strategy(), min_size=2, max_size=5))  # type: ignore[call-arg]
-    def test_multiple_points_property(self, tracepoints):
-        lat, lon = get_lat_lon(tracepoints)
-        assert math.isfinite(lat)
-        assert math.isfinite(lon)
-        assert isinstance(lat, float)
-        assert isinstance(lon, float)
 
 
 class TestGetDeltaLatLon:
@@ -479,6 +375,114 @@ class TestCalculatePowerZones:
         assert len(result) <= 1
 
 
+class TestZoneTimes:
+    def test_bins_against_sorted_bounds(self):
+        zones = [
+            Zone(id=uuid.uuid4(), user_id="u", type="power", index=i, max_value=m)
+            for i, m in [(2, 300.0), (1, 150.0), (3, 1000.0)]
+        ]
+        values = [100, 150, None, 151, 2000, 250]
+        timestamps = [0.0, 1.0, 3.0, 4.0, 7.0, 8.0]
+
+        result = zone_times(values, timestamps, zones)
+
+        assert result == {zones[1].id: 3.0, zones[0].id: 3.0}
+
+    def test_overflow_zone(self):
+        zones = [
+            Zone(id=uuid.uuid4(), user_id="u", type="pace", index=i, max_value=m)
+            for i, m in [(1, 400.0), (2, 300.0)]
+        ]
+
+        result = zone_times([250.0, 500.0, 350.0], [0, 10, 30], zones, zones[0])
+
+        assert result == {zones[1].id: 10, zones[0].id: 20}
+
+    def test_calculate_zone_times_by_sport(self):
+        zones = [
+            Zone(id=uuid.uuid4(), user_id="u", type=zone_type, index=1, max_value=m)
+            for zone_type, m in [
+                ("heart_rate", 200.0),
+                ("pace", 600.0),
+                ("power", 500.0),
+            ]
+        ]
+        track = TrackArray(
+            lat=[0.0] * 3,
+            lon=[0.0] * 3,
+            timestamp=[0, 5, 15],
+            distance=[0, 20, 60],
+            heart_rate=[150, 150, 150],
+            speed=[10.0, 10.0, 10.0],
+            power=[200, 200, 200],
+            altitude=[None] * 3,
+            temperature=[None] * 3,
+            cadence=[None] * 3,
+        )
+
+        running = calculate_zone_times(zones, track, "running")
+        cycling = calculate_zone_times(zones, track, "cycling")
+
+        assert running == {
+            "heart_rate": {zones[0].id: 15},
+            "pace": {zones[1].id: 15},
+            "power": {},
+        }
+        assert cycling == {
+            "heart_rate": {zones[0].id: 15},
+            "pace": {},
+            "power": {zones[2].id: 15},
+        }
+
+
+class TestActivityHistograms:
+    def test_histogram_zone_times_match_track(self):
+        activity = Activity(
+            id=uuid.uuid4(),
+            fit="test.fit",
+            title="Ride",
+            sport="cycling",
+            device="Test",
+            race=False,
+            start_time=0,
+            timestamp=0,
+            total_distance=0,
+            total_elapsed_time=0,
+            total_timer_time=0,
+        )
+        track = TrackArray(
+            lat=[0.0] * 6,
+            lon=[0.0] * 6,
+            timestamp=[0, 1, 2, 4, 5, 6],
+            distance=[0] * 6,
+            heart_rate=[120, 121, 121, None, 160, 150],
+            speed=[30.0] * 6,
+            power=[180, 250, 251, 250, None, 0],
+            altitude=[None] * 6,
+            temperature=[None] * 6,
+            cadence=[None] * 6,
+        )
+        zones = [
+            Zone(id=uuid.uuid4(), user_id="u", type=zone_type, index=i, max_value=m)
+            for zone_type, i, m in [
+                ("heart_rate", 1, 121.0),
+                ("heart_rate", 2, 200.0),
+                ("power", 1, 250.0),
+                ("power", 2, 1000.0),
+            ]
+        ]
+
+        histograms = calculate_activity_histograms(activity, track)
+
+        assert {h.type: (h.values, h.seconds) for h in histograms} == {
+            "heart_rate": ([120, 121, 160], [1, 3, 1]),
+            "power": ([180, 250, 251], [1, 2, 2]),
+        }
+        assert calculate_histogram_zone_times(
+            zones, histograms
+        ) == calculate_zone_times(zones, track, "cycling")
+
+
 class TestCalculateActivityZoneData:
     def test_no_tracepoints(self):
         mock_session = Mock()
@@ -533,6 +537,46 @@ class TestCalculateActivityZoneData:
         mock_session.exec.assert_not_called()
 
 
+class TestActivityCursor:
+    def test_round_trip(self):
+        activity = Activity(
+            id=uuid.uuid4(),
+            fit="test.fit",
+            title="Ride",
+            sport="cycling",
+            device="test",
+            race=False,
+            start_time=1700000000,
+            timestamp=1700000000,
+            total_timer_time=3600.0,
+            total_elapsed_time=3600.0,
+            total_distance=30000.0,
+            avg_power=201.3,
+        )
+
+        for order_by, value in [("avg_power", 201.3), ("total_ascent", None)]:
+            cursor = encode_activity_cursor(order_by, "asc", activity)
+            assert decode_activity_cursor(cursor, order_by, "asc") == (
+                value,
+                activity.id,
+            )
+            with pytest.raises(ValueError):
+                decode_activity_cursor(cursor, order_by, "desc")
+
+    def test_invalid_cursor(self):
+        cursors = ["", "invalid", "WyJhIl0="] + [
+            base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+            for payload in [
+                ["start_time", "desc", 1, 123],
+                ["start_time", "desc", 1, [1]],
+                ["start_time", "desc", 1, None],
+            ]
+        ]
+        for cursor in cursors:
+            with pytest.raises(ValueError):
+                decode_activity_cursor(cursor, "start_time", "desc")
+
+
 class TestUpdateUserZonesFromActivities:
     def test_no_activities(self):
         mock_session = Mock()